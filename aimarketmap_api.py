@@ -1,135 +1,388 @@
-from fastapi import FastAPI
-from pydantic import BaseModel
-import pandas as pd
-import openai
+from fastapi import FastAPI, HTTPException, Request
+from fastapi.encoders import jsonable_encoder
+from fastapi.responses import JSONResponse, PlainTextResponse, Response, StreamingResponse
+from pydantic import BaseModel, Field
+from contextlib import asynccontextmanager, nullcontext
+from typing import List, Optional
+import asyncio
+import json
+import logging
 import os
-from alpha_vantage.timeseries import TimeSeries
-from analysis import generar_prompt_y_analizar
+import clientes
+from analysis import (generar_analisis_stream, generar_multitemporal_async, generar_multitemporal_stream,
+                      generar_prompt_y_analizar_async, obtener_cache_llm, texto_analisis)
+from backtest import HORIZONTE, backtest
+from cache_mercado import crear_cache_mercado
+from coalescencia import SingleFlight
+from conclusiones import extraer_conclusion, obtener_registro
+from cotizaciones import MAX_SIMBOLOS, crear_cotizaciones, etag
+from datos_mercado import proveedor_para
+from formato_ohlc import respuesta_negociada, serializar_datos
+from indice_simbolos import obtener_indice
+from metricas import MiddlewareTiempos, etapa, exposicion, registrar, tiempos_actuales
+from multitemporal import TEMPORALIDADES, obtener_series
+from planificador import crear_planificador
+from precomputo import crear_precomputo
+from trabajos import ColaLlena, crear_cola_trabajos
 from dotenv import load_dotenv
-from pycoingecko import CoinGeckoAPI
-from datetime import datetime
 
 load_dotenv()
 
-app = FastAPI()
 
-openai.api_key = os.getenv("OPENAI_API_KEY")
-ALPHA_VANTAGE_API_KEY = os.getenv("ALPHA_VANTAGE_API_KEY")
+@asynccontextmanager
+async def lifespan(app):
+    # Clientes HTTP/OpenAI de larga vida por worker, con conexiones precalentadas
+    await clientes.iniciar()
+    # Refresco en segundo plano de la watchlist, alineado con el cierre de cada vela
+    precomputo.iniciar()
+    # Índice de monedas: snapshot en disco + refresco diario con cuota de fondo
+    obtener_indice().iniciar(planificador)
+    # Pool de workers de /jobs
+    trabajos.iniciar()
+    yield
+    await trabajos.detener()
+    await obtener_indice().detener()
+    await precomputo.detener()
+    await clientes.cerrar()
+
+
+app = FastAPI(lifespan=lifespan)
+# Histogramas por petición y header Server-Timing con el tiempo de cada etapa
+app.add_middleware(MiddlewareTiempos)
+
+planificador = crear_planificador()
+cache_mercado = crear_cache_mercado(planificador)
+single_flight = SingleFlight()
+precomputo = crear_precomputo(cache_mercado, planificador)
+cotizaciones = crear_cotizaciones(planificador)
+trabajos = crear_cola_trabajos()
+
+# Límites del endpoint batch: fetches de mercado y llamadas al LLM en paralelo
+MAX_ITEMS_BATCH = int(os.getenv("MAX_ITEMS_BATCH", "50"))
+LIMITE_DATOS_BATCH = int(os.getenv("LIMITE_DATOS_BATCH", "8"))
+LIMITE_LLM_BATCH = int(os.getenv("LIMITE_LLM_BATCH", "4"))
+# El análisis usa todo el lookback del almacén; al frontend se mandan las últimas velas
+VELAS_RESPUESTA = int(os.getenv("VELAS_RESPUESTA", "50"))
+# Máximo de segundos que GET /jobs/{id} retiene la conexión esperando el resultado
+ESPERA_MAX_TRABAJO = float(os.getenv("ESPERA_MAX_TRABAJO", "25"))
 
 class AnalisisRequest(BaseModel):
     ticker: str
     intervalo: str
+    # Salida con esquema JSON: secciones y conclusión como campos tipados
+    estructurado: bool = False
+    # OHLC como arrays paralelos en lugar de una lista de dicts por vela
+    columnar: bool = False
+    float32: bool = False
+    # Últimas velas de "data" en la respuesta (como mucho lo que guarda el AlmacenOHLC)
+    velas: Optional[int] = Field(None, ge=1, le=5000)
+    # Multi-temporalidad: las temporalidades se arman de una o dos series base y van en un solo análisis;
+    # "intervalo" es la temporalidad principal (la del gráfico, target y stop)
+    multitemporal: bool = False
+    temporalidades: Optional[List[str]] = None
+
+class AnalisisBatchRequest(BaseModel):
+    items: List[AnalisisRequest]
+
+class ConclusionAnalisis(BaseModel):
+    last_price: float
+    probable_target: float
+    probable_stop: float
+    risk_reward_ratio: float
+    probability: float
+
+class AnalisisEstructurado(BaseModel):
+    resumen_tecnico: str
+    pivots: str
+    probabilidad: str
+    proyeccion: str
+    riesgo_beneficio: str
+    conclusion: ConclusionAnalisis
 
 @app.get("/")
 def root():
     return {"status": "API online"}
 
+@app.get("/estadisticas")
+def estadisticas():
+    return {
+        "cache_mercado": cache_mercado.estadisticas(),
+        "cache_llm": obtener_cache_llm().estadisticas(),
+        "coalescencia": single_flight.estadisticas(),
+        "cuotas": planificador.estadisticas(),
+        "precomputo": precomputo.estadisticas(),
+        "simbolos": obtener_indice().estadisticas(),
+        "cotizaciones": cotizaciones.estadisticas(),
+        "trabajos": trabajos.estadisticas(),
+        "conclusiones": obtener_registro().estadisticas() if obtener_registro() else None,
+    }
+
+@app.get("/metrics")
+def metrics():
+    # Formato de texto de Prometheus (por worker)
+    return PlainTextResponse(exposicion(), media_type="text/plain; version=0.0.4")
+
+@app.get("/symbols/search")
+def buscar_simbolos(q: str = "", limite: int = 10):
+    # Autocompletado contra el índice local: nunca consulta al proveedor
+    return {"q": q, "resultados": obtener_indice().buscar(q, max(1, min(limite, 50)))}
+
+@app.get("/quotes")
+async def quotes(symbols: str, http_request: Request):
+    tickers = list(dict.fromkeys(s.strip().upper() for s in symbols.split(",") if s.strip()))
+    if len(tickers) > MAX_SIMBOLOS:
+        raise HTTPException(status_code=413, detail=f"Máximo {MAX_SIMBOLOS} símbolos por consulta")
+
+    cotizados = await cotizaciones.obtener(clientes.obtener_cliente_http(), tickers)
+    contenido = {"cotizaciones": cotizados, "faltantes": [t for t in tickers if t not in cotizados]}
+    # Sondeo condicional: si nada se movió desde el último ETag del cliente, 304 sin cuerpo
+    etiqueta = etag(contenido)
+    headers = {"ETag": etiqueta, "Cache-Control": "no-cache"}
+    if etiqueta in [e.strip() for e in http_request.headers.get("if-none-match", "").split(",")]:
+        return Response(status_code=304, headers=headers)
+    return JSONResponse(contenido, headers=headers)
+
+def temporalidades_pedidas(pedido, intervalo):
+    if not pedido.multitemporal:
+        return None
+    pedidas = {t.upper() for t in pedido.temporalidades or TEMPORALIDADES} | {intervalo}
+    desconocidas = pedidas - set(TEMPORALIDADES)
+    if desconocidas:
+        raise HTTPException(status_code=422, detail=f"Temporalidades no soportadas: {', '.join(sorted(desconocidas))}")
+    return tuple(t for t in TEMPORALIDADES if t in pedidas)
+
+def ultimas_velas(respuesta, velas):
+    # El análisis usa todo el lookback; al cliente solo viajan las últimas velas pedidas
+    if "data" not in respuesta:
+        return respuesta
+    return {**respuesta, "data": respuesta["data"].tail(velas or VELAS_RESPUESTA)}
+
 @app.post("/analizar")
-def analizar(request: AnalisisRequest):
+async def analizar(request: AnalisisRequest, http_request: Request):
     ticker = request.ticker.upper()
     intervalo = request.intervalo.upper()
 
-    crypto_symbols = {
-        "BTC", "BTC/USD",
-        "ETH", "ETH/USD",
-        "SOL", "SOL/USD",
-        "ADA", "ADA/USD",
-        "BNB", "BNB/USD"
-    }
+    estructurado = request.estructurado
+    temporalidades = temporalidades_pedidas(request, intervalo)
 
-    try:
-        if ticker in crypto_symbols:
-            print(f"🔍 Analizando {ticker} con CoinGecko...")
-
-            # Map de símbolos -> ID reales de CoinGecko
-            coingecko_ids = {
-                "BTC": "bitcoin",
-                "ETH": "ethereum",
-                "SOL": "solana",
-                "ADA": "cardano",
-                "BNB": "binancecoin"
-            }
-
-            base_symbol = ticker.split("/")[0]
-            crypto_symbol = coingecko_ids.get(base_symbol)
-
-            if not crypto_symbol:
-                raise Exception(f"Ticker {base_symbol} no tiene un ID válido en CoinGecko.")
-
-            cg = CoinGeckoAPI()
-            days_map = {"1D": 1, "1W": 7, "1M": 30}
-            days = days_map.get(intervalo, 1)
-
-            ohlc = cg.get_coin_ohlc_by_id(id=crypto_symbol, vs_currency='usd', days=days)
-
-            df = pd.DataFrame(ohlc, columns=['timestamp', 'Open', 'High', 'Low', 'Close'])
-            df['timestamp'] = pd.to_datetime(df['timestamp'], unit='ms')
-            df.set_index('timestamp', inplace=True)
-            df['Volume'] = None
-            data = df.tail(50)
-
-        else:
-            print(f"📈 Analizando {ticker} con Alpha Vantage...")
-            av_intervals = {
-                '15M': ('15min', 'compact'),
-                '1H': ('60min', 'compact'),
-                '1D': ('daily', 'compact'),
-                '1W': ('weekly', 'compact'),
-                '1M': ('monthly', 'compact'),
-            }
-            interval, outputsize = av_intervals.get(intervalo, ('daily', 'compact'))
-
-            ts = TimeSeries(key=ALPHA_VANTAGE_API_KEY, output_format='pandas')
-
-            if interval in ['15min', '60min']:
-                data, meta = ts.get_intraday(symbol=ticker, interval=interval, outputsize=outputsize)
-            elif interval == 'daily':
-                data, meta = ts.get_daily(symbol=ticker, outputsize=outputsize)
-            elif interval == 'weekly':
-                data, meta = ts.get_weekly(symbol=ticker)
-            elif interval == 'monthly':
-                data, meta = ts.get_monthly(symbol=ticker)
-            else:
-                data, meta = ts.get_daily(symbol=ticker, outputsize=outputsize)
+    # Peticiones idénticas simultáneas comparten un solo fetch + llamada al LLM
+    respuesta = await single_flight.ejecutar(
+        (ticker, intervalo, estructurado, temporalidades),
+        lambda: ejecutar_analisis(ticker, intervalo, estructurado=estructurado, temporalidades=temporalidades),
+    )
+    # Formato según Accept (JSON, msgpack, Arrow) y compresión según Accept-Encoding
+    with etapa("serializacion", proveedor_para(ticker), intervalo):
+        return respuesta_negociada(
+            ultimas_velas(respuesta, request.velas),
+            accept=http_request.headers.get("accept", ""),
+            accept_encoding=http_request.headers.get("accept-encoding", ""),
+            columnar=request.columnar,
+            float32=request.float32,
+        )
 
-            data = data.rename(columns={
-                '1. open': 'Open',
-                '2. high': 'High',
-                '3. low': 'Low',
-                '4. close': 'Close',
-                '5. volume': 'Volume'
-            }).dropna().head(50)
+@app.post("/analizar/batch")
+async def analizar_batch(request: AnalisisBatchRequest):
+    if len(request.items) > MAX_ITEMS_BATCH:
+        raise HTTPException(status_code=413, detail=f"Máximo {MAX_ITEMS_BATCH} items por batch")
 
-    except Exception as e:
-        print("❌ ERROR al obtener datos:", e)
-        return {"error": f"Error obteniendo datos de mercado: {str(e)}"}
+    # Se validan antes de lanzar nada: un item inválido rechaza el batch completo
+    temporalidades = [temporalidades_pedidas(pedido, pedido.intervalo.upper()) for pedido in request.items]
+    limite_datos = asyncio.Semaphore(LIMITE_DATOS_BATCH)
+    limite_llm = asyncio.Semaphore(LIMITE_LLM_BATCH)
+
+    async def item(indice, pedido):
+        ticker, intervalo = pedido.ticker.upper(), pedido.intervalo.upper()
+        try:
+            respuesta = await single_flight.ejecutar(
+                (ticker, intervalo, pedido.estructurado, temporalidades[indice]),
+                lambda: ejecutar_analisis(ticker, intervalo, limite_datos, limite_llm, pedido.estructurado,
+                                          temporalidades[indice]),
+            )
+            respuesta = ultimas_velas(respuesta, pedido.velas)
+            if "data" in respuesta:
+                with etapa("serializacion", proveedor_para(ticker), intervalo):
+                    respuesta["data"] = serializar_datos(respuesta["data"], pedido.columnar, pedido.float32)
+        except Exception as e:
+            # La falla inesperada queda en la línea de su item, con indice/ticker/intervalo
+            registrar("error_batch", logging.ERROR, indice=indice, ticker=ticker, intervalo=intervalo, error=str(e))
+            respuesta = {"error": f"Error inesperado: {str(e)}"}
+        return indice, ticker, intervalo, respuesta
+
+    tareas = [asyncio.ensure_future(item(i, pedido)) for i, pedido in enumerate(request.items)]
+
+    async def ndjson():
+        # Una línea JSON por item, en el orden en que terminan
+        try:
+            for terminada in asyncio.as_completed(tareas):
+                indice, ticker, intervalo, respuesta = await terminada
+                linea = {"indice": indice, "ticker": ticker, "intervalo": intervalo,
+                         "ok": "error" not in respuesta, **respuesta}
+                yield json.dumps(jsonable_encoder(linea), ensure_ascii=False) + "\n"
+        finally:
+            for tarea in tareas:
+                tarea.cancel()
+
+    return StreamingResponse(ndjson(), media_type="application/x-ndjson")
 
-    print("✅ DATA ENVIADA AL PROMPT:\n", data.head())
+@app.post("/jobs/analizar", status_code=202)
+async def crear_trabajo(request: AnalisisRequest):
+    ticker = request.ticker.upper()
+    intervalo = request.intervalo.upper()
+    estructurado = request.estructurado
+    temporalidades = temporalidades_pedidas(request, intervalo)
+
+    async def analisis():
+        respuesta = await single_flight.ejecutar(
+            (ticker, intervalo, estructurado, temporalidades),
+            lambda: ejecutar_analisis(ticker, intervalo, estructurado=estructurado, temporalidades=temporalidades),
+        )
+        if "error" in respuesta:
+            raise RuntimeError(respuesta["error"])
+        respuesta = ultimas_velas(respuesta, request.velas)
+        with etapa("serializacion", proveedor_para(ticker), intervalo):
+            respuesta["data"] = serializar_datos(respuesta["data"], request.columnar, request.float32)
+        # Se guarda ya en JSON: cualquier worker lo puede devolver tal cual
+        return jsonable_encoder({"ticker": ticker, "intervalo": intervalo, **respuesta})
+
+    clave = (ticker, intervalo, estructurado, temporalidades, request.columnar, request.float32, request.velas)
     try:
-        resultado = generar_prompt_y_analizar(ticker, intervalo, data)
-    except Exception as e:
-        print("❌ ERROR en generar_prompt_y_analizar:", e)
-        return {"error": f"Error al generar análisis con AI: {str(e)}"}
+        id_trabajo = trabajos.enviar(clave, analisis)
+    except ColaLlena as e:
+        # Rechazo inmediato: el cliente reintenta en vez de quedar esperando un timeout
+        raise HTTPException(status_code=503, detail=str(e), headers={"Retry-After": str(e.reintentar)})
+    return JSONResponse(trabajos.obtener(id_trabajo), status_code=202, headers={"Location": f"/jobs/{id_trabajo}"})
 
-    print("🧠 RESULTADO DEL ANALISIS:\n", resultado)
+@app.get("/jobs/{id_trabajo}")
+async def consultar_trabajo(id_trabajo: str, espera: float = 0):
+    # Long-poll: con espera > 0 responde apenas termina el trabajo o al vencer la espera
+    trabajo = await trabajos.esperar(id_trabajo, max(0.0, min(espera, ESPERA_MAX_TRABAJO)))
+    if trabajo is None:
+        raise HTTPException(status_code=404, detail="Trabajo inexistente o vencido")
+    return trabajo
 
-    # ✅ Convierte el DataFrame a JSON para enviarlo al frontend
-    data_json = data.reset_index().to_dict(orient='records')
-    return {
-        "resultado": resultado,
-        "data": data_json
-    }
+@app.get("/backtest")
+async def backtest_conclusiones(horizonte: int = HORIZONTE):
+    # Solo usa las velas ya guardadas en el almacén: no consume cuota de los proveedores
+    if obtener_registro() is None or cache_mercado.almacen_ohlc is None:
+        raise HTTPException(status_code=503, detail="Backtest desactivado (sin CONCLUSIONES_RUTA u OHLC_DIR)")
+    return await asyncio.to_thread(backtest, obtener_registro(), cache_mercado.almacen_ohlc,
+                                   max(1, min(horizonte, 1000)))
+
+async def guardar_conclusion(ticker, intervalo, data, resultado, temporalidades):
+    # Historial para /backtest: la conclusión junto a la última vela que vio el modelo
+    registro = obtener_registro()
+    if registro is None or data is None or data.empty:
+        return
+    conclusion = resultado.get("conclusion") if isinstance(resultado, dict) else extraer_conclusion(resultado)
+    if conclusion is not None:
+        # El INSERT + commit en SQLite va a un hilo para no frenar el event loop
+        await asyncio.to_thread(registro.guardar, ticker, intervalo, data.index[-1], conclusion,
+                                multitemporal=bool(temporalidades))
+
+def evento_sse(evento, datos):
+    return f"event: {evento}\ndata: {json.dumps(jsonable_encoder(datos), ensure_ascii=False)}\n\n"
+
+@app.post("/analizar/stream")
+async def analizar_stream(request: AnalisisRequest):
+    ticker = request.ticker.upper()
+    intervalo = request.intervalo.upper()
+    estructurado = request.estructurado
+    temporalidades = temporalidades_pedidas(request, intervalo)
+
+    async def eventos():
+        # Primer evento: los datos OHLC; luego los tokens del modelo; al final el texto completo
+        try:
+            if temporalidades:
+                series = await obtener_series(cache_mercado, clientes.obtener_cliente_http(), ticker, temporalidades)
+                data = series[intervalo]
+                analisis_stream = generar_multitemporal_stream(ticker, intervalo, series, estructurado)
+            else:
+                data = await cache_mercado.obtener(clientes.obtener_cliente_http(), ticker, intervalo)
+                analisis_stream = generar_analisis_stream(ticker, intervalo, data, estructurado)
+        except Exception as e:
+            registrar("error_datos", logging.ERROR, ticker=ticker, intervalo=intervalo, error=str(e))
+            yield evento_sse("error", {"error": f"Error obteniendo datos de mercado: {str(e)}"})
+            return
 
+        velas = data.tail(request.velas or VELAS_RESPUESTA)
+        with etapa("serializacion", proveedor_para(ticker), intervalo):
+            datos = serializar_datos(velas, request.columnar, request.float32)
+        yield evento_sse("datos", {"ticker": ticker, "intervalo": intervalo, "data": datos})
 
+        partes = []
+        try:
+            async for texto in analisis_stream:
+                partes.append(texto)
+                yield evento_sse("token", {"texto": texto})
+        except Exception as e:
+            registrar("error_llm", logging.ERROR, ticker=ticker, intervalo=intervalo, error=str(e))
+            yield evento_sse("error", {"error": f"Error al generar análisis con AI: {str(e)}"})
+            return
 
-# Debug prints al iniciar
-print("🔐 OPENAI_API_KEY:", openai.api_key)
-print("🔐 ALPHA_VANTAGE_API_KEY:", ALPHA_VANTAGE_API_KEY)
+        resultado = "".join(partes)
+        if not estructurado:
+            await guardar_conclusion(ticker, intervalo, data, resultado, temporalidades)
+            yield evento_sse("fin", {"resultado": resultado})
+            return
+        try:
+            analisis = AnalisisEstructurado(**json.loads(resultado))
+        except ValueError as e:
+            # SIN_DATOS u otra respuesta que no es el JSON del esquema
+            yield evento_sse("fin", {"resultado": resultado, "error": f"Análisis sin estructura: {str(e)}"})
+            return
+        await guardar_conclusion(ticker, intervalo, data, analisis.model_dump(), temporalidades)
+        yield evento_sse("fin", {"resultado": texto_analisis(analisis.model_dump()), "analisis": analisis})
 
+    return StreamingResponse(
+        eventos(),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+    )
+
+async def ejecutar_analisis(ticker, intervalo, limite_datos=None, limite_llm=None, estructurado=False,
+                            temporalidades=None):
+    series = None
+    try:
+        async with limite_datos or nullcontext():
+            if temporalidades:
+                series = await obtener_series(cache_mercado, clientes.obtener_cliente_http(), ticker, temporalidades)
+                data = series[intervalo]
+            else:
+                data = await cache_mercado.obtener(clientes.obtener_cliente_http(), ticker, intervalo)
+    except Exception as e:
+        registrar("error_datos", logging.ERROR, ticker=ticker, intervalo=intervalo, error=str(e))
+        return {"error": f"Error obteniendo datos de mercado: {str(e)}"}
 
+    try:
+        async with limite_llm or nullcontext():
+            if series is not None:
+                resultado = await generar_multitemporal_async(ticker, intervalo, series, estructurado)
+            else:
+                resultado = await generar_prompt_y_analizar_async(ticker, intervalo, data, estructurado)
+    except Exception as e:
+        registrar("error_llm", logging.ERROR, ticker=ticker, intervalo=intervalo, error=str(e))
+        return {"error": f"Error al generar análisis con AI: {str(e)}"}
 
-#git add .
-#git commit -m "agrego coingeco datos criptos"
-#git pull
-#git push
+    await guardar_conclusion(ticker, intervalo, data, resultado, temporalidades)
+    registrar("analisis", ticker=ticker, intervalo=intervalo, estructurado=estructurado, velas=len(data),
+              temporalidades=temporalidades,
+              ultima_vela=data.index[-1] if len(data) else None, largo_resultado=len(str(resultado)),
+              etapas_ms={nombre: round(s * 1000, 1) for nombre, s in tiempos_actuales().items()})
 
+    # El DataFrame se serializa en cada endpoint según el formato que pidió el cliente
+    if isinstance(resultado, dict):
+        # Modo estructurado: campos tipados + el mismo texto numerado de siempre en "resultado"
+        respuesta = {
+            "resultado": texto_analisis(resultado),
+            "analisis": AnalisisEstructurado(**resultado),
+            "data": data
+        }
+    else:
+        respuesta = {
+            "resultado": resultado,
+            "data": data
+        }
+    if series is not None:
+        # Velas usadas por temporalidad; "data" es solo la principal
+        respuesta["temporalidades"] = {t: len(serie) for t, serie in series.items()}
+    return respuesta
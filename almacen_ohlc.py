@@ -0,0 +1,162 @@
+import fcntl
+import os
+import re
+from datetime import datetime, timezone
+from zoneinfo import ZoneInfo
+
+import numpy as np
+
+from datos_mercado import BARRAS_COINGECKO, DAYS_MAP
+
+# Un registro por vela; los archivos .bin son arrays crudos de este dtype (np.memmap)
+DTYPE_VELA = np.dtype([
+    ("ts", "<i8"),
+    ("Open", "<f8"),
+    ("High", "<f8"),
+    ("Low", "<f8"),
+    ("Close", "<f8"),
+    ("Volume", "<f8"),
+])
+COLUMNAS = ["Open", "High", "Low", "Close", "Volume"]
+NOMBRE_INDICE = {"coingecko": "timestamp", "kraken": "timestamp", "alpha_vantage": "date", "yfinance": "date"}
+
+# Velas que devuelve outputsize=compact y segundos aproximados de cada intervalo
+VELAS_COMPACT = 100
+# period de yfinance según los días que faltan desde la última vela guardada
+PERIODOS_YF = [(4, "5d"), (25, "1mo"), (85, "3mo")]
+SEGUNDOS_AV = {"15M": 900, "1H": 3600, "1D": 86400, "1W": 7 * 86400, "1M": 30 * 86400}
+# Fracción del tiempo calendario con velas (intradía extendido 4:00-20:00, días hábiles)
+FRACCION_OPERATIVA = {"15M": 16 / 24 * 5 / 7, "1H": 16 / 24 * 5 / 7, "1D": 5 / 7}
+NUEVA_YORK = ZoneInfo("America/New_York")
+
+
+def parametros_delta(proveedor, intervalo, ultimo, ahora=None):
+    """
+    Parámetros de fetch más chicos que cubren las velas faltantes desde `ultimo`
+    (None si todavía no hay nada guardado). `proveedor` es la fuente concreta:
+    cada una guarda su propia serie.
+    """
+    ahora = ahora or datetime.now(timezone.utc)
+
+    if proveedor == "kraken":
+        if ultimo is None:
+            return {}
+        # since en segundos UTC; un segundo antes para volver a pedir la última vela (puede estar incompleta)
+        return {"since": int((ultimo - datetime(1970, 1, 1)).total_seconds()) - 1}
+
+    if proveedor == "yfinance":
+        if ultimo is None:
+            return {}
+        dias = (ahora.astimezone(NUEVA_YORK).replace(tzinfo=None) - ultimo).total_seconds() / 86400
+        return next(({"period": period} for limite, period in PERIODOS_YF if dias < limite), {})
+
+    if proveedor == "coingecko":
+        base = DAYS_MAP.get(intervalo, 1)
+        # Solo valores de "days" con la misma granularidad que la serie guardada
+        banda = sorted(d for d, barra in BARRAS_COINGECKO.items() if barra == BARRAS_COINGECKO[base])
+        if ultimo is None:
+            return {"days": banda[-1]}
+        dias = (ahora.replace(tzinfo=None) - ultimo).total_seconds() / 86400
+        return {"days": next((d for d in banda if d >= dias + 0.1), banda[-1])}
+
+    if ultimo is None or intervalo not in FRACCION_OPERATIVA:
+        return {"outputsize": "full"}
+    # Alpha Vantage entrega fechas en hora de Nueva York
+    transcurrido = (ahora.astimezone(NUEVA_YORK).replace(tzinfo=None) - ultimo).total_seconds()
+    faltantes = transcurrido * FRACCION_OPERATIVA[intervalo] / SEGUNDOS_AV[intervalo]
+    return {"outputsize": "compact" if faltantes < VELAS_COMPACT * 0.9 else "full"}
+
+
+class AlmacenOHLC:
+    """
+    Series OHLC persistentes por (proveedor, símbolo, intervalo) en archivos
+    binarios de registros fijos. Se leen con np.memmap y las velas nuevas se
+    agregan al final: solo se reescribe el tramo que se solapa con lo recibido.
+    """
+
+    def __init__(self, directorio, max_velas=5000):
+        self.directorio = directorio
+        self.max_velas = max_velas
+
+    def _ruta(self, proveedor, ticker, intervalo):
+        nombre = re.sub(r"[^A-Za-z0-9_.-]", "-", f"{proveedor}_{ticker}_{intervalo}")
+        return os.path.join(self.directorio, nombre + ".bin")
+
+    @staticmethod
+    def _mapear(ruta):
+        if not os.path.exists(ruta) or os.path.getsize(ruta) < DTYPE_VELA.itemsize:
+            return np.empty(0, dtype=DTYPE_VELA)
+        return np.memmap(ruta, dtype=DTYPE_VELA, mode="r")
+
+    def _copiar_ultimas(self, ruta, velas=None):
+        # Lock compartido: un escritor podría truncar el archivo mientras está mapeado
+        if not os.path.exists(ruta):
+            return np.empty(0, dtype=DTYPE_VELA)
+        fd = os.open(ruta, os.O_RDONLY)
+        try:
+            fcntl.flock(fd, fcntl.LOCK_SH)
+            registros = self._mapear(ruta)
+            return np.array(registros[-velas:] if velas else registros)
+        finally:
+            fcntl.flock(fd, fcntl.LOCK_UN)
+            os.close(fd)
+
+    def ultimo_ts(self, proveedor, ticker, intervalo):
+        import pandas as pd
+
+        ultima = self._copiar_ultimas(self._ruta(proveedor, ticker, intervalo), 1)
+        if not len(ultima):
+            return None
+        return pd.Timestamp(int(ultima["ts"][-1]), unit="ns")
+
+    def leer(self, proveedor, ticker, intervalo, velas=None):
+        import pandas as pd
+
+        registros = self._copiar_ultimas(self._ruta(proveedor, ticker, intervalo), velas)
+        if not len(registros):
+            return None
+
+        data = pd.DataFrame(
+            {col: registros[col] for col in COLUMNAS},
+            index=pd.DatetimeIndex(pd.to_datetime(registros["ts"], unit="ns"),
+                                   name=NOMBRE_INDICE.get(proveedor)),
+        )
+        if data["Volume"].isna().all():
+            # CoinGecko no trae volumen: mismo formato que antes (columna None)
+            data["Volume"] = None
+        return data
+
+    def agregar(self, proveedor, ticker, intervalo, data):
+        if data is None or data.empty:
+            return
+        data = data.sort_index()
+        nuevos = np.empty(len(data), dtype=DTYPE_VELA)
+        nuevos["ts"] = data.index.values.astype("datetime64[ns]").astype("i8")
+        for col in COLUMNAS:
+            nuevos[col] = data[col].to_numpy(dtype=float, na_value=np.nan)
+
+        ruta = self._ruta(proveedor, ticker, intervalo)
+        # El directorio se crea con la primera vela guardada, no al importar la API
+        os.makedirs(self.directorio, exist_ok=True)
+        fd = os.open(ruta, os.O_RDWR | os.O_CREAT, 0o644)
+        try:
+            # Lock exclusivo: varios workers de uvicorn escriben el mismo archivo
+            fcntl.flock(fd, fcntl.LOCK_EX)
+            existentes = self._mapear(ruta)
+            # Las velas desde el primer timestamp recibido se reemplazan (la última puede estar incompleta)
+            conservar = int(np.searchsorted(existentes["ts"], nuevos["ts"][0], side="left"))
+            del existentes
+            os.ftruncate(fd, conservar * DTYPE_VELA.itemsize)
+            os.lseek(fd, 0, os.SEEK_END)
+            os.write(fd, nuevos.tobytes())
+            if conservar + len(nuevos) > self.max_velas * 1.5:
+                self._recortar(fd, ruta)
+        finally:
+            fcntl.flock(fd, fcntl.LOCK_UN)
+            os.close(fd)
+
+    def _recortar(self, fd, ruta):
+        ultimas = np.array(self._mapear(ruta)[-self.max_velas:])
+        os.ftruncate(fd, 0)
+        os.lseek(fd, 0, os.SEEK_SET)
+        os.write(fd, ultimas.tobytes())
@@ -1,14 +1,124 @@
-import openai
+import json
+import logging
 
+from cache_llm import crear_cache_llm
+from clientes import obtener_cliente_openai
+from datos_mercado import proveedor_para
+from metricas import etapa, registrar
 
-def generar_prompt_y_analizar(ticker, intervalo, data):
-    if data is None or data.empty:
-        return "No hay datos de mercado disponibles para analizar el ticker solicitado."
-    # ...resto de tu función...
+MODELO = "gpt-4o"
+TEMPERATURA = 0.4
+MAX_TOKENS = 1200
+# Subir VERSION_PROMPT al cambiar el texto del prompt invalida la caché de resultados
+VERSION_PROMPT = 2
+# Velas crudas que se mandan junto al resumen de indicadores
+FILAS_TABLA = 30
+# En multi-temporalidad van menos velas por temporalidad: el resumen ya lleva el contexto
+FILAS_TABLA_MTF = 10
+SIN_DATOS = "No hay datos de mercado disponibles para analizar el ticker solicitado."
+# En modo estructurado no hay títulos ni texto de relleno: alcanza un presupuesto menor
+MAX_TOKENS_ESTRUCTURADO = 900
+
+# Secciones del análisis: campo del JSON -> título del bloque numerado
+SECCIONES = {
+    "resumen_tecnico": "Resumen Técnico",
+    "pivots": "Pivots Mensuales",
+    "probabilidad": "Probabilidad de Subida o Bajada en %",
+    "proyeccion": "Proyección de Precios Target y Stop Loss",
+    "riesgo_beneficio": "Evaluación de Riesgo/Beneficio",
+}
+CAMPOS_CONCLUSION = ["last_price", "probable_target", "probable_stop", "risk_reward_ratio", "probability"]
+
+ESQUEMA_ANALISIS = {
+    "type": "object",
+    "properties": {
+        **{campo: {"type": "string"} for campo in SECCIONES},
+        "conclusion": {
+            "type": "object",
+            "properties": {campo: {"type": "number"} for campo in CAMPOS_CONCLUSION},
+            "required": CAMPOS_CONCLUSION,
+            "additionalProperties": False,
+        },
+    },
+    "required": [*SECCIONES, "conclusion"],
+    "additionalProperties": False,
+}
+FORMATO_ESTRUCTURADO = {
+    "type": "json_schema",
+    "json_schema": {"name": "analisis_tecnico", "strict": True, "schema": ESQUEMA_ANALISIS},
+}
+
+_cache_llm = None
+
+
+def obtener_cache_llm():
+    global _cache_llm
+    if _cache_llm is None:
+        _cache_llm = crear_cache_llm()
+    return _cache_llm
+
+
+def renderizar_datos(intervalo, data):
+    # indicadores trae numpy/pandas: se carga en el primer análisis, no al arrancar
+    from indicadores import calcular_indicadores, formatear_resumen, tabla_compacta
+
+    # Indicadores calculados localmente + últimas velas con precisión reducida
+    resumen = formatear_resumen(calcular_indicadores(data, intervalo))
+    tabla = tabla_compacta(data, FILAS_TABLA)
+    return resumen, tabla
+
+
+def clave_resultado(ticker, intervalo, contenido):
+    return obtener_cache_llm().clave(MODELO, TEMPERATURA, VERSION_PROMPT, ticker, intervalo, contenido)
+
+
+def preparar_prompt(ticker, intervalo, data, estructurado=False):
+    with etapa("prompt", proveedor_para(ticker), intervalo):
+        resumen, tabla = renderizar_datos(intervalo, data)
+        contenido = resumen + "\n" + tabla
+        if estructurado:
+            # El resultado es un dict y no texto: no puede compartir entrada con el modo libre
+            contenido = "json\n" + contenido
+        clave = clave_resultado(ticker, intervalo, contenido)
+        return clave, construir_prompt(ticker, intervalo, tabla, resumen, estructurado)
+
+
+def parametros_modelo(estructurado):
+    if estructurado:
+        return {"max_tokens": MAX_TOKENS_ESTRUCTURADO, "response_format": FORMATO_ESTRUCTURADO}
+    return {"max_tokens": MAX_TOKENS}
+
+
+def leer_estructurado(message):
+    # Con strict=True el contenido siempre cumple el esquema, salvo que el modelo se niegue
+    if getattr(message, "refusal", None):
+        raise ValueError(f"El modelo rechazó el análisis: {message.refusal}")
+    return json.loads(message.content)
+
+
+def respuesta_completa(finish_reason, ticker, intervalo, estructurado):
+    # "length": el modelo llegó a max_tokens y la respuesta quedó cortada; no se guarda en caché.
+    # En modo estructurado el JSON queda inválido, así que se corta con un error claro.
+    if finish_reason != "length":
+        return True
+    limite = parametros_modelo(estructurado)["max_tokens"]
+    registrar("respuesta_truncada", logging.WARNING, ticker=ticker, intervalo=intervalo, max_tokens=limite)
+    if estructurado:
+        raise ValueError(f"El modelo cortó la respuesta al llegar a max_tokens ({limite}); el JSON quedó incompleto")
+    return False
 
 
-    tabla = data[["Open", "High", "Low", "Close", "Volume"]].to_csv(index=True)
+def texto_analisis(analisis):
+    """Versión en texto del análisis estructurado, con los mismos bloques numerados del modo libre."""
+    bloques = [
+        f"{numero}. {titulo}:\n{analisis[campo]}"
+        for numero, (campo, titulo) in enumerate(SECCIONES.items(), start=1)
+    ]
+    conclusion = json.dumps({"conclusion": analisis["conclusion"]}, ensure_ascii=False)
+    return "\n\n".join(bloques) + f"\n\nConclusion:\n{conclusion}"
 
+
+def horizonte_para(intervalo):
     if intervalo == "15M":
         horizonte = "las próximas 8 a 24 horas"
     elif intervalo == "1H":
@@ -21,9 +131,17 @@ def generar_prompt_y_analizar(ticker, intervalo, data):
         horizonte = "los próximos meses"
     else:
         horizonte = "los próximos días"
+    return horizonte
 
-    prompt = f"""
-Usa el análisis técnico más detallado posible y responde en cinco bloques, siempre usando estos títulos exactos (los números y los dos puntos son obligatorios):
+
+def formato_respuesta(estructurado):
+    if estructurado:
+        return """Usa el análisis técnico más detallado posible y responde con el objeto JSON del esquema:
+- resumen_tecnico, pivots, probabilidad, proyeccion y riesgo_beneficio: el texto de cada sección, sin títulos ni numeración.
+- conclusion: valores numéricos (sin símbolos) de last_price, probable_target, probable_stop, risk_reward_ratio y probability (porcentaje de 0 a 100).
+
+"""
+    return """Usa el análisis técnico más detallado posible y responde en cinco bloques, siempre usando estos títulos exactos (los números y los dos puntos son obligatorios):
 
 1. Resumen Técnico:
 2. Pivots Mensuales:
@@ -35,34 +153,220 @@ Conclusion:
 Al final del análisis, **devuelve únicamente la conclusión en una línea de JSON estrictamente válido. NO EXPLIQUES, NO COMENTES, NO AGREGUES TEXTO ANTES O DESPUÉS.**
 Solo el bloque JSON, así (esto es SOLO FORMATO, NO valores reales):
 
-{{"conclusion": {{"last_price": X, "probable_target": X, "probable_stop": X, "risk_reward_ratio": X, "probability": X}}}}
+{"conclusion": {"last_price": X, "probable_target": X, "probable_stop": X, "risk_reward_ratio": X, "probability": X}}
 
 Solo entrega ese bloque de JSON, en una sola línea, al final del análisis.
 
-Para el análisis utiliza los siguientes datos históricos del ticker {ticker} en temporalidad {intervalo}:
-{tabla}
+"""
+
+
+def construir_prompt(ticker, intervalo, tabla, resumen=None, estructurado=False):
+    horizonte = horizonte_para(intervalo)
+
+    if resumen:
+        datos = f"""Indicadores calculados localmente para {ticker} en temporalidad {intervalo} (son exactos, úsalos tal cual en lugar de recalcularlos):
+{resumen}
+
+Últimas velas:
+{tabla}"""
+        pivots = "- Usa los pivots clásicos precalculados e indica su dirección (alcista o bajista)."
+        estructura = "- Apóyate en la regresión, volatilidad, ATR, EMAs, rango y swings precalculados para detectar estructuras coherentes."
+    else:
+        datos = f"""Para el análisis utiliza los siguientes datos históricos del ticker {ticker} en temporalidad {intervalo}:
+{tabla}"""
+        pivots = "- Calcula los pivots mensuales o diarios segun veas relevante con su dirección (alcista o bajista)."
+        estructura = "- Usa regresión, volatilidad, rangos para detectar estructuras coherentes."
+
+    formato = formato_respuesta(estructurado)
+
+    prompt = f"""
+{formato}{datos}
 
 Analiza y responde:
 - Revisa la tendencia general y detecta impulsos y retrocesos relevantes.
-- Calcula los pivots mensuales o diarios segun veas relevante con su dirección (alcista o bajista).
+{pivots}
 - Dame la probabilidad de subida o bajada para {horizonte}.
 - Proyecta precios target y stop loss realistas y especifica en negrita si es alcista o bajista.
-- Usa regresión, volatilidad, rangos para detectar estructuras coherentes.
+{estructura}
 - Dame el resultado de riesgo/recompenza utilizando los valores de target y stop
 - Explica cómo llegaste al resultado y qué métodos usaste.
 """  # ← SOLO AQUÍ CIERRAS LAS TRES COMILLAS
 
-    client = openai.OpenAI()
-    response = client.chat.completions.create(
-        model="gpt-4o",
-        messages=[{"role": "user", "content": prompt}],
-        temperature=0.4,
-        max_tokens=1200
+    return prompt
+
+
+def preparar_prompt_multitemporal(ticker, principal, series, estructurado=False):
+    # indicadores trae numpy/pandas: se carga en el primer análisis, no al arrancar
+    from indicadores import calcular_indicadores, formatear_resumen, tabla_compacta
+
+    with etapa("prompt", proveedor_para(ticker), "MTF"):
+        bloques = [
+            (intervalo, formatear_resumen(calcular_indicadores(data, intervalo)), tabla_compacta(data, FILAS_TABLA_MTF))
+            for intervalo, data in series.items() if data is not None and not data.empty
+        ]
+        contenido = "\n".join(f"{intervalo}\n{resumen}\n{tabla}" for intervalo, resumen, tabla in bloques)
+        if estructurado:
+            contenido = "json\n" + contenido
+        clave = clave_resultado(ticker, f"MTF:{principal}", contenido)
+        return clave, construir_prompt_multitemporal(ticker, principal, bloques, estructurado)
+
+
+def construir_prompt_multitemporal(ticker, principal, bloques, estructurado=False):
+    horizonte = horizonte_para(principal)
+    datos = "\n\n".join(
+        f"""Temporalidad {intervalo}:
+{resumen}
+
+Últimas velas {intervalo}:
+{tabla}"""
+        for intervalo, resumen, tabla in bloques
     )
 
-    return response.choices[0].message.content
+    prompt = f"""
+{formato_respuesta(estructurado)}Indicadores calculados localmente para {ticker} en varias temporalidades (son exactos, úsalos tal cual en lugar de recalcularlos):
+
+{datos}
+
+Analiza y responde:
+- Revisa la tendencia de cada temporalidad, de la mayor a la menor, y señala dónde coinciden y dónde se contradicen.
+- Usa los pivots clásicos precalculados de cada temporalidad e indica su dirección (alcista o bajista).
+- Dame la probabilidad de subida o bajada para {horizonte} en temporalidad {principal}, ponderando el contexto de las temporalidades mayores.
+- Proyecta precios target y stop loss realistas para la temporalidad {principal} y especifica en negrita si es alcista o bajista.
+- Apóyate en la regresión, volatilidad, ATR, EMAs, rango y swings precalculados para detectar estructuras coherentes.
+- Dame el resultado de riesgo/recompenza utilizando los valores de target y stop
+- Explica cómo llegaste al resultado y qué métodos usaste.
+"""
+
+    return prompt
+
+
+def generar_prompt_y_analizar(ticker, intervalo, data, estructurado=False):
+    """
+    Devuelve el análisis en texto libre o, con estructurado=True, un dict con las
+    cinco secciones y la conclusión según ESQUEMA_ANALISIS.
+    """
+    if data is None or data.empty:
+        return SIN_DATOS
+
+    clave, prompt = preparar_prompt(ticker, intervalo, data, estructurado)
+    resultado = obtener_cache_llm().obtener(clave)
+    if resultado is not None:
+        return resultado
+
+    import openai
+
+    client = openai.OpenAI()
+    with etapa("llm", proveedor_para(ticker), intervalo):
+        response = client.chat.completions.create(
+            model=MODELO,
+            messages=[{"role": "user", "content": prompt}],
+            temperature=TEMPERATURA,
+            **parametros_modelo(estructurado)
+        )
+
+    completa = respuesta_completa(response.choices[0].finish_reason, ticker, intervalo, estructurado)
+    message = response.choices[0].message
+    resultado = leer_estructurado(message) if estructurado else message.content
+    if completa:
+        obtener_cache_llm().guardar(clave, resultado)
+    return resultado
+
+
+async def completar_async(clave, prompt, ticker, intervalo, estructurado=False):
+    # Caché de resultados + llamada al modelo sin bloquear el event loop
+    resultado = await obtener_cache_llm().obtener_async(clave)
+    if resultado is not None:
+        return resultado
+
+    client = obtener_cliente_openai()
+    with etapa("llm", proveedor_para(ticker), intervalo):
+        response = await client.chat.completions.create(
+            model=MODELO,
+            messages=[{"role": "user", "content": prompt}],
+            temperature=TEMPERATURA,
+            **parametros_modelo(estructurado)
+        )
+
+    completa = respuesta_completa(response.choices[0].finish_reason, ticker, intervalo, estructurado)
+    message = response.choices[0].message
+    resultado = leer_estructurado(message) if estructurado else message.content
+    if completa:
+        await obtener_cache_llm().guardar_async(clave, resultado)
+    return resultado
+
+
+async def completar_stream(clave, prompt, ticker, intervalo, estructurado=False):
+    # Va entregando los fragmentos de texto según llegan del modelo.
+    # En modo estructurado los fragmentos son del JSON; el texto completo se parsea al final.
+    resultado = await obtener_cache_llm().obtener_async(clave)
+    if resultado is not None:
+        yield json.dumps(resultado, ensure_ascii=False) if estructurado else resultado
+        return
+
+    client = obtener_cliente_openai()
+    partes, fin = [], None
+    # Incluye el tiempo que el cliente tarda en consumir cada fragmento
+    with etapa("llm", proveedor_para(ticker), intervalo):
+        stream = await client.chat.completions.create(
+            model=MODELO,
+            messages=[{"role": "user", "content": prompt}],
+            temperature=TEMPERATURA,
+            stream=True,
+            **parametros_modelo(estructurado)
+        )
+
+        async for chunk in stream:
+            if not chunk.choices:
+                continue
+            fin = chunk.choices[0].finish_reason or fin
+            texto = chunk.choices[0].delta.content
+            if texto:
+                partes.append(texto)
+                yield texto
+
+    if respuesta_completa(fin, ticker, intervalo, estructurado):
+        resultado = "".join(partes)
+        await obtener_cache_llm().guardar_async(clave, json.loads(resultado) if estructurado else resultado)
+
+
+async def generar_prompt_y_analizar_async(ticker, intervalo, data, estructurado=False):
+    # Misma lógica que generar_prompt_y_analizar pero sin bloquear el event loop
+    if data is None or data.empty:
+        return SIN_DATOS
+
+    clave, prompt = preparar_prompt(ticker, intervalo, data, estructurado)
+    return await completar_async(clave, prompt, ticker, intervalo, estructurado)
+
+
+async def generar_analisis_stream(ticker, intervalo, data, estructurado=False):
+    # Versión streaming de generar_prompt_y_analizar_async
+    if data is None or data.empty:
+        yield SIN_DATOS
+        return
+
+    clave, prompt = preparar_prompt(ticker, intervalo, data, estructurado)
+    async for texto in completar_stream(clave, prompt, ticker, intervalo, estructurado):
+        yield texto
+
+
+async def generar_multitemporal_async(ticker, principal, series, estructurado=False):
+    """
+    Un solo análisis (una llamada al modelo) con todas las temporalidades de
+    `series` ({intervalo: DataFrame}); target, stop y probabilidad son para
+    la temporalidad `principal`.
+    """
+    if series[principal] is None or series[principal].empty:
+        return SIN_DATOS
+
+    clave, prompt = preparar_prompt_multitemporal(ticker, principal, series, estructurado)
+    return await completar_async(clave, prompt, ticker, "MTF", estructurado)
+
+
+async def generar_multitemporal_stream(ticker, principal, series, estructurado=False):
+    if series[principal] is None or series[principal].empty:
+        yield SIN_DATOS
+        return
 
-#git add .
-#git commit -m "Corrijo formato de prompt RR"
-#git pull
-#git push
+    clave, prompt = preparar_prompt_multitemporal(ticker, principal, series, estructurado)
+    async for texto in completar_stream(clave, prompt, ticker, "MTF", estructurado):
+        yield texto
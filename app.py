@@ -1,14 +1,7 @@
 import streamlit as st
 import json
-import pandas as pd
-import investpy
-import openai
-import matplotlib.pyplot as plt
-import numpy as np
 import time
-import datetime
-from alpha_vantage.timeseries import TimeSeries
-from analysis import generar_prompt_y_analizar
+from formato_ohlc import dataframe_desde_columnas
 import re
 import requests
 
@@ -29,8 +22,6 @@ def extract_numbered_blocks(text):
     conclusion = conc_match.group(1).strip() if conc_match else ""
     return bloques, conclusion
 
-import csv
-import io
 
 
 
@@ -59,6 +50,23 @@ def extraer_conclusion_json(text):
     return None
 
 
+def campos_parciales(text, campos):
+    """
+    Lee los campos de texto de un JSON que todavía se está escribiendo
+    (modo estructurado en streaming). Devuelve {campo: texto hasta ahora},
+    incluyendo el último campo aunque su string aún no se haya cerrado.
+    """
+    parciales = {}
+    for campo in campos:
+        match = re.search(r'"%s"\s*:\s*"((?:[^"\\]|\\.)*)' % campo, text)
+        if match:
+            # Un escape \u cortado a la mitad (p. ej. \u00) se descarta hasta que llegue completo
+            valor = re.sub(r'(?<!\\)\\u[0-9a-fA-F]{0,3}$', '', match.group(1))
+            try:
+                parciales[campo] = json.loads(f'"{valor}"')
+            except ValueError:
+                parciales[campo] = valor
+    return parciales
 
 
 
@@ -67,7 +75,6 @@ def extraer_conclusion_json(text):
 # ============ FIN DE SECCIÓN NUEVA ============
 # Configuración general
 st.set_page_config(page_title="Análisis de MARKET MAP AI", layout="wide")
-openai.api_key = st.secrets["OPENAI_API_KEY"]
 # Inicializa ticker seleccionado
 if 'selected_ticker' not in st.session_state:
     st.session_state['selected_ticker'] = "AAPL"
@@ -78,24 +85,145 @@ if 'selected_ticker' not in st.session_state:
 # =====================
 import requests
 
-@st.cache_data(ttl=3600)
-def obtener_datos_y_analisis(ticker, selected_interval):
-    # Cambia la URL si tu backend está en otro host/puerto
-    url = "http://127.0.0.1:8000/analizar"
+# Cuánto retiene el backend cada consulta de /jobs/{id} (long-poll) y cuánto se espera un trabajo en total
+ESPERA_TRABAJO = 20
+TIMEOUT_TRABAJO = 300
+
+
+def analisis_por_trabajo(ticker, selected_interval, multitemporal=False):
+    """
+    Encola el análisis en /jobs/analizar y consulta /jobs/{id} con long-poll.
+    Devuelve las mismas tuplas (evento, datos) que stream_analisis, más
+    "estado" mientras el trabajo está en cola o en proceso.
+    """
     payload = {
         "ticker": ticker,
-        "intervalo": selected_interval
+        "intervalo": selected_interval,
+        "estructurado": True,
+        "columnar": True,
+        "float32": True,
+        "velas": VELAS_GRAFICO,
+        "multitemporal": multitemporal
     }
     try:
-        response = requests.post(url, json=payload, timeout=60)
-        if response.status_code == 200:
-            data = response.json()
-            resultado = data.get("resultado", "")
-            return None, resultado  # El primer valor (data) es None, a menos que necesites reconstruir un DataFrame en el frontend
-        else:
-            return None, f"Error en API: {response.text}"
+        response = requests.post("http://127.0.0.1:8000/jobs/analizar", json=payload, timeout=10)
+        if response.status_code == 503:
+            espera = response.headers.get("Retry-After", "unos")
+            yield "error", {"error": f"El servidor está ocupado, vuelve a intentar en {espera} segundos."}
+            return
+        if response.status_code != 202:
+            yield "error", {"error": f"Error en API: {response.text}"}
+            return
+        trabajo = response.json()
+        limite = time.time() + TIMEOUT_TRABAJO
+        while trabajo["estado"] not in ("listo", "error") and time.time() < limite:
+            yield "estado", trabajo
+            response = requests.get(f"http://127.0.0.1:8000/jobs/{trabajo['id']}",
+                                    params={"espera": ESPERA_TRABAJO}, timeout=ESPERA_TRABAJO + 10)
+            response.raise_for_status()
+            trabajo = response.json()
+    except Exception as e:
+        yield "error", {"error": f"Error conectando con backend: {e}"}
+        return
+
+    if trabajo["estado"] == "error":
+        yield "error", {"error": trabajo["error"]}
+    elif trabajo["estado"] != "listo":
+        yield "error", {"error": "El análisis sigue en proceso; vuelve a intentar en unos minutos."}
+    else:
+        resultado = trabajo["resultado"]
+        yield "datos", {"data": resultado["data"]}
+        yield "fin", {"resultado": resultado["resultado"], "analisis": resultado.get("analisis")}
+
+
+# Velas que se piden al backend para graficar
+VELAS_GRAFICO = 120
+
+
+# Barra de activos: cotizaciones del backend (/quotes), sondeadas con ETag
+TICKERS_BARRA = ["AAPL", "MSFT", "GOOGL", "AMZN", "NVDA", "TSLA"]
+SONDEO_COTIZACIONES = 15
+
+
+def cotizaciones_barra():
+    """
+    Pide /quotes con el ETag de la última respuesta: si nada se movió el
+    backend contesta 304 sin cuerpo y se reutiliza lo guardado en la sesión.
+    """
+    previo = st.session_state.get('cotizaciones')
+    headers = {"If-None-Match": previo["etag"]} if previo and previo.get("etag") else {}
+    try:
+        response = requests.get("http://127.0.0.1:8000/quotes", params={"symbols": ",".join(TICKERS_BARRA)},
+                                headers=headers, timeout=3)
+        if response.status_code == 304:
+            return previo["datos"]
+        response.raise_for_status()
+        datos = response.json()["cotizaciones"]
+        st.session_state['cotizaciones'] = {"etag": response.headers.get("ETag"), "datos": datos}
+        return datos
+    except Exception:
+        return previo["datos"] if previo else {}
+
+
+@st.cache_data(ttl=300, max_entries=256)
+def buscar_simbolos(consulta):
+    # Autocompletado de criptos contra el índice local del backend
+    try:
+        response = requests.get("http://127.0.0.1:8000/symbols/search",
+                                params={"q": consulta, "limite": 8}, timeout=2)
+        response.raise_for_status()
+        return response.json()["resultados"]
+    except Exception:
+        return []
+
+
+def stream_analisis(ticker, selected_interval, multitemporal=False):
+    """
+    Consume /analizar/stream (Server-Sent Events) y devuelve tuplas (evento, datos)
+    a medida que llegan: primero "datos" con el OHLC, luego "token" y al final "fin".
+    """
+    url = "http://127.0.0.1:8000/analizar/stream"
+    payload = {
+        "ticker": ticker,
+        "intervalo": selected_interval,
+        "estructurado": True,
+        # OHLC en arrays paralelos: se decodifica sin un dict por vela
+        "columnar": True,
+        "float32": True,
+        "velas": VELAS_GRAFICO,
+        # Todas las temporalidades en un solo análisis, armadas de una o dos descargas
+        "multitemporal": multitemporal
+    }
+    try:
+        with requests.post(url, json=payload, stream=True, timeout=(5, 60)) as response:
+            if response.status_code != 200:
+                # Saturado o sin el endpoint: el análisis todavía puede ir por la cola de trabajos
+                yield "error", {"error": f"Error en API: {response.text}",
+                                "respaldo": response.status_code in (404, 429, 502, 503, 504)}
+                return
+            evento = None
+            for linea in response.iter_lines(decode_unicode=True):
+                if linea.startswith("event:"):
+                    evento = linea[len("event:"):].strip()
+                elif linea.startswith("data:"):
+                    yield evento, json.loads(linea[len("data:"):])
     except Exception as e:
-        return None, f"Error conectando con backend: {e}"
+        yield "error", {"error": f"Error conectando con backend: {e}", "respaldo": True}
+
+
+def analisis_con_respaldo(ticker, selected_interval, multitemporal=False):
+    """
+    Streaming por defecto (el texto aparece apenas el modelo empieza a escribir).
+    Si /analizar/stream falla antes de mandar nada o responde saturado, el
+    análisis se encola en /jobs/analizar y se consulta hasta que esté listo.
+    """
+    recibidos = 0
+    for evento, datos in stream_analisis(ticker, selected_interval, multitemporal):
+        if evento == "error" and not recibidos and datos.get("respaldo"):
+            yield from analisis_por_trabajo(ticker, selected_interval, multitemporal)
+            return
+        recibidos += 1
+        yield evento, datos
 
 
 
@@ -269,25 +397,21 @@ div[role="radiogroup"] > label > div:first-child {
 # =====================
 st.title("Análisis MARKET MAP AI")
 
-tickers = ["AAPL", "MSFT", "TSLA", "GOOGL", "NVDA","AMZN"]
 intervalos = ["1h", "1d", "1wk"]
-# --- NUEVA barra de control horizontal ---
-ticker_changes = {
-    "AAPL": "+1.2%",
-    "MSFT": "+0.8%",
-    "GOOGL": "-0.5%",
-    "AMZN": "+1.7%",
-    "NVDA": "-1.2",
-    "TSLA": "+2.3%"
-}
-tickers = list(ticker_changes.keys())
+tickers = list(TICKERS_BARRA)
 
 st.markdown("<div class='symbol-card'>", unsafe_allow_html=True)
 col1, col2, col3 = st.columns([5, 2, 4])
 
-with col1:
+
+# Solo la barra se vuelve a ejecutar cada SONDEO_COTIZACIONES segundos, no todo el script
+@st.fragment(run_every=SONDEO_COTIZACIONES)
+def barra_activos():
     st.markdown("**Activos**", unsafe_allow_html=True)
-    for symbol, change in ticker_changes.items():
+    cotizaciones = cotizaciones_barra()
+    for symbol in TICKERS_BARRA:
+        cambio = (cotizaciones.get(symbol) or {}).get("cambio_pct")
+        change = f"{cambio:+.1f}%" if cambio is not None else "—"
         css_class = "symbol-button"
         if symbol == st.session_state['selected_ticker']:
             css_class += " symbol-selected"
@@ -297,9 +421,18 @@ with col1:
             css_class += " positive"
         if st.button(f"{symbol} {change}", key=f"btn_{symbol}"):
             st.session_state['selected_ticker'] = symbol
+            # Dentro del fragmento el click solo reejecuta la barra: se pide la app completa
+            st.rerun()
+
+
+with col1:
+    barra_activos()
 
 with col2:
     st.markdown("**Ticker**", unsafe_allow_html=True)
+    # Una cripto elegida en el buscador se agrega a las opciones
+    if st.session_state['selected_ticker'] not in tickers:
+        tickers = tickers + [st.session_state['selected_ticker']]
     ticker = st.selectbox(
         "",
         tickers,
@@ -309,6 +442,18 @@ with col2:
     if ticker != st.session_state['selected_ticker']:
         st.session_state['selected_ticker'] = ticker
 
+    consulta = st.text_input("", placeholder="🔎 Buscar cripto (BTC, sol, pepe...)", key="symbol_search")
+    if consulta.strip():
+        encontrados = buscar_simbolos(consulta.strip())
+        if encontrados:
+            opciones = {f"{r['simbolo']} · {r['nombre']}": r["ticker"] for r in encontrados}
+            elegido = st.selectbox("", list(opciones), key="symbol_search_resultado")
+            if st.button("Analizar", key="btn_symbol_search"):
+                st.session_state['selected_ticker'] = opciones[elegido]
+                st.rerun()
+        else:
+            st.caption("Sin resultados")
+
 with col3:
     st.markdown("**Temporalidad**", unsafe_allow_html=True)
     selected_interval = st.radio(
@@ -344,8 +489,6 @@ with col3:
     """, unsafe_allow_html=True)
 
 
-import matplotlib.pyplot as plt
-
 # --- Título y datos de ejemplo (usa tus propios datos reales) ---
 st.markdown("""
 <div style="background-color:#1e2533; padding: 28px 32px 32px 32px; border-radius: 18px; margin-bottom: 20px;">
@@ -366,12 +509,31 @@ st.markdown("""
     </div>
 """, unsafe_allow_html=True)
 
-# --- Simula tus precios. En la vida real usa tu dataframe de precios! ---
-import numpy as np
-import pandas as pd
-np.random.seed(1)
-dias = pd.date_range("2024-03-08", "2024-06-06", freq="B")
-precios = np.cumsum(np.random.normal(0.6, 1.1, len(dias))) + 164
+# Gráficos rasterizados cacheados por hash de sus datos (st.cache_data hashea los argumentos)
+MAX_GRAFICOS = 32
+
+
+@st.cache_data(max_entries=MAX_GRAFICOS, show_spinner=False)
+def png_ohlc(data, niveles=None, figsize=(8.5, 4), titulo=None):
+    # graficos (matplotlib) se importa solo cuando hay algo que dibujar
+    import graficos
+    return graficos.a_png(graficos.grafico_ohlc(data, niveles, figsize, titulo))
+
+
+@st.cache_data(max_entries=MAX_GRAFICOS, show_spinner=False)
+def png_proyeccion(last, target, stop):
+    import graficos
+    return graficos.a_png(graficos.grafico_proyeccion(last, target, stop))
+
+
+def mostrar_velas(data, niveles=None, figsize=(8.5, 4), titulo=None):
+    if st.session_state.get('graficos_cliente'):
+        import graficos
+        # Series crudas al navegador; Vega-Lite dibuja del lado del cliente
+        st.vega_lite_chart(data.reset_index(names="ts"), graficos.spec_velas(niveles, titulo),
+                           use_container_width=True)
+    else:
+        st.image(png_ohlc(data, niveles, figsize, titulo), use_container_width=True)
 
 
 # Inicializa variables para que nunca estén indefinidas
@@ -389,26 +551,6 @@ conclusion_json = None
 # Cuando obtienes el resultado, haz:
 
 
-if st.button("🔍 Obtener análisis", key="analisis_btn"):
-    with st.spinner("Market Map AI is Generating the Analysis"):
-        data, resultado = obtener_datos_y_analisis(ticker, selected_interval)
-        bloques, conclusion_text = extract_numbered_blocks(resultado)
-        conclusion_json = extraer_conclusion_json(resultado)
-        st.session_state['ultimo_analisis'] = (data, resultado)
-        st.session_state['bloques'] = bloques
-        st.session_state['conclusion'] = conclusion_text
-        st.session_state['conclusion_json'] = conclusion_json
-        st.write("DEBUG - Texto de conclusión:", repr(conclusion_text))
-        st.write("DEBUG - JSON de conclusión:", conclusion_json)
-        # Actualiza variables locales también, para el render inmediato
-        conclusion = conclusion_text
-elif 'bloques' in st.session_state:
-    bloques = st.session_state['bloques']
-    conclusion = st.session_state.get('conclusion', "")
-    conclusion_json = st.session_state.get('conclusion_json', None)
-
-
-
 # ================== MOSTRAR SECCIONES ==================
 def seccion_html(titulo, contenido, emoji):
     return f"""
@@ -422,6 +564,77 @@ def seccion_html(titulo, contenido, emoji):
     </div>
     """
 
+
+# Secciones numeradas del prompt: número -> (título, emoji)
+SECCIONES = {
+    1: ("Resumen Técnico", "🤖"),
+    2: ("Pivots Mensuales", "📍"),
+    3: ("Probabilidad de Subida o Bajada", "📊"),
+    4: ("Proyección de Precios Target y Stop Loss", "🎯"),
+    5: ("Evaluación de Riesgo/Beneficio", "⚖️"),
+}
+# Campos del análisis estructurado (mismo orden que las secciones numeradas)
+CAMPOS_ANALISIS = ["resumen_tecnico", "pivots", "probabilidad", "proyeccion", "riesgo_beneficio"]
+
+
+st.toggle("🧭 Combinar las cinco temporalidades", key="multitemporal", value=False,
+          help="Un solo análisis con 15M, 1H, 1D, 1W y 1M; target y stop son de la temporalidad elegida. No lo adelanta el precómputo de la watchlist")
+st.toggle("📡 Ver el análisis mientras se escribe", key="streaming", value=True,
+          help="Muestra el análisis a medida que se escribe (si el servidor está saturado, pasa a la cola de trabajos); "
+               "desactivado, el análisis se encola y se consulta hasta que esté listo")
+if st.button("🔍 Obtener análisis", key="analisis_btn"):
+    data, resultado, analisis = None, "", None
+    vista_previa = st.empty()
+    vista_previa.info("Market Map AI is Generating the Analysis")
+    ultima_vista = 0.0
+    obtener = analisis_con_respaldo if st.session_state.get('streaming', True) else analisis_por_trabajo
+    for evento, datos in obtener(ticker, selected_interval, st.session_state.get('multitemporal', False)):
+        if evento == "estado":
+            if datos["estado"] == "en_cola" and datos.get("posicion"):
+                vista_previa.info(f"Análisis en cola (posición {datos['posicion']})")
+            else:
+                vista_previa.info("Market Map AI is Generating the Analysis")
+        elif evento == "datos":
+            data = dataframe_desde_columnas(datos["data"])
+        elif evento == "token":
+            resultado += datos["texto"]
+            # Llega JSON parcial: se muestran las secciones a medida que se escriben (~5 veces por segundo)
+            if time.time() - ultima_vista > 0.2:
+                parciales = campos_parciales(resultado, CAMPOS_ANALISIS)
+                vista_previa.markdown("".join(
+                    seccion_html(titulo, parciales[CAMPOS_ANALISIS[num - 1]], emoji)
+                    for num, (titulo, emoji) in SECCIONES.items() if CAMPOS_ANALISIS[num - 1] in parciales
+                ), unsafe_allow_html=True)
+                ultima_vista = time.time()
+        elif evento == "fin":
+            resultado = datos["resultado"]
+            analisis = datos.get("analisis")
+        elif evento == "error":
+            resultado = datos["error"]
+    vista_previa.empty()
+    if analisis:
+        # Campos tipados del backend: sin regex ni JSON a reparar
+        bloques = {num: analisis[campo] for num, campo in enumerate(CAMPOS_ANALISIS, start=1)}
+        conclusion_text = ""
+        conclusion_json = analisis["conclusion"]
+    else:
+        bloques, conclusion_text = extract_numbered_blocks(resultado)
+        conclusion_json = extraer_conclusion_json(resultado)
+    st.session_state['ultimo_analisis'] = (data, resultado)
+    st.session_state['bloques'] = bloques
+    st.session_state['conclusion'] = conclusion_text
+    st.session_state['conclusion_json'] = conclusion_json
+    st.write("DEBUG - Texto de conclusión:", repr(conclusion_text))
+    st.write("DEBUG - JSON de conclusión:", conclusion_json)
+    # Actualiza variables locales también, para el render inmediato
+    conclusion = conclusion_text
+elif 'bloques' in st.session_state:
+    bloques = st.session_state['bloques']
+    conclusion = st.session_state.get('conclusion', "")
+    conclusion_json = st.session_state.get('conclusion_json', None)
+
+
+
 col_izq, col_der = st.columns([1.2, 1])  # Puedes ajustar la proporción si quieres
 
 with col_izq:
@@ -448,43 +661,7 @@ with col_der:
             target = float(conclusion_json.get('probable_target'))
             stop = float(conclusion_json.get('probable_stop'))
 
-            # Normalización visual:
-            last_y = 0.5    # Last siempre al 50%
-            target_y = 0.9  # Target siempre al 90% (arriba)
-            dist_target = target - last
-            dist_stop = last - stop
-
-            if dist_target == 0:
-                pos_stop = 0.1  # Si target == last, lo mandamos abajo
-            else:
-                # Stop relativo, cuanto más lejos esté del last, más abajo lo ubicamos
-                pos_stop = last_y - (dist_stop / dist_target) * (target_y - last_y)
-                # Limita a un rango lógico
-                pos_stop = max(0.1, min(pos_stop, 0.49))
-
-            y_vals = [pos_stop, last_y, target_y]
-            labels = [
-                f"Stop\n${stop:.2f}",
-                f"Last\n${last:.2f}",
-                f"Target\n${target:.2f}"
-            ]
-            colors = ['#f87171', '#60a5fa', '#22d3ee']
-
-            fig2, ax2 = plt.subplots(figsize=(4, 2))
-            for y, color, label in zip(y_vals, colors, labels):
-                ax2.axhline(y, color=color, linewidth=1, linestyle='--')
-                ax2.text(0.07, y, label, va='center', ha='left', fontsize=11, color=color, weight='bold')
-
-            ax2.set_ylim(0, 1)
-            ax2.set_yticks([])
-            ax2.set_xticks([])
-            ax2.set_facecolor('#1e2533')
-            fig2.patch.set_facecolor('#1e2533')
-            ax2.spines['top'].set_visible(False)
-            ax2.spines['right'].set_visible(False)
-            ax2.spines['bottom'].set_visible(False)
-            ax2.spines['left'].set_visible(False)
-            st.pyplot(fig2)
+            st.image(png_proyeccion(last, target, stop))
         else:
             st.warning("No se pudo extraer el bloque JSON de la conclusión para graficar.")
 
@@ -563,45 +740,24 @@ if st.button("🕘 Mostrar último análisis"):
 
         st.markdown("<div class='card'>", unsafe_allow_html=True)
         st.subheader("📈 Proyección de Precios")
-        precios = np.linspace(data["Close"].min(), data["Close"].max(), 30) + np.random.normal(0, 0.3, 30)
-        dias = np.arange(len(precios))
-        precio_actual = float(data["Close"].iloc[-1])
-        target = precio_actual * 1.05
-        stop_loss = precio_actual * 0.97
-
-        fig, ax = plt.subplots(figsize=(10, 4))
-        ax.plot(dias, precios, color='blue', linewidth=2)
-        ax.axhline(precio_actual, color='green', linestyle='--', label=f'Actual: ${precio_actual:.2f}')
-        ax.axhline(target, color='purple', linestyle='--', label=f'Target: ${target:.2f}')
-        ax.axhline(stop_loss, color='red', linestyle='--', label=f'Stop Loss: ${stop_loss:.2f}')
-        ax.fill_between(dias, precio_actual * 0.99, precio_actual * 1.01, color='gray', alpha=0.2, label='Zona Neutra')
-        ax.set_facecolor('#0f172a')
-        fig.patch.set_facecolor('#0f172a')
-        ax.tick_params(colors='white')
-        ax.set_title("Proyección de precios", color='white')
-        ax.legend(facecolor='#1e293b', edgecolor='white', labelcolor='white')
-        st.pyplot(fig)
+        if data is not None and not data.empty:
+            # Target y stop de la conclusión del modelo sobre las velas reales
+            conclusion_json = st.session_state.get('conclusion_json') or {}
+            niveles = {nombre: float(conclusion_json[campo])
+                       for nombre, campo in [("Target", "probable_target"), ("Stop Loss", "probable_stop"),
+                                             ("Actual", "last_price")] if campo in conclusion_json}
+            mostrar_velas(data, niveles, figsize=(10, 4), titulo="Proyección de precios")
+        else:
+            st.info("El último análisis no trajo velas para graficar.")
         st.markdown("</div>", unsafe_allow_html=True)
     else:
         st.warning("No hay ningún análisis guardado todavía.")
 
-        # --- Gráfica tipo análisis técnico ---
-fig, ax = plt.subplots(figsize=(8.5, 4))
-ax.plot(dias, precios, color='#3b82f6', linewidth=2.7)
-ax.set_facecolor('#1e2533')
-fig.patch.set_facecolor('#1e2533')
-ax.spines['bottom'].set_color('#1e293b')
-ax.spines['top'].set_color('#1e293b')
-ax.spines['left'].set_color('#1e293b')
-ax.spines['right'].set_color('#1e293b')
-ax.tick_params(colors='#94a3b8', labelsize=7)
-ax.grid(False)
-ax.set_xlabel("")
-ax.set_ylabel("")
-plt.xticks(
-    [dias[0], dias[len(dias)//3], dias[2*len(dias)//3], dias[-1]],
-    [d.strftime("%e %b") for d in [dias[0], dias[len(dias)//3], dias[2*len(dias)//3], dias[-1]]]
-)
-plt.yticks(fontsize=7)
-
-st.pyplot(fig)
+# --- Gráfica tipo análisis técnico: velas reales del último análisis ---
+ultimo = st.session_state.get('ultimo_analisis')
+st.toggle("⚡ Dibujar gráficos en el navegador", key="graficos_cliente",
+          help="Envía las series crudas y el navegador dibuja el gráfico, en lugar de una imagen generada en el servidor")
+if ultimo and ultimo[0] is not None and not ultimo[0].empty:
+    mostrar_velas(ultimo[0])
+else:
+    st.info("Obtén un análisis para ver el gráfico de velas.")
@@ -0,0 +1,139 @@
+import numpy as np
+
+from datos_mercado import fuentes_para, proveedor_para
+from multitemporal import BASES, serie_temporalidad
+
+# Velas posteriores al análisis en las que se busca el target o el stop
+HORIZONTE = 100
+# Tramos de la probabilidad declarada (porcentaje)
+BUCKETS_PROBABILIDAD = [0, 40, 50, 60, 70, 80, 101]
+ETIQUETAS_PROBABILIDAD = ["<40", "40-50", "50-60", "60-70", "70-80", ">=80"]
+
+
+def evaluar(ts, altos, bajos, velas, precios, targets, stops, horizonte=HORIZONTE):
+    """
+    Evalúa de una vez todas las conclusiones de una serie. ts/altos/bajos son
+    las velas (ts en ns, ascendente); velas es la última vela que vio cada
+    análisis. Devuelve (resultado, velas hasta el resultado) por conclusión:
+    "target", "stop", "vencido" (ninguno en `horizonte` velas), "abierto"
+    (todavía no hay velas suficientes) o "invalida" (stop o target del lado
+    equivocado del precio).
+    """
+    n = len(velas)
+    # Primera vela posterior a la analizada; matriz (conclusión x vela del horizonte)
+    inicio = np.searchsorted(ts, velas, side="right")
+    indices = inicio[:, None] + np.arange(horizonte)
+    validas = indices < len(ts)
+    indices = np.minimum(indices, len(ts) - 1)
+    alto, bajo = altos[indices], bajos[indices]
+
+    alcista = (targets > precios)[:, None]
+    toca_target = validas & np.where(alcista, alto >= targets[:, None], bajo <= targets[:, None])
+    toca_stop = validas & np.where(alcista, bajo <= stops[:, None], alto >= stops[:, None])
+    primera_target = np.where(toca_target.any(axis=1), toca_target.argmax(axis=1), horizonte)
+    primera_stop = np.where(toca_stop.any(axis=1), toca_stop.argmax(axis=1), horizonte)
+
+    resultado = np.full(n, "abierto", dtype=object)
+    resultado[inicio + horizonte <= len(ts)] = "vencido"
+    # Si ambos caen en la misma vela no se sabe cuál fue primero: cuenta como stop
+    resultado[primera_stop < horizonte] = "stop"
+    resultado[primera_target < primera_stop] = "target"
+    invalida = (targets == precios) | np.where(targets > precios, stops >= precios, stops <= precios)
+    resultado[invalida] = "invalida"
+
+    velas_resultado = np.minimum(primera_target, primera_stop) + 1.0
+    velas_resultado[~np.isin(resultado, ("target", "stop"))] = np.nan
+    return resultado, velas_resultado
+
+
+def serie_backtest(almacen, ticker, intervalo, multitemporal):
+    """
+    Velas guardadas para la temporalidad del análisis. Los análisis
+    multi-temporalidad se evalúan sobre la misma serie base remuestreada que
+    vio el modelo; los demás sobre la serie propia del intervalo.
+    """
+    proveedor = proveedor_para(ticker)
+    base = BASES[proveedor].get(intervalo, intervalo)
+    # (serie guardada, remuestrear): la otra opción queda como respaldo si no hay velas guardadas
+    candidatas = [(base, True), (intervalo, False)] if multitemporal else [(intervalo, False), (base, True)]
+    for serie, remuestrear in candidatas:
+        for fuente in fuentes_para(ticker):
+            data = almacen.leer(fuente, ticker, serie)
+            if data is not None and not data.empty:
+                return serie_temporalidad(data, proveedor, serie, intervalo) if remuestrear else data
+    return None
+
+
+def evaluar_historial(conclusiones, almacen, horizonte=HORIZONTE):
+    """Agrega a `conclusiones` (DataFrame del RegistroConclusiones) las columnas resultado, velas_resultado y r."""
+    import pandas as pd
+
+    conclusiones = conclusiones.assign(resultado="sin_datos", velas_resultado=np.nan)
+    for (ticker, intervalo, multitemporal), grupo in conclusiones.groupby(["ticker", "intervalo", "multitemporal"]):
+        data = serie_backtest(almacen, ticker, intervalo, bool(multitemporal))
+        if data is None:
+            continue
+        resultado, velas_resultado = evaluar(
+            data.index.values.astype("datetime64[ns]").astype("i8"),
+            data["High"].to_numpy(dtype=float),
+            data["Low"].to_numpy(dtype=float),
+            grupo["vela"].to_numpy(dtype="i8"),
+            grupo["last_price"].to_numpy(dtype=float),
+            grupo["probable_target"].to_numpy(dtype=float),
+            grupo["probable_stop"].to_numpy(dtype=float),
+            horizonte,
+        )
+        conclusiones.loc[grupo.index, "resultado"] = resultado
+        conclusiones.loc[grupo.index, "velas_resultado"] = velas_resultado
+
+    # Resultado en múltiplos del riesgo: +recompensa/riesgo si tocó el target, -1 si tocó el stop
+    riesgo = (conclusiones["last_price"] - conclusiones["probable_stop"]).abs()
+    recompensa = (conclusiones["probable_target"] - conclusiones["last_price"]).abs()
+    conclusiones["r"] = np.select(
+        [conclusiones["resultado"] == "target", conclusiones["resultado"] == "stop"],
+        [recompensa / riesgo.where(riesgo > 0), -1.0],
+        np.nan,
+    )
+    conclusiones["bucket"] = pd.cut(conclusiones["probability"], BUCKETS_PROBABILIDAD,
+                                    labels=ETIQUETAS_PROBABILIDAD, right=False)
+    return conclusiones
+
+
+def resumir(evaluadas, columnas):
+    resueltas = evaluadas["resultado"].isin(["target", "stop"])
+    tabla = evaluadas.assign(
+        resuelta=resueltas,
+        acierto=evaluadas["resultado"] == "target",
+        velas_target=evaluadas["velas_resultado"].where(evaluadas["resultado"] == "target"),
+    ).groupby(columnas, observed=True).agg(
+        conclusiones=("resultado", "size"),
+        resueltas=("resuelta", "sum"),
+        aciertos=("acierto", "sum"),
+        probabilidad_declarada=("probability", "mean"),
+        velas_medias=("velas_resultado", "mean"),
+        velas_target=("velas_target", "mean"),
+        r_medio=("r", "mean"),
+    )
+    # Tasa real de aciertos sobre las resueltas, para comparar con la probabilidad declarada
+    tabla["tasa_acierto"] = 100 * tabla["aciertos"] / tabla["resueltas"].where(tabla["resueltas"] > 0)
+    return tabla.round(2).reset_index()
+
+
+def reporte(evaluadas):
+    def registros(tabla):
+        # NaN no es JSON válido
+        return tabla.astype(object).where(tabla.notna(), None).to_dict(orient="records")
+
+    return {
+        "total": {
+            "conclusiones": len(evaluadas),
+            "resultados": evaluadas["resultado"].value_counts().to_dict(),
+        },
+        "por_probabilidad": registros(resumir(evaluadas, ["bucket"])),
+        "por_grupo": registros(resumir(evaluadas, ["ticker", "intervalo", "bucket"])),
+    }
+
+
+def backtest(registro, almacen, horizonte=HORIZONTE):
+    """Re-evalúa todo el historial de conclusiones contra las velas del almacén (sin pedir nada a los proveedores)."""
+    return reporte(evaluar_historial(registro.cargar(), almacen, horizonte))
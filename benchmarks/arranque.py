@@ -0,0 +1,132 @@
+"""
+Presupuesto de arranque en frío: tiempo de import de la API, tiempo hasta la
+primera petición servida por uvicorn y tiempo de los imports de nivel módulo
+de app.py. Cada medición corre en un proceso nuevo, sin red (sin
+precalentamiento ni precómputo). Sale con código 1 si alguna mediana supera
+el presupuesto de benchmarks/presupuesto_arranque.json.
+
+    python benchmarks/arranque.py              # medir y comparar con el presupuesto
+    python benchmarks/arranque.py --actualizar # reescribir el presupuesto (mediana x holgura)
+"""
+import argparse
+import ast
+import json
+import os
+import socket
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+import urllib.request
+
+RAIZ = os.path.abspath(os.path.join(os.path.dirname(__file__), ".."))
+RUTA_PRESUPUESTO = os.path.join(os.path.dirname(__file__), "presupuesto_arranque.json")
+# Sin red ni tareas de fondo: solo se mide el costo propio del arranque.
+# Los procesos corren fuera del repo y lo importan por PYTHONPATH
+ENTORNO = {**os.environ, "PRECALENTAR": "0", "WATCHLIST": "", "SIMBOLOS_REFRESCO": "0", "PYTHONPATH": RAIZ}
+
+
+def ms_en_subproceso(codigo, cwd):
+    salida = subprocess.run(
+        [sys.executable, "-c", codigo], cwd=cwd, env=ENTORNO,
+        capture_output=True, text=True, check=True,
+    ).stdout
+    return float(salida.strip().splitlines()[-1])
+
+
+def import_api(cwd):
+    return ms_en_subproceso(
+        "import time; t = time.perf_counter(); import aimarketmap_api; "
+        "print((time.perf_counter() - t) * 1000)", cwd
+    )
+
+
+def imports_app(cwd):
+    # Solo los import de nivel módulo de app.py (el resto del script necesita streamlit corriendo)
+    arbol = ast.parse(open(os.path.join(RAIZ, "app.py"), encoding="utf-8").read())
+    imports = [nodo for nodo in arbol.body if isinstance(nodo, (ast.Import, ast.ImportFrom))]
+    codigo = ast.unparse(ast.Module(body=imports, type_ignores=[]))
+    return ms_en_subproceso(
+        f"import time; t = time.perf_counter()\n{codigo}\nprint((time.perf_counter() - t) * 1000)", cwd
+    )
+
+
+def puerto_libre():
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        return s.getsockname()[1]
+
+
+def primera_peticion(cwd, timeout=30):
+    puerto = puerto_libre()
+    inicio = time.perf_counter()
+    proceso = subprocess.Popen(
+        [sys.executable, "-m", "uvicorn", "aimarketmap_api:app", "--port", str(puerto), "--log-level", "warning"],
+        cwd=cwd, env=ENTORNO, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL,
+    )
+    try:
+        while time.perf_counter() - inicio < timeout:
+            try:
+                with urllib.request.urlopen(f"http://127.0.0.1:{puerto}/", timeout=1) as r:
+                    if r.status == 200:
+                        return (time.perf_counter() - inicio) * 1000
+            except OSError:
+                time.sleep(0.01)
+        raise RuntimeError(f"uvicorn no respondió en {timeout}s")
+    finally:
+        proceso.terminate()
+        proceso.wait()
+
+
+MEDICIONES = {
+    "import_api_ms": import_api,
+    "primera_peticion_ms": primera_peticion,
+    "imports_app_ms": imports_app,
+}
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("-n", type=int, default=5, help="repeticiones por medición (se usa la mediana)")
+    parser.add_argument("--actualizar", action="store_true")
+    parser.add_argument("--holgura", type=float, default=1.5)
+    args = parser.parse_args()
+
+    presupuesto = {}
+    if os.path.exists(RUTA_PRESUPUESTO):
+        with open(RUTA_PRESUPUESTO, encoding="utf-8") as f:
+            presupuesto = json.load(f)
+
+    medianas, excedidos = {}, []
+    for nombre, medir in MEDICIONES.items():
+        try:
+            # Directorio de trabajo descartable: datos/ y los SQLite no caen en el repo
+            with tempfile.TemporaryDirectory(prefix="aimm_arranque_") as cwd:
+                medianas[nombre] = statistics.median(medir(cwd) for _ in range(args.n))
+        except subprocess.CalledProcessError as e:
+            # Dependencia ausente (p. ej. streamlit en el entorno de la API): no se mide
+            print(f"{nombre:<22} omitido: {e.stderr.strip().splitlines()[-1]}")
+            continue
+        limite = presupuesto.get(nombre)
+        estado = "sin presupuesto" if limite is None else ("OK" if medianas[nombre] <= limite else "EXCEDIDO")
+        print(f"{nombre:<22} {medianas[nombre]:8.0f} ms  presupuesto {limite or '-':>6}  {estado}")
+        if estado == "EXCEDIDO":
+            excedidos.append(nombre)
+
+    if args.actualizar:
+        nuevo = {**presupuesto, **{k: round(v * args.holgura) for k, v in medianas.items()}}
+        with open(RUTA_PRESUPUESTO, "w", encoding="utf-8") as f:
+            json.dump(nuevo, f, indent=2)
+            f.write("\n")
+        print(f"Presupuesto actualizado en {RUTA_PRESUPUESTO}")
+        return 0
+
+    if excedidos:
+        print(f"❌ Arranque fuera de presupuesto: {', '.join(excedidos)}")
+        return 1
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
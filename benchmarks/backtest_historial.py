@@ -0,0 +1,131 @@
+"""
+Re-evaluación del historial de conclusiones con backtest.py sobre datos
+sintéticos: series de velas en un AlmacenOHLC temporal y miles de
+conclusiones en un RegistroConclusiones temporal. Mide el tiempo total
+(carga + evaluación vectorizada + reporte) y compara una muestra contra una
+evaluación vela a vela con loops de Python.
+
+    python benchmarks/backtest_historial.py --conclusiones 50000 --tickers 20
+"""
+import argparse
+import os
+import sys
+import tempfile
+import time
+
+import numpy as np
+import pandas as pd
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), "..")))
+
+from almacen_ohlc import AlmacenOHLC  # noqa: E402
+from backtest import evaluar, evaluar_historial, reporte  # noqa: E402
+from conclusiones import RegistroConclusiones  # noqa: E402
+
+PASOS = {"15M": "15min", "1H": "1h", "1D": "1D"}
+
+
+def serie_sintetica(rng, velas, paso):
+    cierres = 100 * np.exp(np.cumsum(rng.normal(0, 0.01, velas)))
+    aperturas = np.r_[cierres[0], cierres[:-1]]
+    rango = np.abs(rng.normal(0, 0.006, velas)) * cierres
+    return pd.DataFrame(
+        {
+            "Open": aperturas,
+            "High": np.maximum(aperturas, cierres) + rango,
+            "Low": np.minimum(aperturas, cierres) - rango,
+            "Close": cierres,
+            "Volume": rng.integers(1_000, 100_000, velas).astype(float),
+        },
+        index=pd.date_range("2024-01-01", periods=velas, freq=paso, name="date"),
+    )
+
+
+def por_loops(data, vela, precio, target, stop, horizonte):
+    # Referencia: una conclusión a la vez, vela por vela
+    posteriores = data[data.index > vela].head(horizonte)
+    alcista = target > precio
+    for i, (alto, bajo) in enumerate(zip(posteriores["High"], posteriores["Low"])):
+        if (bajo <= stop) if alcista else (alto >= stop):
+            return "stop", i + 1
+        if (alto >= target) if alcista else (bajo <= target):
+            return "target", i + 1
+    return ("vencido" if len(posteriores) == horizonte else "abierto"), None
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--conclusiones", type=int, default=50_000)
+    parser.add_argument("--tickers", type=int, default=20)
+    parser.add_argument("--velas", type=int, default=5_000)
+    parser.add_argument("--horizonte", type=int, default=100)
+    parser.add_argument("--muestra", type=int, default=300, help="conclusiones verificadas con loops")
+    args = parser.parse_args()
+
+    rng = np.random.default_rng(7)
+    directorio = tempfile.mkdtemp(prefix="aimm_backtest_")
+    almacen = AlmacenOHLC(directorio, max_velas=args.velas)
+    registro = RegistroConclusiones(os.path.join(directorio, "conclusiones.sqlite"))
+
+    series = {}
+    for t in range(args.tickers):
+        for intervalo, paso in PASOS.items():
+            data = serie_sintetica(rng, args.velas, paso)
+            almacen.agregar("alpha_vantage", f"T{t}", intervalo, data)
+            series[f"T{t}", intervalo] = data
+
+    claves = list(series)
+    filas = []
+    for _ in range(args.conclusiones):
+        ticker, intervalo = claves[rng.integers(len(claves))]
+        data = series[ticker, intervalo]
+        i = rng.integers(50, len(data))
+        precio = data["Close"].iloc[i]
+        direccion = rng.choice([1, -1])
+        riesgo = precio * rng.uniform(0.005, 0.03)
+        filas.append((ticker, intervalo, 0, data.index[i].value, 0.0, precio, precio + direccion * riesgo * rng.uniform(1, 3),
+                      precio - direccion * riesgo, 2.0, rng.uniform(30, 90)))
+    with registro._lock:
+        registro._conn.executemany("INSERT OR REPLACE INTO conclusiones VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?)", filas)
+        registro._conn.commit()
+
+    inicio = time.perf_counter()
+    conclusiones = registro.cargar()
+    carga = time.perf_counter() - inicio
+    evaluadas = evaluar_historial(conclusiones, almacen, args.horizonte)
+    evaluacion = time.perf_counter() - inicio - carga
+    resumen = reporte(evaluadas)
+    total = time.perf_counter() - inicio
+    print(f"{len(conclusiones)} conclusiones, {len(claves)} series de {args.velas} velas, horizonte {args.horizonte}")
+    print(f"carga {carga:.2f}s | evaluación {evaluacion:.2f}s | total con reporte {total:.2f}s")
+    print("resultados:", resumen["total"]["resultados"])
+    for fila in resumen["por_probabilidad"]:
+        print(f"  prob {fila['bucket']:>6}: {fila['conclusiones']:>6} conclusiones, "
+              f"acierto {fila['tasa_acierto']}% (declarada {fila['probabilidad_declarada']}%), R medio {fila['r_medio']}")
+
+    # Misma respuesta que la referencia con loops, y cuánto tardaría ésta con todo el historial
+    muestra = evaluadas.sample(min(args.muestra, len(evaluadas)), random_state=1)
+    inicio = time.perf_counter()
+    diferencias = 0
+    for fila in muestra.itertuples():
+        esperado, velas = por_loops(series[fila.ticker, fila.intervalo], pd.Timestamp(fila.vela), fila.last_price,
+                                    fila.probable_target, fila.probable_stop, args.horizonte)
+        obtenido = None if np.isnan(fila.velas_resultado) else int(fila.velas_resultado)
+        diferencias += (esperado, velas) != (fila.resultado, obtenido)
+    por_conclusion = (time.perf_counter() - inicio) / len(muestra)
+    print(f"verificación con loops: {len(muestra) - diferencias}/{len(muestra)} iguales; "
+          f"loops para todo el historial ~{por_conclusion * len(evaluadas):.1f}s")
+
+    # Una sola serie: la matriz conclusión x horizonte sin el costo de pandas alrededor
+    data = series[claves[0]]
+    n = 10_000
+    velas = data.index.values.astype("i8")[rng.integers(0, len(data), n)]
+    precios = data["Close"].to_numpy()[np.searchsorted(data.index.values.astype("i8"), velas)]
+    inicio = time.perf_counter()
+    evaluar(data.index.values.astype("i8"), data["High"].to_numpy(), data["Low"].to_numpy(), velas,
+            precios, precios * 1.02, precios * 0.99, args.horizonte)
+    print(f"evaluar(): {n} conclusiones de una serie en {(time.perf_counter() - inicio) * 1000:.1f} ms")
+
+
+if __name__ == "__main__":
+    main()
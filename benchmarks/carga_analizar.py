@@ -0,0 +1,98 @@
+"""
+Prueba de carga de /analizar: endpoint síncrono (threadpool) vs asíncrono.
+
+Los proveedores y el LLM se sustituyen por esperas con la latencia indicada,
+así que no consume cuota real. Uso:
+
+    python benchmarks/carga_analizar.py --concurrencia 200 --latencia-datos 0.3 --latencia-llm 2
+"""
+import argparse
+import asyncio
+import os
+import sys
+import time
+
+import httpx
+import pandas as pd
+from fastapi import FastAPI
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), ".."))
+
+import aimarketmap_api  # noqa: E402
+
+
+def datos_falsos():
+    indice = pd.date_range("2024-01-01", periods=50, freq="D")
+    return pd.DataFrame(
+        {"Open": 1.0, "High": 1.0, "Low": 1.0, "Close": 1.0, "Volume": 1.0},
+        index=indice,
+    )
+
+
+def app_sincrona(latencia_datos, latencia_llm):
+    # Réplica del comportamiento anterior: def síncrono bloqueando un hilo del pool
+    app = FastAPI()
+
+    @app.post("/analizar")
+    def analizar(request: aimarketmap_api.AnalisisRequest):
+        time.sleep(latencia_datos)
+        data = datos_falsos()
+        time.sleep(latencia_llm)
+        return {"resultado": "ok", "data": data.reset_index().to_dict(orient='records')}
+
+    return app
+
+
+def parchear_app_asincrona(latencia_datos, latencia_llm):
+    # *args/**kwargs: la firma real crece (prioridad, velas, estructurado...) y el stub no debe romperse
+    async def obtener_datos_mercado(*args, **kwargs):
+        await asyncio.sleep(latencia_datos)
+        return datos_falsos()
+
+    async def generar_prompt_y_analizar_async(*args, **kwargs):
+        await asyncio.sleep(latencia_llm)
+        return "ok"
+
+    aimarketmap_api.cache_mercado.obtener = obtener_datos_mercado
+    aimarketmap_api.generar_prompt_y_analizar_async = generar_prompt_y_analizar_async
+    return aimarketmap_api.app
+
+
+async def lanzar(app, concurrencia):
+    transport = httpx.ASGITransport(app=app)
+    async with httpx.AsyncClient(transport=transport, base_url="http://bench", timeout=None) as client:
+        inicio = time.perf_counter()
+        respuestas = await asyncio.gather(*[
+            # Tickers distintos para que la coalescencia no agrupe las peticiones
+            client.post("/analizar", json={"ticker": f"T{i}", "intervalo": "1D"})
+            for i in range(concurrencia)
+        ])
+        total = time.perf_counter() - inicio
+    # /analizar responde 200 con {"error": ...} cuando fallan los datos o el LLM
+    errores = sum(1 for r in respuestas if r.status_code != 200 or "error" in r.json())
+    return total, errores
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--concurrencia", type=int, default=200)
+    parser.add_argument("--latencia-datos", type=float, default=0.3)
+    parser.add_argument("--latencia-llm", type=float, default=2.0)
+    args = parser.parse_args()
+
+    latencias = (args.latencia_datos, args.latencia_llm)
+    ideal = sum(latencias)
+
+    for nombre, app in (
+        ("sync (threadpool)", app_sincrona(*latencias)),
+        ("async", parchear_app_asincrona(*latencias)),
+    ):
+        total, errores = asyncio.run(lanzar(app, args.concurrencia))
+        print(
+            f"{nombre:<18} {args.concurrencia} peticiones en {total:6.2f}s "
+            f"({args.concurrencia / total:7.1f} req/s, ideal {ideal:.2f}s, errores {errores})"
+        )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,206 @@
+"""
+Prueba de carga offline y reproducible de /analizar. Levanta los proveedores
+simulados (benchmarks/proveedores_simulados.py) y la API con uvicorn apuntando
+a ellos, y la ataca con concurrencia creciente. Por nivel reporta latencia
+p50/p95/p99, throughput, errores y memoria (RSS) por worker.
+
+    python benchmarks/carga_offline.py --niveles 1 8 32 128 --workers 2 --latencia-llm 1.5
+    python benchmarks/carga_offline.py --tickers repetidos   # mide caché y coalescencia
+"""
+import argparse
+import asyncio
+import json
+import os
+import socket
+import subprocess
+import sys
+import tempfile
+import time
+
+import httpx
+import numpy as np
+
+RAIZ = os.path.abspath(os.path.join(os.path.dirname(__file__), ".."))
+SIMULADOR = os.path.join(os.path.dirname(__file__), "proveedores_simulados.py")
+
+
+def puerto_libre():
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        return s.getsockname()[1]
+
+
+def esperar_listo(url, proceso, timeout=30):
+    inicio = time.time()
+    while time.time() - inicio < timeout:
+        if proceso.poll() is not None:
+            raise RuntimeError(f"El proceso terminó antes de responder en {url}")
+        try:
+            if httpx.get(url, timeout=1).status_code == 200:
+                return
+        except httpx.HTTPError:
+            time.sleep(0.1)
+    raise RuntimeError(f"{url} no respondió en {timeout}s")
+
+
+def rss_mb(pid):
+    # VmRSS de /proc (Linux); 0 si el proceso ya no existe
+    try:
+        with open(f"/proc/{pid}/status") as f:
+            for linea in f:
+                if linea.startswith("VmRSS:"):
+                    return int(linea.split()[1]) / 1024
+    except OSError:
+        pass
+    return 0.0
+
+
+def workers(pid_padre):
+    # Con --workers > 1 uvicorn atiende en procesos hijos; con 1 atiende el propio proceso
+    hijos = []
+    for entrada in os.listdir("/proc"):
+        if not entrada.isdigit():
+            continue
+        try:
+            with open(f"/proc/{entrada}/stat") as f:
+                campos = f.read().rsplit(")", 1)[1].split()
+            if int(campos[1]) == pid_padre:
+                hijos.append(int(entrada))
+        except (OSError, IndexError):
+            continue
+    # El multiprocessing de uvicorn también crea un proceso auxiliar chico; se filtra por memoria
+    return [p for p in hijos if rss_mb(p) > 30] or [pid_padre]
+
+
+def levantar(args):
+    puerto_sim, puerto_api = puerto_libre(), puerto_libre()
+    sim = subprocess.Popen(
+        [sys.executable, SIMULADOR, "--puerto", str(puerto_sim),
+         "--latencia-datos", str(args.latencia_datos), "--latencia-llm", str(args.latencia_llm),
+         "--error-datos", str(args.error_datos), "--error-llm", str(args.error_llm),
+         "--cola-datos", str(args.cola_datos)],
+        cwd=RAIZ, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL,
+    )
+    base_sim = f"http://127.0.0.1:{puerto_sim}"
+    entorno = {
+        **os.environ,
+        "COINGECKO_URL": f"{base_sim}/coingecko",
+        "KRAKEN_URL": f"{base_sim}/kraken",
+        "ALPHA_VANTAGE_URL": f"{base_sim}/alpha_vantage/query",
+        "OPENAI_BASE_URL": f"{base_sim}/openai/v1",
+        "OPENAI_API_KEY": "sk-simulado",
+        "ALPHA_VANTAGE_API_KEY": "simulado",
+        # Cuotas sin límite: se mide el pipeline, no el planificador
+        "ALPHA_VANTAGE_POR_MINUTO": "1000000", "ALPHA_VANTAGE_POR_DIA": "100000000",
+        "COINGECKO_POR_MINUTO": "1000000", "COINGECKO_POR_DIA": "100000000",
+        # yfinance no se puede redirigir al simulador: las acciones quedan sin respaldo
+        "FUENTES_ACCIONES": "alpha_vantage",
+        "KRAKEN_POR_MINUTO": "1000000", "KRAKEN_POR_DIA": "100000000",
+        "WATCHLIST": "",
+        "SIMBOLOS_RUTA": "",
+        "CACHE_LLM_RUTA": "",
+        "OHLC_DIR": tempfile.mkdtemp(prefix="aimm_ohlc_"),
+        "PYTHONUNBUFFERED": "1",
+    }
+    api = subprocess.Popen(
+        [sys.executable, "-m", "uvicorn", "aimarketmap_api:app", "--port", str(puerto_api),
+         "--workers", str(args.workers), "--log-level", "warning"],
+        cwd=RAIZ, env=entorno, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL,
+    )
+    try:
+        esperar_listo(f"{base_sim}/estadisticas", sim)
+        esperar_listo(f"http://127.0.0.1:{puerto_api}/", api)
+    except Exception:
+        for proceso in (api, sim):
+            proceso.terminate()
+        raise
+    return sim, api, base_sim, f"http://127.0.0.1:{puerto_api}"
+
+
+async def nivel(url, concurrencia, total, tickers, intervalo, estructurado, ronda):
+    limite = asyncio.Semaphore(concurrencia)
+    latencias, errores, motivos = [], 0, {}
+
+    async def una(client, i):
+        nonlocal errores
+        # "unicos": cada petición es un símbolo nuevo (sin caché); "repetidos": 5 símbolos
+        ticker = f"S{ronda}X{i}" if tickers == "unicos" else f"R{i % 5}"
+        async with limite:
+            inicio = time.perf_counter()
+            try:
+                r = await client.post("/analizar", json={"ticker": ticker, "intervalo": intervalo,
+                                                         "estructurado": estructurado})
+                if r.status_code != 200 or "error" in r.json():
+                    errores += 1
+                    motivo = r.json().get("error", r.status_code) if r.status_code == 200 else r.status_code
+                    motivos[str(motivo)[:80]] = motivos.get(str(motivo)[:80], 0) + 1
+            except httpx.HTTPError as e:
+                errores += 1
+                motivos[type(e).__name__] = motivos.get(type(e).__name__, 0) + 1
+            latencias.append(time.perf_counter() - inicio)
+
+    limites = httpx.Limits(max_connections=concurrencia, max_keepalive_connections=concurrencia)
+    async with httpx.AsyncClient(base_url=url, timeout=120, limits=limites) as client:
+        inicio = time.perf_counter()
+        await asyncio.gather(*[una(client, i) for i in range(total)])
+        duracion = time.perf_counter() - inicio
+
+    ms = np.array(latencias) * 1000
+    return {
+        "concurrencia": concurrencia,
+        "peticiones": total,
+        "errores": errores,
+        "p50_ms": round(float(np.percentile(ms, 50)), 1),
+        "p95_ms": round(float(np.percentile(ms, 95)), 1),
+        "p99_ms": round(float(np.percentile(ms, 99)), 1),
+        "req_s": round(total / duracion, 2),
+        "motivos_error": motivos,
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--niveles", type=int, nargs="+", default=[1, 8, 32, 128])
+    parser.add_argument("--peticiones", type=int, default=0,
+                        help="peticiones por nivel (por defecto 4 x concurrencia, mínimo 20)")
+    parser.add_argument("--workers", type=int, default=1)
+    parser.add_argument("--latencia-datos", type=float, default=0.2)
+    parser.add_argument("--latencia-llm", type=float, default=1.5)
+    parser.add_argument("--error-datos", type=float, default=0.0)
+    parser.add_argument("--error-llm", type=float, default=0.0)
+    parser.add_argument("--cola-datos", type=float, default=0.0)
+    parser.add_argument("--tickers", choices=["unicos", "repetidos"], default="unicos")
+    parser.add_argument("--intervalo", default="1H")
+    parser.add_argument("--estructurado", action="store_true")
+    parser.add_argument("--json", help="guardar los resultados en este archivo")
+    args = parser.parse_args()
+
+    sim, api, base_sim, url = levantar(args)
+    resultados = []
+    try:
+        print(f"{'conc':>5} {'pet':>5} {'err':>4} {'p50 ms':>8} {'p95 ms':>8} {'p99 ms':>8} {'req/s':>8} {'RSS/worker MB':>14}")
+        for ronda, concurrencia in enumerate(args.niveles):
+            total = args.peticiones or max(20, 4 * concurrencia)
+            fila = asyncio.run(nivel(url, concurrencia, total, args.tickers, args.intervalo.upper(),
+                                     args.estructurado, ronda))
+            fila["rss_mb_por_worker"] = [round(rss_mb(p), 1) for p in workers(api.pid)]
+            resultados.append(fila)
+            print(f"{fila['concurrencia']:>5} {fila['peticiones']:>5} {fila['errores']:>4} {fila['p50_ms']:>8} "
+                  f"{fila['p95_ms']:>8} {fila['p99_ms']:>8} {fila['req_s']:>8} "
+                  f"{max(fila['rss_mb_por_worker']):>14}")
+            for motivo, cantidad in fila["motivos_error"].items():
+                print(f"      ⚠️ {cantidad} x {motivo}")
+        llamadas = httpx.get(f"{base_sim}/estadisticas").json()
+        print("Llamadas a proveedores simulados:", llamadas)
+    finally:
+        for proceso in (api, sim):
+            proceso.terminate()
+            proceso.wait()
+
+    if args.json:
+        with open(args.json, "w", encoding="utf-8") as f:
+            json.dump({"parametros": vars(args), "niveles": resultados}, f, indent=2)
+
+
+if __name__ == "__main__":
+    main()
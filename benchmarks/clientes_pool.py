@@ -0,0 +1,73 @@
+"""
+Latencia por petición con un cliente nuevo en cada llamada (comportamiento
+anterior: CoinGeckoAPI()/TimeSeries()/OpenAI() por request) contra el pool
+keep-alive precalentado que crea el lifespan de la API.
+
+    python benchmarks/clientes_pool.py --url https://api.coingecko.com/api/v3/ping -n 20
+"""
+import argparse
+import asyncio
+import os
+import statistics
+import sys
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), ".."))
+
+import clientes  # noqa: E402
+
+
+async def cliente_por_peticion(url, n):
+    tiempos = []
+    for _ in range(n):
+        inicio = time.perf_counter()
+        async with clientes.crear_cliente_http() as client:
+            await client.get(url)
+        tiempos.append(time.perf_counter() - inicio)
+    return tiempos
+
+
+async def cliente_compartido(url, n):
+    client = clientes.crear_cliente_http()
+    await client.get(url)  # precalentamiento, igual que en el arranque de la API
+    tiempos = []
+    try:
+        for _ in range(n):
+            inicio = time.perf_counter()
+            await client.get(url)
+            tiempos.append(time.perf_counter() - inicio)
+    finally:
+        await client.aclose()
+    return tiempos
+
+
+def construccion_openai(n):
+    # Costo de armar un cliente OpenAI (contexto TLS + pool) en cada análisis
+    os.environ.setdefault("OPENAI_API_KEY", "sk-bench")
+    inicio = time.perf_counter()
+    for _ in range(n):
+        clientes.crear_cliente_openai()
+    return (time.perf_counter() - inicio) / n
+
+
+def resumen(nombre, tiempos):
+    ms = sorted(t * 1000 for t in tiempos)
+    p95 = ms[min(len(ms) - 1, int(len(ms) * 0.95))]
+    print(f"{nombre:<24} mediana {statistics.median(ms):7.1f} ms | p95 {p95:7.1f} ms")
+    return statistics.median(ms)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--url", default="https://api.coingecko.com/api/v3/ping")
+    parser.add_argument("-n", type=int, default=20)
+    args = parser.parse_args()
+
+    nuevo = resumen("cliente por petición", asyncio.run(cliente_por_peticion(args.url, args.n)))
+    pool = resumen("pool precalentado", asyncio.run(cliente_compartido(args.url, args.n)))
+    print(f"{'ahorro por petición':<24} {nuevo - pool:7.1f} ms")
+    print(f"{'construir AsyncOpenAI':<24} {construccion_openai(args.n) * 1000:7.1f} ms por cliente")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,90 @@
+"""
+Tamaño y tiempo de decodificación del OHLC de /analizar: lista de dicts por
+vela (formato anterior) contra arrays paralelos en JSON, msgpack y Arrow IPC,
+con y sin float32 y compresión.
+
+    python benchmarks/payload_ohlc.py --velas 300 1000 5000
+"""
+import argparse
+import gzip
+import json
+import os
+import sys
+import time
+
+import numpy as np
+import pandas as pd
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), ".."))
+
+import formato_ohlc  # noqa: E402
+
+
+def datos_sinteticos(velas):
+    rng = np.random.default_rng(0)
+    close = 100 + np.cumsum(rng.normal(0, 1, velas))
+    indice = pd.date_range("2024-01-01", periods=velas, freq="h", name="timestamp")
+    return pd.DataFrame({
+        "Open": close + rng.normal(0, 0.3, velas),
+        "High": close + 1,
+        "Low": close - 1,
+        "Close": close,
+        "Volume": None,
+    }, index=indice)
+
+
+def medir(decodificar, repeticiones=20):
+    inicio = time.perf_counter()
+    for _ in range(repeticiones):
+        decodificar()
+    return (time.perf_counter() - inicio) / repeticiones * 1000
+
+
+def variantes(data):
+    from fastapi.encoders import jsonable_encoder
+
+    registros = json.dumps(jsonable_encoder(formato_ohlc.registros(data))).encode()
+    yield "registros JSON", registros, lambda: pd.DataFrame(json.loads(registros))
+    for float32 in (False, True):
+        sufijo = " f32" if float32 else ""
+        columnar = json.dumps(formato_ohlc.columnas(data, float32)).encode()
+        yield "columnar JSON" + sufijo, columnar, \
+            lambda c=columnar: formato_ohlc.dataframe_desde_columnas(json.loads(c))
+        yield "columnar JSON gzip" + sufijo, gzip.compress(columnar, 5), None
+        try:
+            import brotli
+            yield "columnar JSON br" + sufijo, brotli.compress(columnar, quality=5), None
+        except ImportError:
+            pass
+        try:
+            import msgpack
+            binario = msgpack.packb(formato_ohlc.columnas_binarias(data, float32), use_bin_type=True)
+            yield "msgpack" + sufijo, binario, \
+                lambda b=binario: formato_ohlc.dataframe_desde_columnas(msgpack.unpackb(b))
+        except ImportError:
+            pass
+        try:
+            respuesta = formato_ohlc.respuesta_negociada(
+                {"data": data}, accept=formato_ohlc.TIPO_ARROW, float32=float32)
+            yield "Arrow IPC" + sufijo, respuesta.body, lambda b=respuesta.body: formato_ohlc.leer_arrow(b)
+        except ImportError:
+            pass
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--velas", type=int, nargs="+", default=[300, 5000])
+    args = parser.parse_args()
+
+    for velas in args.velas:
+        data = datos_sinteticos(velas)
+        print(f"\n{velas} velas")
+        base = None
+        for nombre, cuerpo, decodificar in variantes(data):
+            base = base or len(cuerpo)
+            decodifica = f"{medir(decodificar):7.2f} ms" if decodificar else "      -   "
+            print(f"{nombre:<24} {len(cuerpo) / 1024:9.1f} KiB  x{base / len(cuerpo):5.1f} | decodificar {decodifica}")
+
+
+if __name__ == "__main__":
+    main()
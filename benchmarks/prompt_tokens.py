@@ -0,0 +1,142 @@
+"""
+Compara el prompt anterior (50 velas CSV a precisión completa) con el prompt
+compacto (resumen de indicadores + velas redondeadas).
+
+Mide tokens (tiktoken si está instalado, si no ~4 caracteres por token) y,
+con --llm, la latencia real de gpt-4o para cada variante (requiere OPENAI_API_KEY).
+
+Con --simulado la latencia se mide sin red contra benchmarks/proveedores_simulados.py,
+que cobra --ms-por-token-prompt por token de prompt además de --latencia-llm fija.
+Ese número es un modelo del prefill, no gpt-4o: sirve para reproducir la comparación
+en CI, pero offline lo único medido de verdad son los tokens.
+
+    python benchmarks/prompt_tokens.py --llm --repeticiones 3
+    python benchmarks/prompt_tokens.py --simulado --latencia-llm 0.3 --ms-por-token-prompt 0.5
+"""
+import argparse
+import os
+import subprocess
+import sys
+import time
+
+import numpy as np
+import pandas as pd
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), ".."))
+
+import analysis  # noqa: E402
+
+
+def datos_sinteticos(n, precio, freq, semilla=7):
+    # Random walk con decimales "sucios", como llegan de CoinGecko/Alpha Vantage
+    rng = np.random.default_rng(semilla)
+    close = precio * np.exp(np.cumsum(rng.normal(0.0005, 0.012, n)))
+    ruido = np.abs(rng.normal(0, 0.004, (2, n))) * close
+    indice = pd.date_range("2024-01-02 09:30", periods=n, freq=freq)
+    return pd.DataFrame({
+        "Open": np.roll(close, 1),
+        "High": close + ruido[0],
+        "Low": close - ruido[1],
+        "Close": close,
+        "Volume": rng.integers(1e6, 5e7, n).astype(float),
+    }, index=indice)[::-1]
+
+
+def contar_tokens(texto):
+    try:
+        import tiktoken
+        codificador = tiktoken.encoding_for_model(analysis.MODELO)
+    except Exception:
+        # Sin tiktoken o sin poder descargar el vocabulario
+        return len(texto) // 4, "aprox"
+    return len(codificador.encode(texto)), "tiktoken"
+
+
+def prompts(ticker, intervalo, data):
+    anterior = analysis.construir_prompt(
+        ticker, intervalo, data[["Open", "High", "Low", "Close", "Volume"]].to_csv(index=True)
+    )
+    _, compacto = analysis.preparar_prompt(ticker, intervalo, data)
+    return anterior, compacto
+
+
+def levantar_simulador(args):
+    from carga_offline import SIMULADOR, esperar_listo, puerto_libre
+
+    puerto = puerto_libre()
+    proceso = subprocess.Popen(
+        [sys.executable, SIMULADOR, "--puerto", str(puerto), "--latencia-llm", str(args.latencia_llm),
+         "--ms-por-token-prompt", str(args.ms_por_token_prompt)],
+        stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL,
+    )
+    try:
+        esperar_listo(f"http://127.0.0.1:{puerto}/estadisticas", proceso)
+    except Exception:
+        proceso.terminate()
+        raise
+    return proceso, f"http://127.0.0.1:{puerto}/openai/v1"
+
+
+def latencia_llm(prompt, repeticiones, base_url=None):
+    import openai
+
+    # Con base_url se apunta al simulador, que no valida la key
+    client = openai.OpenAI(base_url=base_url, api_key="sk-simulado") if base_url else openai.OpenAI()
+    tiempos = []
+    for _ in range(repeticiones):
+        inicio = time.perf_counter()
+        client.chat.completions.create(
+            model=analysis.MODELO,
+            messages=[{"role": "user", "content": prompt}],
+            temperature=analysis.TEMPERATURA,
+            max_tokens=analysis.MAX_TOKENS,
+        )
+        tiempos.append(time.perf_counter() - inicio)
+    return float(np.median(tiempos))
+
+
+def comparar(args, base_url):
+    casos = [
+        ("AAPL", "1D", datos_sinteticos(50, 182.634521, "B")),
+        ("AAPL", "15M", datos_sinteticos(50, 182.634521, "15min")),
+        ("BTC", "1D", datos_sinteticos(50, 65432.123456, "30min")),
+    ]
+
+    for ticker, intervalo, data in casos:
+        anterior, compacto = prompts(ticker, intervalo, data)
+        tokens_anterior, metodo = contar_tokens(anterior)
+        tokens_compacto, _ = contar_tokens(compacto)
+        print(
+            f"{ticker:<5} {intervalo:<4} tokens anterior {tokens_anterior:5d} | "
+            f"compacto {tokens_compacto:5d} | ahorro {1 - tokens_compacto / tokens_anterior:6.1%} ({metodo})"
+        )
+        if args.llm or args.simulado:
+            origen = "simulada" if args.simulado else "real"
+            print(
+                f"{'':10} latencia {origen} mediana anterior "
+                f"{latencia_llm(anterior, args.repeticiones, base_url):5.2f}s | "
+                f"compacto {latencia_llm(compacto, args.repeticiones, base_url):5.2f}s"
+            )
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--llm", action="store_true", help="medir también la latencia real del modelo")
+    parser.add_argument("--simulado", action="store_true",
+                        help="medir la latencia contra el simulador local (modelo de prefill, sin red)")
+    parser.add_argument("--latencia-llm", type=float, default=0.3, help="latencia fija del simulador")
+    parser.add_argument("--ms-por-token-prompt", type=float, default=0.5, help="prefill del simulador")
+    parser.add_argument("--repeticiones", type=int, default=3)
+    args = parser.parse_args()
+
+    simulador, base_url = levantar_simulador(args) if args.simulado else (None, None)
+    try:
+        comparar(args, base_url)
+    finally:
+        if simulador:
+            simulador.terminate()
+            simulador.wait()
+
+
+if __name__ == "__main__":
+    main()
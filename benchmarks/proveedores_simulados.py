@@ -0,0 +1,334 @@
+"""
+Servidor local que imita CoinGecko, Alpha Vantage y OpenAI para medir la API
+sin red ni cuota. Latencia y tasa de errores configurables por proveedor;
+si hay un fixture grabado en --fixtures se responde con él, si no se generan
+velas sintéticas deterministas por símbolo.
+
+    python benchmarks/proveedores_simulados.py --puerto 9100 --latencia-datos 0.2 --latencia-llm 1.5
+    python benchmarks/proveedores_simulados.py grabar --ticker AAPL --intervalo 1H   # requiere red y API key
+
+La API se apunta al servidor con:
+    COINGECKO_URL=http://127.0.0.1:9100/coingecko  KRAKEN_URL=http://127.0.0.1:9100/kraken
+    ALPHA_VANTAGE_URL=http://127.0.0.1:9100/alpha_vantage/query
+    OPENAI_BASE_URL=http://127.0.0.1:9100/openai/v1  OPENAI_API_KEY=sk-simulado
+"""
+import argparse
+import asyncio
+import json
+import os
+import random
+import sys
+import time
+import zlib
+from datetime import datetime, timedelta
+
+from fastapi import FastAPI, Request
+from fastapi.responses import JSONResponse, StreamingResponse
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), ".."))
+
+from datos_mercado import AV_FUNCIONES, BARRAS_COINGECKO, COINGECKO_IDS  # noqa: E402
+
+# Configuración por entorno para poder lanzarlo también con `uvicorn benchmarks.proveedores_simulados:app`
+LATENCIA_DATOS = float(os.getenv("SIM_LATENCIA_DATOS", "0.2"))
+LATENCIA_LLM = float(os.getenv("SIM_LATENCIA_LLM", "1.5"))
+ERROR_DATOS = float(os.getenv("SIM_ERROR_DATOS", "0"))
+ERROR_LLM = float(os.getenv("SIM_ERROR_LLM", "0"))
+# Fracción de respuestas de CoinGecko/Alpha Vantage que tardan 10x (cola lenta); las de respaldo no
+COLA_DATOS = float(os.getenv("SIM_COLA_DATOS", "0"))
+FACTOR_COLA = 10
+# Costo de prefill del LLM simulado: ms extra por token de prompt (~4 caracteres), 0 = latencia fija
+MS_POR_TOKEN_PROMPT = float(os.getenv("SIM_MS_POR_TOKEN_PROMPT", "0"))
+DIRECTORIO_FIXTURES = os.getenv("SIM_FIXTURES", os.path.join(os.path.dirname(__file__), "fixtures"))
+FRAGMENTOS_STREAM = 40
+VELAS_FULL = 1000
+VELAS_COMPACT = 100
+MONEDAS_SIMULADAS = 15000
+# Paso de cada serie de Alpha Vantage
+PASOS_AV = {
+    "15min": timedelta(minutes=15),
+    "60min": timedelta(hours=1),
+    "Time Series (Daily)": timedelta(days=1),
+    "Weekly Time Series": timedelta(weeks=1),
+    "Monthly Time Series": timedelta(days=30),
+}
+
+app = FastAPI()
+llamadas = {"coingecko": 0, "alpha_vantage": 0, "kraken": 0, "openai": 0, "errores": 0}
+
+
+async def esperar(latencia, cola=0.0):
+    # Jitter uniforme +-50% alrededor de la latencia media
+    if random.random() < cola:
+        latencia *= FACTOR_COLA
+    await asyncio.sleep(latencia * random.uniform(0.5, 1.5))
+
+
+def falla(tasa):
+    if random.random() < tasa:
+        llamadas["errores"] += 1
+        return True
+    return False
+
+
+def leer_fixture(nombre):
+    ruta = os.path.join(DIRECTORIO_FIXTURES, nombre + ".json")
+    if os.path.exists(ruta):
+        with open(ruta, encoding="utf-8") as f:
+            return json.load(f)
+    return None
+
+
+def nombre_fixture(*partes):
+    return "_".join(str(p) for p in partes if p)
+
+
+def caminata(simbolo, velas):
+    # Precios sintéticos reproducibles: misma serie para el mismo símbolo
+    rng = random.Random(zlib.crc32(simbolo.encode()))
+    precio = rng.uniform(20, 500)
+    filas = []
+    for _ in range(velas):
+        apertura = precio
+        precio = max(0.01, precio * (1 + rng.gauss(0, 0.01)))
+        rango = abs(rng.gauss(0, 0.005)) * precio
+        filas.append((apertura, max(apertura, precio) + rango, min(apertura, precio) - rango, precio,
+                      rng.randint(10_000, 1_000_000)))
+    return filas
+
+
+@app.get("/coingecko/ping")
+async def ping_coingecko():
+    return {"gecko_says": "(V3) To the Moon!"}
+
+
+def monedas_simuladas():
+    # Las monedas reales del dashboard más un universo sintético para el índice de símbolos
+    reales = [{"id": id_, "symbol": simbolo.lower(), "name": id_.title()} for simbolo, id_ in COINGECKO_IDS.items()]
+    return reales + [{"id": f"moneda-{i}", "symbol": f"m{i}", "name": f"Moneda {i}"} for i in range(MONEDAS_SIMULADAS)]
+
+
+@app.get("/coingecko/coins/list")
+async def lista_coingecko():
+    llamadas["coingecko"] += 1
+    await esperar(LATENCIA_DATOS)
+    return monedas_simuladas()
+
+
+@app.get("/coingecko/coins/markets")
+async def mercados_coingecko(page: int = 1, per_page: int = 250, vs_currency: str = "usd", order: str = ""):
+    llamadas["coingecko"] += 1
+    await esperar(LATENCIA_DATOS)
+    pagina = monedas_simuladas()[(page - 1) * per_page:page * per_page]
+    return [{**m, "market_cap_rank": (page - 1) * per_page + i + 1} for i, m in enumerate(pagina)]
+
+
+def precio_simulado(simbolo):
+    # Cambia cada 30 s: sirve para ver los 304 del sondeo condicional entre cambios
+    rng = random.Random(zlib.crc32(simbolo.encode()) + int(time.time() // 30))
+    return round(rng.uniform(20, 500), 2), round(rng.gauss(0, 2), 2)
+
+
+@app.get("/coingecko/simple/price")
+async def precio_coingecko(ids: str, vs_currencies: str = "usd", include_24hr_change: str = "false"):
+    llamadas["coingecko"] += 1
+    await esperar(LATENCIA_DATOS)
+    precios = {}
+    for coin_id in ids.split(","):
+        precio, cambio = precio_simulado(coin_id)
+        precios[coin_id] = {"usd": precio, "usd_24h_change": cambio}
+    return precios
+
+
+@app.get("/coingecko/coins/{coin_id}/ohlc")
+async def ohlc_coingecko(coin_id: str, days: int = 1, vs_currency: str = "usd"):
+    llamadas["coingecko"] += 1
+    await esperar(LATENCIA_DATOS, COLA_DATOS)
+    if falla(ERROR_DATOS):
+        return JSONResponse({"status": {"error_code": 429, "error_message": "Rate limit (simulado)"}}, 429)
+
+    fixture = leer_fixture(nombre_fixture("coingecko", coin_id, days))
+    if fixture is not None:
+        return fixture
+    barra = BARRAS_COINGECKO.get(days, 4 * 3600)
+    velas = days * 86400 // barra
+    fin = int(time.time() // barra * barra)
+    return [
+        [(fin - (velas - 1 - i) * barra) * 1000, round(o, 4), round(h, 4), round(l, 4), round(c, 4)]
+        for i, (o, h, l, c, _) in enumerate(caminata(coin_id, velas))
+    ]
+
+
+@app.get("/kraken/OHLC")
+async def ohlc_kraken(pair: str, interval: int = 1, since: int = 0):
+    llamadas["kraken"] += 1
+    await esperar(LATENCIA_DATOS)
+    if falla(ERROR_DATOS):
+        return {"error": ["EAPI:Rate limit exceeded"], "result": {}}
+
+    barra = interval * 60
+    fin = int(time.time() // barra * barra)
+    velas = [
+        [fin - (719 - i) * barra, f"{o:.4f}", f"{h:.4f}", f"{l:.4f}", f"{c:.4f}", f"{c:.4f}", f"{v / 1000:.4f}", v // 1000]
+        for i, (o, h, l, c, v) in enumerate(caminata(pair, 720))
+    ]
+    return {"error": [], "result": {pair: [v for v in velas if v[0] > since], "last": fin}}
+
+
+@app.api_route("/alpha_vantage/query", methods=["GET", "HEAD"])
+async def query_alpha_vantage(function: str = "", symbol: str = "", interval: str = "",
+                              outputsize: str = "compact"):
+    if not function:
+        return {}
+    llamadas["alpha_vantage"] += 1
+    await esperar(LATENCIA_DATOS, COLA_DATOS)
+    if falla(ERROR_DATOS):
+        # Alpha Vantage responde 200 con "Note" cuando se pasa del límite
+        return {"Note": "Thank you for using Alpha Vantage! (límite simulado)"}
+
+    if function == "REALTIME_BULK_QUOTES":
+        datos = []
+        for simbolo in symbol.split(","):
+            precio, cambio = precio_simulado(simbolo)
+            datos.append({"symbol": simbolo, "close": f"{precio:.4f}",
+                          "previous_close": f"{precio / (1 + cambio / 100):.4f}"})
+        return {"endpoint": "Realtime Bulk Quotes", "data": datos}
+
+    fixture = leer_fixture(nombre_fixture("alpha_vantage", function, interval, symbol))
+    if fixture is not None:
+        return fixture
+    clave = next((c for f, i, c in AV_FUNCIONES.values() if f == function and (i or "") == interval), None)
+    if clave is None:
+        return {"Error Message": f"Invalid API call: {function} {interval}"}
+
+    velas = VELAS_FULL if outputsize == "full" else VELAS_COMPACT
+    paso = PASOS_AV.get(interval or clave)
+    fin = datetime.now().replace(second=0, microsecond=0)
+    formato = "%Y-%m-%d %H:%M:%S" if interval else "%Y-%m-%d"
+    serie = {}
+    for i, (o, h, l, c, v) in enumerate(caminata(symbol, velas)):
+        ts = (fin - (velas - 1 - i) * paso).strftime(formato)
+        serie[ts] = {"1. open": f"{o:.4f}", "2. high": f"{h:.4f}", "3. low": f"{l:.4f}",
+                     "4. close": f"{c:.4f}", "5. volume": str(v)}
+    return {"Meta Data": {"2. Symbol": symbol}, clave: dict(reversed(serie.items()))}
+
+
+def contenido_llm(estructurado):
+    fixture = leer_fixture("openai_chat_json" if estructurado else "openai_chat")
+    if fixture is not None:
+        return fixture["content"]
+    conclusion = {"last_price": 100.0, "probable_target": 106.0, "probable_stop": 97.0,
+                  "risk_reward_ratio": 2.0, "probability": 62.0}
+    if estructurado:
+        secciones = ["resumen_tecnico", "pivots", "probabilidad", "proyeccion", "riesgo_beneficio"]
+        return json.dumps({**{s: f"Texto simulado de {s}. " * 20 for s in secciones}, "conclusion": conclusion},
+                          ensure_ascii=False)
+    bloques = "\n\n".join(f"{n}. Sección {n}:\n" + "Texto simulado del análisis. " * 20 for n in range(1, 6))
+    return bloques + "\n\nConclusion:\n" + json.dumps({"conclusion": conclusion})
+
+
+@app.get("/openai/v1/models")
+async def modelos_openai():
+    return {"object": "list", "data": [{"id": "gpt-4o", "object": "model", "created": 0, "owned_by": "simulado"}]}
+
+
+@app.post("/openai/v1/chat/completions")
+async def chat_openai(request: Request):
+    llamadas["openai"] += 1
+    cuerpo = await request.json()
+    if falla(ERROR_LLM):
+        await esperar(LATENCIA_LLM / 10)
+        return JSONResponse({"error": {"message": "Error simulado", "type": "server_error"}}, 500)
+
+    estructurado = (cuerpo.get("response_format") or {}).get("type") == "json_schema"
+    contenido = contenido_llm(estructurado)
+    tokens_prompt = sum(len(str(m.get("content") or "")) for m in cuerpo.get("messages", [])) // 4
+    await asyncio.sleep(tokens_prompt * MS_POR_TOKEN_PROMPT / 1000)
+    base = {"id": f"chatcmpl-sim{llamadas['openai']}", "created": int(time.time()), "model": cuerpo.get("model")}
+
+    if not cuerpo.get("stream"):
+        await esperar(LATENCIA_LLM)
+        tokens = len(contenido) // 4
+        return {**base, "object": "chat.completion",
+                "choices": [{"index": 0, "finish_reason": "stop",
+                             "message": {"role": "assistant", "content": contenido, "refusal": None}}],
+                "usage": {"prompt_tokens": tokens_prompt, "completion_tokens": tokens,
+                          "total_tokens": tokens_prompt + tokens}}
+
+    async def fragmentos():
+        tamano = max(1, len(contenido) // FRAGMENTOS_STREAM)
+        for i in range(0, len(contenido), tamano):
+            await asyncio.sleep(LATENCIA_LLM / FRAGMENTOS_STREAM)
+            chunk = {**base, "object": "chat.completion.chunk",
+                     "choices": [{"index": 0, "delta": {"content": contenido[i:i + tamano]}, "finish_reason": None}]}
+            yield f"data: {json.dumps(chunk, ensure_ascii=False)}\n\n"
+        yield "data: [DONE]\n\n"
+
+    return StreamingResponse(fragmentos(), media_type="text/event-stream")
+
+
+@app.get("/estadisticas")
+async def estadisticas():
+    return llamadas
+
+
+def grabar(ticker, intervalo, dias):
+    # Guarda respuestas reales como fixtures para reproducir siempre los mismos datos
+    import httpx
+
+    from datos_mercado import ALPHA_VANTAGE_URL, COINGECKO_URL, es_cripto
+
+    os.makedirs(DIRECTORIO_FIXTURES, exist_ok=True)
+    if es_cripto(ticker):
+        coin_id = COINGECKO_IDS[ticker.split("/")[0]]
+        respuesta = httpx.get(f"{COINGECKO_URL}/coins/{coin_id}/ohlc", params={"vs_currency": "usd", "days": dias})
+        nombre = nombre_fixture("coingecko", coin_id, dias)
+    else:
+        funcion, interval, _ = AV_FUNCIONES[intervalo]
+        params = {"function": funcion, "symbol": ticker, "apikey": os.getenv("ALPHA_VANTAGE_API_KEY")}
+        if interval:
+            params["interval"] = interval
+        respuesta = httpx.get(ALPHA_VANTAGE_URL, params=params)
+        nombre = nombre_fixture("alpha_vantage", funcion, interval, ticker)
+    respuesta.raise_for_status()
+    ruta = os.path.join(DIRECTORIO_FIXTURES, nombre + ".json")
+    with open(ruta, "w", encoding="utf-8") as f:
+        json.dump(respuesta.json(), f)
+    print(f"💾 Fixture guardado en {ruta}")
+
+
+def main():
+    global LATENCIA_DATOS, LATENCIA_LLM, ERROR_DATOS, ERROR_LLM, COLA_DATOS, DIRECTORIO_FIXTURES, MS_POR_TOKEN_PROMPT
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("accion", nargs="?", choices=["servir", "grabar"], default="servir")
+    parser.add_argument("--puerto", type=int, default=9100)
+    parser.add_argument("--latencia-datos", type=float, default=LATENCIA_DATOS)
+    parser.add_argument("--latencia-llm", type=float, default=LATENCIA_LLM)
+    parser.add_argument("--ms-por-token-prompt", type=float, default=MS_POR_TOKEN_PROMPT,
+                        help="latencia extra del LLM por token de prompt (prefill)")
+    parser.add_argument("--error-datos", type=float, default=ERROR_DATOS, help="fracción de respuestas con error")
+    parser.add_argument("--error-llm", type=float, default=ERROR_LLM)
+    parser.add_argument("--cola-datos", type=float, default=COLA_DATOS,
+                        help="fracción de respuestas de datos 10x más lentas")
+    parser.add_argument("--fixtures", default=DIRECTORIO_FIXTURES)
+    parser.add_argument("--ticker", default="AAPL")
+    parser.add_argument("--intervalo", default="1D")
+    parser.add_argument("--dias", type=int, default=1)
+    args = parser.parse_args()
+
+    LATENCIA_DATOS, LATENCIA_LLM = args.latencia_datos, args.latencia_llm
+    ERROR_DATOS, ERROR_LLM, COLA_DATOS = args.error_datos, args.error_llm, args.cola_datos
+    DIRECTORIO_FIXTURES = args.fixtures
+    MS_POR_TOKEN_PROMPT = args.ms_por_token_prompt
+
+    if args.accion == "grabar":
+        grabar(args.ticker.upper(), args.intervalo.upper(), args.dias)
+        return
+
+    import uvicorn
+
+    uvicorn.run(app, host="127.0.0.1", port=args.puerto, log_level="warning")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,77 @@
+"""
+Costo por rerun de los gráficos del dashboard: rasterizar con matplotlib en
+cada rerun (comportamiento anterior), servir el PNG cacheado por hash de los
+datos (lo que hace st.cache_data) o mandar la spec Vega-Lite al navegador.
+
+    python benchmarks/render_graficos.py --velas 120 -n 20
+"""
+import argparse
+import hashlib
+import json
+import os
+import sys
+import time
+
+import numpy as np
+import pandas as pd
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), ".."))
+
+import graficos  # noqa: E402
+
+
+def datos_sinteticos(velas):
+    rng = np.random.default_rng(0)
+    close = 100 + np.cumsum(rng.normal(0, 1, velas))
+    indice = pd.date_range("2024-01-01", periods=velas, freq="h", name="timestamp")
+    return pd.DataFrame({"Open": close + rng.normal(0, 0.3, velas), "High": close + 1,
+                         "Low": close - 1, "Close": close}, index=indice)
+
+
+def clave(data, niveles):
+    # Equivalente al hash de argumentos de st.cache_data
+    h = hashlib.md5(pd.util.hash_pandas_object(data).values.tobytes())
+    h.update(json.dumps(niveles, sort_keys=True).encode())
+    return h.hexdigest()
+
+
+def medir(funcion, n):
+    tiempos = []
+    for _ in range(n):
+        inicio = time.perf_counter()
+        funcion()
+        tiempos.append(time.perf_counter() - inicio)
+    return np.median(tiempos) * 1000
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--velas", type=int, default=120)
+    parser.add_argument("-n", type=int, default=20)
+    args = parser.parse_args()
+
+    data = datos_sinteticos(args.velas)
+    niveles = {"Target": float(data["Close"].iloc[-1] * 1.05), "Stop Loss": float(data["Close"].iloc[-1] * 0.97)}
+    cache = {}
+
+    def cacheado():
+        k = clave(data, niveles)
+        if k not in cache:
+            cache[k] = graficos.a_png(graficos.grafico_ohlc(data, niveles))
+        return cache[k]
+
+    cacheado()
+    sin_cache = medir(lambda: graficos.a_png(graficos.grafico_ohlc(data, niveles)), args.n)
+    proyeccion = medir(lambda: graficos.a_png(graficos.grafico_proyeccion(100, 105, 97)), args.n)
+    con_cache = medir(cacheado, args.n)
+    cliente = medir(lambda: json.dumps({"spec": graficos.spec_velas(niveles),
+                                        "datos": data.reset_index(names="ts").to_json(orient="records", date_format="iso")}), args.n)
+
+    print(f"{'velas + proyección sin caché':<32} {sin_cache + proyeccion:8.2f} ms por rerun")
+    print(f"{'PNG cacheado por hash':<32} {con_cache:8.2f} ms por rerun")
+    print(f"{'Vega-Lite (series al navegador)':<32} {cliente:8.2f} ms por rerun")
+    print(f"{'tamaño PNG':<32} {len(cacheado()) / 1024:8.1f} KiB")
+
+
+if __name__ == "__main__":
+    main()
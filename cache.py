@@ -0,0 +1,181 @@
+import asyncio
+import os
+import pickle
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+
+# Directorio por defecto de los archivos SQLite (cachés, historial, trabajos); no va al repo
+DIRECTORIO_DATOS = os.getenv("DATOS_DIR", "datos")
+
+
+def ruta_datos(nombre):
+    return os.path.join(DIRECTORIO_DATOS, nombre)
+
+
+class AlmacenSQLite:
+    """
+    Almacén clave -> valor en un archivo SQLite, compartido entre procesos.
+    Los valores se guardan con pickle junto a su expiración; al superar
+    max_entradas se borran primero los vencidos y luego los menos usados.
+    """
+
+    PODA_CADA = 50
+
+    def __init__(self, ruta, max_entradas=5000):
+        self.ruta = ruta
+        self.max_entradas = max_entradas
+        self._lock = threading.Lock()
+        self._escrituras = 0
+        self._usados = {}
+        os.makedirs(os.path.dirname(ruta) or ".", exist_ok=True)
+        self._conn = sqlite3.connect(ruta, check_same_thread=False, timeout=5)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS cache ("
+            "clave TEXT PRIMARY KEY, expira REAL, usado REAL, valor BLOB)"
+        )
+        self._conn.commit()
+
+    def obtener(self, clave):
+        with self._lock:
+            fila = self._conn.execute(
+                "SELECT expira, valor FROM cache WHERE clave = ?", (clave,)
+            ).fetchone()
+            if fila is None:
+                return None
+            # La lectura no escribe: el uso se anota y se graba con la próxima escritura
+            self._usados[clave] = time.time()
+        return fila[0], pickle.loads(fila[1])
+
+    def guardar(self, clave, valor, expira):
+        blob = pickle.dumps(valor, protocol=pickle.HIGHEST_PROTOCOL)
+        with self._lock:
+            self._conn.execute(
+                "INSERT OR REPLACE INTO cache (clave, expira, usado, valor) VALUES (?, ?, ?, ?)",
+                (clave, expira, time.time(), blob),
+            )
+            self._escrituras += 1
+            self._grabar_usados()
+            if self._escrituras % self.PODA_CADA == 0:
+                self._podar()
+            self._conn.commit()
+
+    def _grabar_usados(self):
+        if self._usados:
+            self._conn.executemany(
+                # Otro worker pudo haber anotado un uso más reciente: el valor nunca retrocede
+                "UPDATE cache SET usado = MAX(usado, ?) WHERE clave = ?",
+                [(usado, clave) for clave, usado in self._usados.items()],
+            )
+            self._usados = {}
+
+    def _podar(self):
+        total = self._conn.execute("SELECT COUNT(*) FROM cache").fetchone()[0]
+        if total <= self.max_entradas:
+            return
+        self._conn.execute("DELETE FROM cache WHERE expira < ?", (time.time(),))
+        total = self._conn.execute("SELECT COUNT(*) FROM cache").fetchone()[0]
+        exceso = total - self.max_entradas
+        if exceso > 0:
+            self._conn.execute(
+                "DELETE FROM cache WHERE clave IN "
+                "(SELECT clave FROM cache ORDER BY usado ASC LIMIT ?)",
+                (exceso,),
+            )
+
+    def cerrar(self):
+        with self._lock:
+            self._grabar_usados()
+            self._conn.commit()
+            self._conn.close()
+
+
+class CacheLRU:
+    """
+    Caché en memoria con TTL por entrada, límite LRU y contadores de hits/misses.
+    Si recibe un AlmacenSQLite lo usa como segundo nivel (sobrevive reinicios
+    y se comparte entre workers de uvicorn).
+    """
+
+    def __init__(self, max_entradas=256, almacen=None):
+        self.max_entradas = max_entradas
+        self.almacen = almacen
+        self._datos = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+
+    def obtener(self, clave, permitir_vencido=False):
+        # permitir_vencido devuelve la entrada aunque su TTL haya pasado (datos "stale")
+        entrada = self._datos.get(clave)
+        if self._buscar_en_disco(entrada):
+            entrada = self._desde_disco(clave, self.almacen.obtener(clave), entrada)
+        return self._resolver(clave, entrada, permitir_vencido)
+
+    async def obtener_async(self, clave, permitir_vencido=False):
+        """Igual que obtener(), pero la lectura del almacén en disco corre en un hilo."""
+        entrada = self._datos.get(clave)
+        if self._buscar_en_disco(entrada):
+            en_disco = await asyncio.to_thread(self.almacen.obtener, clave)
+            entrada = self._desde_disco(clave, en_disco, entrada)
+        return self._resolver(clave, entrada, permitir_vencido)
+
+    def leer(self, clave, permitir_vencido=False):
+        """
+        Como obtener() pero solo en memoria y sin contar hit/miss: para volver a
+        leer una clave que la misma petición ya contó.
+        """
+        entrada = self._datos.get(clave)
+        if entrada is None or (entrada[0] <= time.time() and not permitir_vencido):
+            return None
+        return entrada[1]
+
+    def _buscar_en_disco(self, entrada):
+        # Otro worker pudo haber refrescado la entrada en disco
+        return (entrada is None or entrada[0] <= time.time()) and self.almacen is not None
+
+    def _desde_disco(self, clave, en_disco, entrada):
+        if en_disco is None:
+            return entrada
+        self._guardar_memoria(clave, en_disco)
+        return en_disco
+
+    def _resolver(self, clave, entrada, permitir_vencido):
+        if entrada is None or (entrada[0] <= time.time() and not permitir_vencido):
+            self.misses += 1
+            return None
+
+        self._datos.move_to_end(clave)
+        self.hits += 1
+        return entrada[1]
+
+    def guardar(self, clave, valor, ttl):
+        entrada = (time.time() + ttl, valor)
+        self._guardar_memoria(clave, entrada)
+        if self.almacen is not None:
+            self.almacen.guardar(clave, valor, entrada[0])
+
+    async def guardar_async(self, clave, valor, ttl):
+        # La memoria se actualiza en el event loop; solo el commit de SQLite va a un hilo
+        entrada = (time.time() + ttl, valor)
+        self._guardar_memoria(clave, entrada)
+        if self.almacen is not None:
+            await asyncio.to_thread(self.almacen.guardar, clave, valor, entrada[0])
+
+    def _guardar_memoria(self, clave, entrada):
+        self._datos[clave] = entrada
+        self._datos.move_to_end(clave)
+        while len(self._datos) > self.max_entradas:
+            self._datos.popitem(last=False)
+
+    def estadisticas(self):
+        total = self.hits + self.misses
+        return {
+            "entradas": len(self._datos),
+            "max_entradas": self.max_entradas,
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": round(self.hits / total, 4) if total else 0.0,
+            "persistente": self.almacen is not None,
+        }
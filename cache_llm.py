@@ -0,0 +1,50 @@
+import hashlib
+import json
+import os
+
+from cache import AlmacenSQLite, CacheLRU, ruta_datos
+
+
+class CacheLLM:
+    """
+    Caché de resultados del LLM direccionada por contenido: la clave es un
+    hash de (modelo, temperatura, versión del prompt, ticker, intervalo, tabla CSV).
+    """
+
+    def __init__(self, ttl=24 * 3600, max_memoria=256, ruta_disco=None, max_disco=5000):
+        self.ttl = ttl
+        almacen = AlmacenSQLite(ruta_disco, max_entradas=max_disco) if ruta_disco else None
+        self.cache = CacheLRU(max_entradas=max_memoria, almacen=almacen)
+
+    @staticmethod
+    def clave(modelo, temperatura, version_prompt, ticker, intervalo, tabla):
+        contenido = json.dumps(
+            [modelo, temperatura, version_prompt, ticker, intervalo, tabla],
+            ensure_ascii=False,
+        )
+        return "llm|" + hashlib.sha256(contenido.encode("utf-8")).hexdigest()
+
+    def obtener(self, clave):
+        return self.cache.obtener(clave)
+
+    def guardar(self, clave, resultado):
+        self.cache.guardar(clave, resultado, self.ttl)
+
+    async def obtener_async(self, clave):
+        return await self.cache.obtener_async(clave)
+
+    async def guardar_async(self, clave, resultado):
+        await self.cache.guardar_async(clave, resultado, self.ttl)
+
+    def estadisticas(self):
+        return {**self.cache.estadisticas(), "ttl": self.ttl}
+
+
+def crear_cache_llm():
+    # CACHE_LLM_RUTA vacío desactiva la persistencia en disco
+    return CacheLLM(
+        ttl=int(os.getenv("CACHE_LLM_TTL", str(24 * 3600))),
+        max_memoria=int(os.getenv("CACHE_LLM_MAX_MEMORIA", "256")),
+        ruta_disco=os.getenv("CACHE_LLM_RUTA", ruta_datos("cache_llm.sqlite")) or None,
+        max_disco=int(os.getenv("CACHE_LLM_MAX_DISCO", "5000")),
+    )
@@ -0,0 +1,179 @@
+import asyncio
+import logging
+import os
+from datetime import datetime, timedelta, timezone
+from zoneinfo import ZoneInfo
+
+from almacen_ohlc import AlmacenOHLC, parametros_delta
+from cache import AlmacenSQLite, CacheLRU, ruta_datos
+from cobertura import Cobertura, crear_cobertura
+from datos_mercado import BARRAS_COINGECKO, DAYS_MAP, fuentes_para, obtener_de_fuente, proveedor_para
+from metricas import registrar
+from planificador import PRIORIDAD_INTERACTIVA
+
+NUEVA_YORK = ZoneInfo("America/New_York")
+# Alpha Vantage publica la vela diaria unos minutos después del cierre
+MARGEN_CIERRE = timedelta(minutes=15)
+TTL_MINIMO = 30
+
+# Tamaño de vela (segundos) de cada intervalo intradía
+BARRAS_INTRADIA = {"15M": 15 * 60, "1H": 60 * 60}
+TTL_LARGO = {"1W": 6 * 3600, "1M": 12 * 3600}
+
+
+def segundos_hasta_siguiente_barra(ahora, barra):
+    epoch = ahora.timestamp()
+    return barra - (epoch % barra)
+
+
+def siguiente_cierre_sesion(ahora):
+    # Próximo cierre de NYSE/NASDAQ (16:00 Nueva York, lunes a viernes)
+    local = ahora.astimezone(NUEVA_YORK)
+    cierre = local.replace(hour=16, minute=0, second=0, microsecond=0) + MARGEN_CIERRE
+    if local >= cierre:
+        cierre += timedelta(days=1)
+    while cierre.weekday() >= 5:
+        cierre += timedelta(days=1)
+    return cierre
+
+
+def ttl_mercado(proveedor, intervalo, ahora=None):
+    """Segundos que sigue siendo válida la última vela de (proveedor, intervalo)."""
+    ahora = ahora or datetime.now(timezone.utc)
+
+    if proveedor == "coingecko":
+        barra = BARRAS_COINGECKO[DAYS_MAP.get(intervalo, 1)]
+        ttl = segundos_hasta_siguiente_barra(ahora, barra)
+    elif intervalo in BARRAS_INTRADIA:
+        ttl = segundos_hasta_siguiente_barra(ahora, BARRAS_INTRADIA[intervalo])
+    elif intervalo in TTL_LARGO:
+        ttl = TTL_LARGO[intervalo]
+    else:
+        ttl = (siguiente_cierre_sesion(ahora) - ahora).total_seconds()
+
+    return max(ttl, TTL_MINIMO)
+
+
+class CacheMercado:
+    """
+    Capa entre analizar y los proveedores, con claves (proveedor, símbolo, intervalo).
+    Con un planificador, cada fetch espera su turno de cuota; si la cuota no
+    alcanza o el proveedor falla se sirven los últimos datos guardados aunque
+    estén vencidos. Con un AlmacenOHLC solo se piden las velas posteriores a
+    la última guardada y se devuelven las últimas `lookback` del almacén.
+    Cada símbolo tiene una lista de fuentes (datos_mercado.fuentes_para): la
+    Cobertura decide cuándo pedirle también a la siguiente.
+    """
+
+    def __init__(self, max_entradas=256, ruta_disco=None, planificador=None,
+                 almacen_ohlc=None, lookback=300, cobertura=None):
+        almacen = AlmacenSQLite(ruta_disco) if ruta_disco else None
+        self.cache = CacheLRU(max_entradas=max_entradas, almacen=almacen)
+        self.planificador = planificador
+        self.cobertura = cobertura or Cobertura()
+        self.almacen_ohlc = almacen_ohlc
+        self.lookback = lookback
+        self.vencidos_servidos = 0
+        # Fuentes cuyo plan no incluye outputsize=full: se les pide compact desde el principio
+        self.sin_full = set()
+
+    @staticmethod
+    def clave(proveedor, ticker, intervalo):
+        return f"{proveedor}|{ticker}|{intervalo}"
+
+    async def obtener(self, client, ticker, intervalo, prioridad=PRIORIDAD_INTERACTIVA, velas=None):
+        # velas: más historia que el lookback (p. ej. la serie base del modo multi-temporalidad)
+        velas = velas or self.lookback
+        proveedor = proveedor_para(ticker)
+        clave = self.clave(proveedor, ticker, intervalo)
+        if velas != self.lookback:
+            clave += f"|{velas}"
+
+        data = await self.cache.obtener_async(clave)
+        if data is not None:
+            return data
+
+        fuentes = fuentes_para(ticker)
+
+        async def turno(fuente, es_cobertura):
+            if self.planificador is not None:
+                # Una cobertura no hace cola: si la fuente no tiene cuota ya, no se lanza
+                await self.planificador.turno(fuente, prioridad, espera_max=0 if es_cobertura else None)
+
+        async def lanzar(fuente, es_cobertura):
+            return await self._descargar(client, fuente, ticker, intervalo, velas, prioridad)
+
+        try:
+            # En segundo plano no importa la latencia: solo respaldo secuencial si la principal falla
+            data = await self.cobertura.primera_valida(fuentes, lanzar, cubrir=prioridad == PRIORIDAD_INTERACTIVA,
+                                                       turno=turno)
+        except Exception as e:
+            # Cualquier falla del proveedor (cuota, HTTP, yfinance, parseo de Kraken, timeout) sirve lo vencido
+            vencido = await self.cache.obtener_async(clave, permitir_vencido=True)
+            for fuente in fuentes if self.almacen_ohlc is not None else []:
+                if vencido is not None:
+                    break
+                vencido = await asyncio.to_thread(self.almacen_ohlc.leer, fuente, ticker, intervalo, velas)
+            if vencido is None:
+                raise
+            registrar("datos_vencidos", logging.WARNING, proveedor=proveedor, ticker=ticker,
+                      intervalo=intervalo, tipo_error=type(e).__name__, error=str(e))
+            self.vencidos_servidos += 1
+            return vencido
+
+        await self.cache.guardar_async(clave, data, ttl_mercado(proveedor, intervalo))
+        return data
+
+    async def _descargar(self, client, fuente, ticker, intervalo, velas, prioridad=PRIORIDAD_INTERACTIVA):
+        if self.almacen_ohlc is None:
+            data = await obtener_de_fuente(client, fuente, ticker, intervalo)
+            return data.tail(velas)
+
+        # Serie propia por fuente: timestamps y velas de distintos proveedores no se mezclan.
+        # flock + memmap son I/O de disco bloqueante: van a un hilo, no al event loop
+        ultimo = await asyncio.to_thread(self.almacen_ohlc.ultimo_ts, fuente, ticker, intervalo)
+        params = parametros_delta(fuente, intervalo, ultimo)
+        if params.get("outputsize") == "full" and fuente in self.sin_full:
+            params["outputsize"] = "compact"
+        try:
+            nuevos = await obtener_de_fuente(client, fuente, ticker, intervalo, **params)
+        except ValueError as e:
+            # Solo el aviso de outputsize=full premium se reintenta; un "Note" de límite se propaga
+            if params.get("outputsize") != "full" or not es_full_premium(e):
+                raise
+            self.sin_full.add(fuente)
+            registrar("outputsize_full_premium", logging.WARNING, fuente=fuente, ticker=ticker, intervalo=intervalo)
+            # El reintento es otra llamada al proveedor: pasa por la cuota como la primera
+            if self.planificador is not None:
+                await self.planificador.turno(fuente, prioridad)
+            nuevos = await obtener_de_fuente(client, fuente, ticker, intervalo, outputsize="compact")
+        return await asyncio.to_thread(self._agregar_y_leer, fuente, ticker, intervalo, nuevos, velas)
+
+    def _agregar_y_leer(self, fuente, ticker, intervalo, nuevos, velas):
+        self.almacen_ohlc.agregar(fuente, ticker, intervalo, nuevos)
+        return self.almacen_ohlc.leer(fuente, ticker, intervalo, velas)
+
+    def estadisticas(self):
+        return {**self.cache.estadisticas(), "vencidos_servidos": self.vencidos_servidos,
+                "sin_full": sorted(self.sin_full), "fuentes": self.cobertura.estadisticas()}
+
+
+def es_full_premium(error):
+    # "The outputsize=full parameter value is a premium feature..." (el aviso de límite también nombra
+    # los planes premium, pero no outputsize)
+    mensaje = str(error).lower()
+    return "premium" in mensaje and "outputsize" in mensaje
+
+
+def crear_cache_mercado(planificador=None):
+    # CACHE_MERCADO_RUTA activa el respaldo en disco (p. ej. /tmp/aimm_mercado.sqlite)
+    # OHLC_DIR guarda las series para fetches incrementales (vacío lo desactiva)
+    directorio_ohlc = os.getenv("OHLC_DIR", ruta_datos("ohlc"))
+    return CacheMercado(
+        max_entradas=int(os.getenv("CACHE_MERCADO_MAX", "256")),
+        ruta_disco=os.getenv("CACHE_MERCADO_RUTA") or None,
+        planificador=planificador,
+        almacen_ohlc=AlmacenOHLC(directorio_ohlc) if directorio_ohlc else None,
+        lookback=int(os.getenv("LOOKBACK_VELAS", "300")),
+        cobertura=crear_cobertura(),
+    )
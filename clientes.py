@@ -0,0 +1,103 @@
+import asyncio
+import importlib
+import logging
+import os
+
+import httpx
+
+from datos_mercado import ALPHA_VANTAGE_URL, COINGECKO_URL, TIMEOUT_PROVEEDOR
+from metricas import registrar
+
+# Pool keep-alive compartido por todas las peticiones del worker
+LIMITES_HTTP = httpx.Limits(max_connections=100, max_keepalive_connections=20, keepalive_expiry=120)
+PRECALENTAR = os.getenv("PRECALENTAR", "1") == "1"
+CONEXIONES_PRECALENTADAS = int(os.getenv("CONEXIONES_PRECALENTADAS", "2"))
+TIMEOUT_PRECALENTAR = 5.0
+
+_http_client = None
+_openai_client = None
+_precalentamiento = None
+
+
+def crear_cliente_http():
+    return httpx.AsyncClient(limits=LIMITES_HTTP, timeout=TIMEOUT_PROVEEDOR)
+
+
+def crear_cliente_openai():
+    # openai tarda ~0.5 s en importarse: se carga al crear el primer cliente
+    import openai
+
+    return openai.AsyncOpenAI(
+        http_client=openai.DefaultAsyncHttpxClient(limits=LIMITES_HTTP),
+    )
+
+
+def obtener_cliente_http():
+    # Fuera del lifespan (scripts, benchmarks) se crea en el primer uso
+    global _http_client
+    if _http_client is None:
+        _http_client = crear_cliente_http()
+    return _http_client
+
+
+def obtener_cliente_openai():
+    global _openai_client
+    if _openai_client is None:
+        _openai_client = crear_cliente_openai()
+    return _openai_client
+
+
+async def precalentar(conexiones=CONEXIONES_PRECALENTADAS):
+    """
+    Abre conexiones (DNS + TCP + TLS) contra cada proveedor para que la primera
+    petición real no pague el handshake. Los errores se ignoran: una respuesta
+    401/404 igual deja la conexión en el pool.
+    """
+    global _openai_client
+    # El import de openai bloquea: se hace en un hilo para no frenar el event loop
+    openai = await asyncio.to_thread(importlib.import_module, "openai")
+    if _openai_client is None:
+        try:
+            _openai_client = crear_cliente_openai()
+        except openai.OpenAIError as e:
+            # Sin OPENAI_API_KEY la API arranca igual; el error aparece al analizar
+            registrar("cliente_openai_no_inicializado", logging.WARNING, error=str(e))
+    http_client = obtener_cliente_http()
+
+    tareas = []
+    for _ in range(conexiones):
+        tareas.append(http_client.get(f"{COINGECKO_URL}/ping", timeout=TIMEOUT_PRECALENTAR))
+        tareas.append(http_client.head(ALPHA_VANTAGE_URL, timeout=TIMEOUT_PRECALENTAR))
+        if _openai_client is not None:
+            llm = _openai_client.with_options(timeout=TIMEOUT_PRECALENTAR, max_retries=0)
+            tareas.append(llm.models.list())
+
+    resultados = await asyncio.gather(*tareas, return_exceptions=True)
+    fallidas = [r for r in resultados
+                if isinstance(r, (httpx.TransportError, openai.APIConnectionError))]
+    # Con conexiones fallidas sube a WARNING para que el muestreo de logs no lo oculte
+    registrar("precalentamiento", logging.WARNING if fallidas else logging.INFO,
+              abiertas=len(tareas) - len(fallidas), total=len(tareas))
+
+
+async def iniciar():
+    global _http_client, _precalentamiento
+    _http_client = crear_cliente_http()
+    # El precalentamiento corre en segundo plano: la API acepta peticiones
+    # sin esperar los handshakes ni el import de openai
+    if PRECALENTAR:
+        _precalentamiento = asyncio.create_task(precalentar())
+
+
+async def cerrar():
+    global _http_client, _openai_client, _precalentamiento
+    if _precalentamiento is not None:
+        _precalentamiento.cancel()
+        await asyncio.gather(_precalentamiento, return_exceptions=True)
+        _precalentamiento = None
+    if _http_client is not None:
+        await _http_client.aclose()
+    if _openai_client is not None:
+        await _openai_client.close()
+    _http_client = None
+    _openai_client = None
@@ -0,0 +1,33 @@
+import asyncio
+
+
+class SingleFlight:
+    """
+    Agrupa llamadas concurrentes idénticas: la primera con una clave lanza el
+    trabajo y las demás esperan el mismo futuro en vuelo en lugar de repetirlo.
+    """
+
+    def __init__(self):
+        self._en_vuelo = {}
+        self.ejecutadas = 0
+        self.coalescidas = 0
+
+    async def ejecutar(self, clave, fabrica):
+        futuro = self._en_vuelo.get(clave)
+        if futuro is not None:
+            self.coalescidas += 1
+        else:
+            self.ejecutadas += 1
+            futuro = asyncio.ensure_future(fabrica())
+            self._en_vuelo[clave] = futuro
+            futuro.add_done_callback(lambda _: self._en_vuelo.pop(clave, None))
+
+        # shield: si un cliente se desconecta no se cancela el trabajo compartido
+        return await asyncio.shield(futuro)
+
+    def estadisticas(self):
+        return {
+            "en_vuelo": len(self._en_vuelo),
+            "ejecutadas": self.ejecutadas,
+            "coalescidas": self.coalescidas,
+        }
@@ -0,0 +1,127 @@
+import asyncio
+import os
+import time
+from collections import deque
+
+
+class Cobertura:
+    """
+    Pide los datos a una lista ordenada de fuentes y se queda con la primera
+    respuesta válida. Si la fuente en curso no respondió al llegar a su umbral
+    de latencia (p95 de sus últimas respuestas) se lanza una petición de
+    cobertura a la siguiente sin cancelar la primera; si falla, se pasa a la
+    siguiente de inmediato. Las coberturas tienen un presupuesto (fracción de
+    las peticiones) para no duplicar la carga sobre los proveedores.
+    """
+
+    MUESTRAS_MINIMAS = 20
+
+    def __init__(self, umbral_inicial=2.0, umbral_minimo=0.3, percentil=0.95,
+                 fraccion_max=0.1, ventana=200):
+        self.umbral_inicial = umbral_inicial
+        self.umbral_minimo = umbral_minimo
+        self.percentil = percentil
+        self.fraccion_max = fraccion_max
+        self.ventana = ventana
+        self._latencias = {}
+        self.peticiones = 0
+        self.coberturas = 0
+        self.respaldos = 0
+        self.ganadas = {}
+
+    def umbral(self, fuente):
+        muestras = self._latencias.get(fuente)
+        if not muestras or len(muestras) < self.MUESTRAS_MINIMAS:
+            return self.umbral_inicial
+        ordenadas = sorted(muestras)
+        return max(self.umbral_minimo, ordenadas[int(self.percentil * (len(ordenadas) - 1))])
+
+    def _registrar(self, fuente, segundos):
+        self._latencias.setdefault(fuente, deque(maxlen=self.ventana)).append(segundos)
+
+    def _puede_cubrir(self):
+        return self.coberturas < self.fraccion_max * self.peticiones + 1
+
+    async def primera_valida(self, fuentes, lanzar, cubrir=True, turno=None):
+        """
+        lanzar(fuente, es_cobertura) devuelve la corrutina que descarga de esa
+        fuente; turno(fuente, es_cobertura), si se pasa, espera la cuota antes.
+        Si todas fallan se relanza el error de la primera.
+        """
+        self.peticiones += 1
+        pendientes = {}
+        errores = []
+        siguiente = 0
+
+        async def correr(fuente, es_cobertura, tiempos):
+            if turno is not None:
+                await turno(fuente, es_cobertura)
+            # La latencia de la fuente se mide desde que tiene cuota: la espera en cola no infla el p95
+            tiempos["turno"] = time.perf_counter()
+            return await lanzar(fuente, es_cobertura)
+
+        def abrir(es_cobertura):
+            nonlocal siguiente
+            fuente = fuentes[siguiente]
+            siguiente += 1
+            tiempos = {"lanzada": time.perf_counter(), "turno": None}
+            tarea = asyncio.ensure_future(correr(fuente, es_cobertura, tiempos))
+            pendientes[tarea] = (fuente, tiempos)
+
+        abrir(False)
+        try:
+            while pendientes:
+                espera = None
+                if cubrir and siguiente < len(fuentes) and self._puede_cubrir():
+                    # Umbral de la última fuente lanzada, contado desde que se lanzó (con la espera
+                    # de cuota incluida: si el proveedor está frenado conviene cubrir antes)
+                    fuente, tiempos = list(pendientes.values())[-1]
+                    espera = max(0.0, self.umbral(fuente) - (time.perf_counter() - tiempos["lanzada"]))
+
+                hechas, _ = await asyncio.wait(pendientes, timeout=espera, return_when=asyncio.FIRST_COMPLETED)
+                if not hechas:
+                    self.coberturas += 1
+                    abrir(True)
+                    continue
+
+                for tarea in hechas:
+                    fuente, tiempos = pendientes.pop(tarea)
+                    try:
+                        data = tarea.result()
+                    except Exception as e:
+                        errores.append((fuente, e))
+                        continue
+                    if data is None or data.empty:
+                        errores.append((fuente, ValueError(f"{fuente}: respuesta sin datos")))
+                        continue
+                    self._registrar(fuente, time.perf_counter() - tiempos["turno"])
+                    self.ganadas[fuente] = self.ganadas.get(fuente, 0) + 1
+                    return data
+
+                if not pendientes and siguiente < len(fuentes):
+                    # Todas las lanzadas fallaron: respaldo secuencial con la siguiente
+                    self.respaldos += 1
+                    abrir(False)
+        finally:
+            for tarea in pendientes:
+                tarea.cancel()
+
+        errores.sort(key=lambda error: fuentes.index(error[0]))
+        raise errores[0][1]
+
+    def estadisticas(self):
+        return {
+            "peticiones": self.peticiones,
+            "coberturas": self.coberturas,
+            "respaldos": self.respaldos,
+            "ganadas": dict(self.ganadas),
+            "umbral_segundos": {fuente: round(self.umbral(fuente), 3) for fuente in self._latencias},
+        }
+
+
+def crear_cobertura():
+    return Cobertura(
+        umbral_inicial=float(os.getenv("COBERTURA_UMBRAL", "2.0")),
+        umbral_minimo=float(os.getenv("COBERTURA_UMBRAL_MINIMO", "0.3")),
+        fraccion_max=float(os.getenv("COBERTURA_FRACCION_MAX", "0.1")),
+    )
@@ -0,0 +1,92 @@
+import json
+import os
+import re
+import sqlite3
+import threading
+import time
+
+from cache import ruta_datos
+
+CAMPOS = ["last_price", "probable_target", "probable_stop", "risk_reward_ratio", "probability"]
+PATRON_CONCLUSION = re.compile(r'\{\s*"conclusion"\s*:\s*(\{[^{}]*\})')
+
+
+def extraer_conclusion(texto):
+    """Conclusión del modo texto libre (la línea JSON final del prompt), o None si no se puede leer."""
+    coincidencia = PATRON_CONCLUSION.search(texto or "")
+    if coincidencia is None:
+        return None
+    try:
+        conclusion = json.loads(coincidencia.group(1))
+        conclusion = {campo: float(conclusion[campo]) for campo in CAMPOS}
+    except (ValueError, KeyError, TypeError):
+        return None
+    # El prompt libre no fija la escala: una probabilidad estrictamente entre 0 y 1 es una fracción
+    if 0 < conclusion["probability"] < 1:
+        conclusion["probability"] *= 100
+    return conclusion
+
+
+class RegistroConclusiones:
+    """
+    Historial de las conclusiones de cada análisis en SQLite, una fila por
+    (ticker, intervalo, modo, última vela analizada): repetir el análisis
+    sobre la misma vela (p. ej. un hit de caché) reemplaza la fila.
+    """
+
+    def __init__(self, ruta):
+        self.ruta = ruta
+        self._lock = threading.Lock()
+        os.makedirs(os.path.dirname(ruta) or ".", exist_ok=True)
+        self._conn = sqlite3.connect(ruta, check_same_thread=False, timeout=5)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS conclusiones ("
+            "ticker TEXT, intervalo TEXT, multitemporal INTEGER, vela INTEGER, creado REAL, "
+            "last_price REAL, probable_target REAL, probable_stop REAL, risk_reward_ratio REAL, probability REAL, "
+            "PRIMARY KEY (ticker, intervalo, multitemporal, vela))"
+        )
+        self._conn.commit()
+        self.guardadas = 0
+
+    def guardar(self, ticker, intervalo, vela, conclusion, multitemporal=False):
+        # vela: Timestamp de la última vela que vio el modelo (ns, misma escala que el AlmacenOHLC)
+        try:
+            valores = [float(conclusion[campo]) for campo in CAMPOS]
+        except (KeyError, TypeError, ValueError):
+            return False
+        with self._lock:
+            self._conn.execute(
+                "INSERT OR REPLACE INTO conclusiones VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?)",
+                (ticker, intervalo, int(multitemporal), vela.value, time.time(), *valores),
+            )
+            self._conn.commit()
+        self.guardadas += 1
+        return True
+
+    def cargar(self):
+        import pandas as pd
+
+        with self._lock:
+            return pd.read_sql_query("SELECT * FROM conclusiones", self._conn)
+
+    def estadisticas(self):
+        with self._lock:
+            total = self._conn.execute("SELECT COUNT(*) FROM conclusiones").fetchone()[0]
+        return {"total": total, "guardadas": self.guardadas}
+
+
+_registro = None
+
+
+def obtener_registro():
+    global _registro
+    if _registro is None:
+        _registro = crear_registro_conclusiones()
+    return _registro
+
+
+def crear_registro_conclusiones():
+    # CONCLUSIONES_RUTA vacío desactiva el historial
+    ruta = os.getenv("CONCLUSIONES_RUTA", ruta_datos("conclusiones.sqlite"))
+    return RegistroConclusiones(ruta) if ruta else None
@@ -0,0 +1,99 @@
+import asyncio
+import hashlib
+import json
+import logging
+import os
+
+import httpx
+
+from cache import CacheLRU
+from datos_mercado import (cotizaciones_alpha_vantage, cotizaciones_coingecko, cotizaciones_yfinance,
+                           es_cripto)
+from metricas import registrar
+from planificador import PRIORIDAD_FONDO, CuotaAgotada
+
+# Una cotización se considera vigente durante TTL segundos (el dashboard sondea más seguido)
+TTL_COTIZACION = 15
+MAX_SIMBOLOS = 100
+# Fuente batch de acciones: yfinance (sin clave) o alpha_vantage (REALTIME_BULK_QUOTES, premium)
+FUENTES_ACCIONES = {"yfinance": cotizaciones_yfinance, "alpha_vantage": cotizaciones_alpha_vantage}
+
+
+def etag(cotizaciones):
+    # Solo precio y cambio: si nada se movió el ETag no cambia aunque se haya refrescado
+    contenido = json.dumps(cotizaciones, sort_keys=True, separators=(",", ":"))
+    return f'W/"{hashlib.sha1(contenido.encode()).hexdigest()[:16]}"'
+
+
+class Cotizaciones:
+    """
+    Snapshot en memoria de cotizaciones con TTL corto. Los símbolos vencidos se
+    refrescan con una sola llamada batch por proveedor (CoinGecko /simple/price
+    para cripto, descarga multi-ticker para acciones). Si la cuota no alcanza o
+    el proveedor falla se sirve el último valor conocido.
+    """
+
+    def __init__(self, planificador=None, ttl=TTL_COTIZACION, fuente_acciones="yfinance", max_entradas=1024):
+        self.planificador = planificador
+        self.ttl = ttl
+        self.fuente_acciones = fuente_acciones
+        self.cache = CacheLRU(max_entradas=max_entradas)
+        # Un refresco a la vez: los sondeos simultáneos esperan y leen el snapshot ya actualizado
+        self._lock = asyncio.Lock()
+        self.llamadas = 0
+        self.errores = 0
+
+    async def _refrescar(self, client, proveedor, tickers):
+        if self.planificador is not None:
+            # Sin cola: si no hay cuota ya, se sirve lo que haya en el snapshot
+            await self.planificador.turno(proveedor, PRIORIDAD_FONDO, espera_max=0)
+        self.llamadas += 1
+        if proveedor == "coingecko":
+            nuevas = await cotizaciones_coingecko(client, tickers)
+        else:
+            nuevas = await FUENTES_ACCIONES[proveedor](client, tickers)
+        for ticker in tickers:
+            # Los símbolos que el proveedor no conoce también se guardan (sin precio) para no
+            # volver a pedirlos en cada sondeo
+            cotizacion = nuevas.get(ticker, {"precio": None, "cambio_pct": None})
+            self.cache.guardar(ticker, {k: round(v, 6) if v is not None else None for k, v in cotizacion.items()},
+                               self.ttl)
+
+    async def obtener(self, client, tickers):
+        vencidos = [t for t in tickers if self.cache.obtener(t) is None]
+        if vencidos:
+            async with self._lock:
+                # Otro sondeo pudo haberlos refrescado mientras se esperaba el lock (ya contados arriba)
+                vencidos = [t for t in vencidos if self.cache.leer(t) is None]
+                grupos = {}
+                for ticker in vencidos:
+                    proveedor = "coingecko" if es_cripto(ticker) else self.fuente_acciones
+                    grupos.setdefault(proveedor, []).append(ticker)
+                resultados = await asyncio.gather(
+                    *[self._refrescar(client, proveedor, grupo) for proveedor, grupo in grupos.items()],
+                    return_exceptions=True,
+                )
+                for proveedor, resultado in zip(grupos, resultados):
+                    if isinstance(resultado, (CuotaAgotada, ValueError, KeyError, ImportError, httpx.HTTPError)):
+                        self.errores += 1
+                        registrar("cotizaciones_fallidas", logging.WARNING, proveedor=proveedor, error=str(resultado))
+                    elif isinstance(resultado, BaseException):
+                        raise resultado
+
+        cotizaciones = {}
+        for ticker in tickers:
+            cotizacion = self.cache.leer(ticker, permitir_vencido=True)
+            if cotizacion is not None and cotizacion["precio"] is not None:
+                cotizaciones[ticker] = cotizacion
+        return cotizaciones
+
+    def estadisticas(self):
+        return {**self.cache.estadisticas(), "llamadas_batch": self.llamadas, "errores": self.errores}
+
+
+def crear_cotizaciones(planificador):
+    return Cotizaciones(
+        planificador,
+        ttl=float(os.getenv("COTIZACIONES_TTL", str(TTL_COTIZACION))),
+        fuente_acciones=os.getenv("COTIZACIONES_ACCIONES", "yfinance"),
+    )
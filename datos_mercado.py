@@ -0,0 +1,318 @@
+import asyncio
+import os
+
+import httpx
+
+from indice_simbolos import obtener_indice
+from metricas import etapa, registrar
+
+# Endpoints REST de los proveedores (se consultan con clientes HTTP asíncronos).
+# Configurables para apuntar a los proveedores simulados de benchmarks/ (OpenAI usa OPENAI_BASE_URL)
+COINGECKO_URL = os.getenv("COINGECKO_URL", "https://api.coingecko.com/api/v3")
+ALPHA_VANTAGE_URL = os.getenv("ALPHA_VANTAGE_URL", "https://www.alphavantage.co/query")
+KRAKEN_URL = os.getenv("KRAKEN_URL", "https://api.kraken.com/0/public")
+TIMEOUT_PROVEEDOR = httpx.Timeout(20.0, connect=5.0)
+
+CRYPTO_SYMBOLS = {
+    "BTC", "BTC/USD",
+    "ETH", "ETH/USD",
+    "SOL", "SOL/USD",
+    "ADA", "ADA/USD",
+    "BNB", "BNB/USD"
+}
+
+# Map de símbolos -> ID reales de CoinGecko
+COINGECKO_IDS = {
+    "BTC": "bitcoin",
+    "ETH": "ethereum",
+    "SOL": "solana",
+    "ADA": "cardano",
+    "BNB": "binancecoin"
+}
+
+# Pares de Kraken para el respaldo de cripto (BNB no cotiza en Kraken)
+KRAKEN_PARES = {
+    "BTC": "XBTUSD",
+    "ETH": "ETHUSD",
+    "SOL": "SOLUSD",
+    "ADA": "ADAUSD"
+}
+
+DAYS_MAP = {"1D": 1, "1W": 7, "1M": 30}
+# CoinGecko decide la granularidad por "days": 1-2 días velas de 30 min, 3-30 días velas de 4 h
+BARRAS_COINGECKO = {1: 30 * 60, 2: 30 * 60, 7: 4 * 3600, 14: 4 * 3600, 30: 4 * 3600}
+
+# intervalo -> (function de Alpha Vantage, interval, clave de la serie en el JSON)
+AV_FUNCIONES = {
+    '15M': ('TIME_SERIES_INTRADAY', '15min', 'Time Series (15min)'),
+    '1H': ('TIME_SERIES_INTRADAY', '60min', 'Time Series (60min)'),
+    '1D': ('TIME_SERIES_DAILY', None, 'Time Series (Daily)'),
+    '1W': ('TIME_SERIES_WEEKLY', None, 'Weekly Time Series'),
+    '1M': ('TIME_SERIES_MONTHLY', None, 'Monthly Time Series'),
+}
+
+# intervalo -> (interval de yfinance, period de la primera descarga)
+YF_INTERVALOS = {
+    '15M': ('15m', '1mo'),
+    '1H': ('60m', '6mo'),
+    '1D': ('1d', '2y'),
+    '1W': ('1wk', '10y'),
+    '1M': ('1mo', 'max'),
+}
+
+# Fuentes de cada familia de proveedor en orden de preferencia: la primera es la principal
+# y las siguientes se usan como cobertura (si tarda) o respaldo (si falla)
+FUENTES = {
+    "coingecko": os.getenv("FUENTES_CRIPTO", "coingecko,kraken"),
+    "alpha_vantage": os.getenv("FUENTES_ACCIONES", "alpha_vantage,yfinance"),
+}
+
+COLUMNAS_AV = {
+    '1. open': 'Open',
+    '2. high': 'High',
+    '3. low': 'Low',
+    '4. close': 'Close',
+    '5. volume': 'Volume'
+}
+
+
+def es_cripto(ticker):
+    # Cualquier otra moneda va como "SIMBOLO/USD" (las acciones nunca llevan "/")
+    return ticker in CRYPTO_SYMBOLS or ticker.endswith("/USD")
+
+
+def proveedor_para(ticker):
+    return "coingecko" if es_cripto(ticker) else "alpha_vantage"
+
+
+def fuentes_para(ticker):
+    proveedor = proveedor_para(ticker)
+    base_symbol = ticker.split("/")[0]
+    fuentes = [
+        fuente.strip() for fuente in FUENTES[proveedor].split(",")
+        if fuente.strip() and (fuente.strip() != "kraken" or base_symbol in KRAKEN_PARES)
+    ]
+    return fuentes or [proveedor]
+
+
+async def obtener_coingecko(client, ticker, intervalo, days=None):
+    # pandas se importa en el primer fetch y no al cargar la API
+    import pandas as pd
+
+    base_symbol = ticker.split("/")[0]
+    # Ids fijos primero; el resto sale del índice local (sin consultar a CoinGecko)
+    crypto_symbol = COINGECKO_IDS.get(base_symbol) or obtener_indice().id_para(base_symbol)
+
+    if not crypto_symbol:
+        raise ValueError(f"Ticker {base_symbol} no tiene un ID válido en CoinGecko.")
+
+    days = days or DAYS_MAP.get(intervalo, 1)
+    with etapa("proveedor", "coingecko", intervalo):
+        response = await client.get(
+            f"{COINGECKO_URL}/coins/{crypto_symbol}/ohlc",
+            params={"vs_currency": "usd", "days": days},
+            timeout=TIMEOUT_PROVEEDOR,
+        )
+        response.raise_for_status()
+        velas = response.json()
+
+    with etapa("normalizacion", "coingecko", intervalo):
+        df = pd.DataFrame(velas, columns=['timestamp', 'Open', 'High', 'Low', 'Close'])
+        df['timestamp'] = pd.to_datetime(df['timestamp'], unit='ms')
+        df.set_index('timestamp', inplace=True)
+        df['Volume'] = None
+        return df.sort_index()
+
+
+async def obtener_alpha_vantage(client, ticker, intervalo, outputsize="compact"):
+    import pandas as pd
+
+    funcion, interval, clave_serie = AV_FUNCIONES.get(intervalo, AV_FUNCIONES['1D'])
+    params = {
+        "function": funcion,
+        "symbol": ticker,
+        "apikey": os.getenv("ALPHA_VANTAGE_API_KEY"),
+    }
+    if interval:
+        params["interval"] = interval
+    if funcion in ('TIME_SERIES_INTRADAY', 'TIME_SERIES_DAILY'):
+        params["outputsize"] = outputsize
+
+    with etapa("proveedor", "alpha_vantage", intervalo):
+        response = await client.get(ALPHA_VANTAGE_URL, params=params, timeout=TIMEOUT_PROVEEDOR)
+        response.raise_for_status()
+        payload = response.json()
+
+    if clave_serie not in payload:
+        # Alpha Vantage responde 200 con "Error Message"/"Note"/"Information" cuando falla
+        mensaje = payload.get("Error Message") or payload.get("Note") or payload.get("Information")
+        raise ValueError(f"Alpha Vantage: {mensaje or 'respuesta sin datos'}")
+
+    with etapa("normalizacion", "alpha_vantage", intervalo):
+        data = pd.DataFrame.from_dict(payload[clave_serie], orient='index', dtype=float)
+        data.index = pd.to_datetime(data.index)
+        data.index.name = 'date'
+        return data.rename(columns=COLUMNAS_AV).dropna().sort_index()
+
+
+async def obtener_kraken(client, ticker, intervalo, since=None):
+    import pandas as pd
+
+    base_symbol = ticker.split("/")[0]
+    par = KRAKEN_PARES.get(base_symbol)
+    if not par:
+        raise ValueError(f"Ticker {base_symbol} no cotiza en Kraken.")
+
+    # Mismo tamaño de vela que usa CoinGecko para el intervalo
+    params = {"pair": par, "interval": BARRAS_COINGECKO[DAYS_MAP.get(intervalo, 1)] // 60}
+    if since is not None:
+        params["since"] = since
+    with etapa("proveedor", "kraken", intervalo):
+        response = await client.get(f"{KRAKEN_URL}/OHLC", params=params, timeout=TIMEOUT_PROVEEDOR)
+        response.raise_for_status()
+        payload = response.json()
+
+    if payload.get("error"):
+        raise ValueError(f"Kraken: {', '.join(payload['error'])}")
+    # "result" trae la serie bajo el nombre interno del par (p. ej. XXBTZUSD) y el cursor "last"
+    velas = next(valor for clave, valor in payload["result"].items() if clave != "last")
+
+    with etapa("normalizacion", "kraken", intervalo):
+        df = pd.DataFrame(velas, columns=['timestamp', 'Open', 'High', 'Low', 'Close', 'vwap', 'Volume', 'count'])
+        df['timestamp'] = pd.to_datetime(df['timestamp'], unit='s')
+        df.set_index('timestamp', inplace=True)
+        return df[['Open', 'High', 'Low', 'Close', 'Volume']].astype(float).sort_index()
+
+
+async def obtener_yfinance(client, ticker, intervalo, period=None):
+    # yfinance usa su propia sesión HTTP y es bloqueante: corre en un hilo
+    import pandas as pd
+
+    interval, period_inicial = YF_INTERVALOS.get(intervalo, YF_INTERVALOS['1D'])
+
+    def descargar():
+        import yfinance as yf
+
+        return yf.download(ticker, period=period or period_inicial, interval=interval,
+                           progress=False, auto_adjust=False, threads=False)
+
+    with etapa("proveedor", "yfinance", intervalo):
+        df = await asyncio.to_thread(descargar)
+
+    if df is None or df.empty:
+        raise ValueError(f"yfinance: respuesta sin datos para {ticker}")
+
+    with etapa("normalizacion", "yfinance", intervalo):
+        if isinstance(df.columns, pd.MultiIndex):
+            df.columns = df.columns.get_level_values(0)
+        data = df[['Open', 'High', 'Low', 'Close', 'Volume']].astype(float)
+        if data.index.tz is not None:
+            # Misma convención que Alpha Vantage: hora de Nueva York sin zona
+            data.index = data.index.tz_convert("America/New_York").tz_localize(None)
+        data.index.name = 'date'
+        return data.dropna().sort_index()
+
+
+async def cotizaciones_coingecko(client, tickers):
+    # Un solo /simple/price para todas las monedas pedidas
+    ids = {}
+    for ticker in tickers:
+        base_symbol = ticker.split("/")[0]
+        coin_id = COINGECKO_IDS.get(base_symbol) or obtener_indice().id_para(base_symbol)
+        if coin_id:
+            ids.setdefault(coin_id, []).append(ticker)
+    if not ids:
+        return {}
+
+    with etapa("cotizacion", "coingecko", "-"):
+        response = await client.get(
+            f"{COINGECKO_URL}/simple/price",
+            params={"ids": ",".join(ids), "vs_currencies": "usd", "include_24hr_change": "true"},
+            timeout=TIMEOUT_PROVEEDOR,
+        )
+        response.raise_for_status()
+        precios = response.json()
+
+    cotizaciones = {}
+    for coin_id, precio in precios.items():
+        if precio.get("usd") is None:
+            continue
+        for ticker in ids.get(coin_id, []):
+            cotizaciones[ticker] = {"precio": precio["usd"], "cambio_pct": precio.get("usd_24h_change")}
+    return cotizaciones
+
+
+async def cotizaciones_alpha_vantage(client, tickers):
+    # REALTIME_BULK_QUOTES (plan premium): hasta 100 símbolos por llamada
+    with etapa("cotizacion", "alpha_vantage", "-"):
+        response = await client.get(
+            ALPHA_VANTAGE_URL,
+            params={"function": "REALTIME_BULK_QUOTES", "symbol": ",".join(tickers),
+                    "apikey": os.getenv("ALPHA_VANTAGE_API_KEY")},
+            timeout=TIMEOUT_PROVEEDOR,
+        )
+        response.raise_for_status()
+        payload = response.json()
+
+    if "data" not in payload:
+        mensaje = payload.get("Error Message") or payload.get("Note") or payload.get("Information")
+        raise ValueError(f"Alpha Vantage: {mensaje or 'respuesta sin datos'}")
+    cotizaciones = {}
+    for fila in payload["data"]:
+        precio, previo = float(fila["close"]), float(fila["previous_close"])
+        cotizaciones[fila["symbol"].upper()] = {
+            "precio": precio,
+            "cambio_pct": (precio / previo - 1) * 100 if previo else None,
+        }
+    return cotizaciones
+
+
+async def cotizaciones_yfinance(client, tickers):
+    # Una sola descarga multi-ticker de velas diarias: último cierre (o precio en vivo) vs el anterior
+    import pandas as pd
+
+    def descargar():
+        import yfinance as yf
+
+        return yf.download(list(tickers), period="5d", interval="1d", group_by="column",
+                           threads=True, progress=False, auto_adjust=False)
+
+    with etapa("cotizacion", "yfinance", "-"):
+        df = await asyncio.to_thread(descargar)
+    if df is None or df.empty:
+        raise ValueError("yfinance: respuesta sin datos")
+
+    close = df["Close"]
+    if isinstance(close, pd.Series):
+        close = close.to_frame(tickers[0])
+    cotizaciones = {}
+    for ticker in close.columns:
+        serie = close[ticker].dropna()
+        if serie.empty:
+            continue
+        precio = float(serie.iloc[-1])
+        previo = float(serie.iloc[-2]) if len(serie) > 1 else None
+        cotizaciones[str(ticker).upper()] = {
+            "precio": precio,
+            "cambio_pct": (precio / previo - 1) * 100 if previo else None,
+        }
+    return cotizaciones
+
+
+async def obtener_de_fuente(client, fuente, ticker, intervalo, **params):
+    registrar("fetch_mercado", proveedor=fuente, ticker=ticker, intervalo=intervalo)
+    if fuente == "coingecko":
+        return await obtener_coingecko(client, ticker, intervalo, params.get("days"))
+    if fuente == "kraken":
+        return await obtener_kraken(client, ticker, intervalo, params.get("since"))
+    if fuente == "yfinance":
+        return await obtener_yfinance(client, ticker, intervalo, params.get("period"))
+    if fuente == "alpha_vantage":
+        return await obtener_alpha_vantage(client, ticker, intervalo, params.get("outputsize", "compact"))
+    raise ValueError(f"Fuente de datos desconocida: {fuente}")
+
+
+async def obtener_datos_mercado(client, ticker, intervalo, days=None, outputsize="compact"):
+    # Devuelve todas las velas recibidas en orden cronológico; quien llama decide cuántas usar
+    return await obtener_de_fuente(client, proveedor_para(ticker), ticker, intervalo,
+                                   days=days, outputsize=outputsize)
@@ -0,0 +1,176 @@
+import gzip
+import json
+import math
+
+import numpy as np
+
+COLUMNAS = ["Open", "High", "Low", "Close", "Volume"]
+TIPOS_MSGPACK = ("application/msgpack", "application/x-msgpack")
+TIPO_ARROW = "application/vnd.apache.arrow.stream"
+# Por debajo de esto comprimir cuesta más de lo que ahorra
+MIN_COMPRIMIR = 1024
+# float32 conserva ~7 cifras significativas
+CIFRAS_FLOAT32 = 7
+
+
+def registros(data):
+    # Formato original: una fila con todos los nombres de columna por vela
+    return data.reset_index().to_dict(orient="records")
+
+
+def _decimales_float32(valores):
+    referencia = np.nanmax(np.abs(valores)) if np.isfinite(valores).any() else 0
+    if not referencia:
+        return CIFRAS_FLOAT32
+    return max(0, CIFRAS_FLOAT32 - 1 - math.floor(math.log10(referencia)))
+
+
+def _valores(data, col, dtype=float):
+    # None (Volume de CoinGecko) pasa a NaN sin usar pandas.to_numeric
+    return data[col].to_numpy(dtype=dtype, na_value=np.nan)
+
+
+def _columnas_presentes(data):
+    # Una columna toda vacía (Volume de CoinGecko) no viaja
+    return [col for col in COLUMNAS if col in data and not np.isnan(_valores(data, col)).all()]
+
+
+def columnas(data, float32=False):
+    """
+    Payload columnar para JSON: arrays paralelos con ts en milisegundos y un
+    array por columna. Con float32 los valores se redondean a la precisión
+    que tendrían en float32, lo que también acorta el texto.
+    """
+    payload = {"indice": data.index.name, "ts": (data.index.values.astype("datetime64[ms]").astype("i8")).tolist()}
+    for col in _columnas_presentes(data):
+        valores = _valores(data, col)
+        if float32:
+            valores = np.round(valores, _decimales_float32(valores))
+        # NaN no es JSON válido
+        payload[col] = [None if math.isnan(v) else v for v in valores.tolist()]
+    return payload
+
+
+def columnas_binarias(data, float32=False):
+    # Para msgpack: cada columna es el buffer crudo little-endian del array
+    tipo = "<f4" if float32 else "<f8"
+    payload = {
+        "indice": data.index.name,
+        "dtype": tipo,
+        "ts": data.index.values.astype("datetime64[ms]").astype("<i8").tobytes(),
+    }
+    for col in _columnas_presentes(data):
+        payload[col] = _valores(data, col, tipo).tobytes()
+    return payload
+
+
+def dataframe_desde_columnas(payload):
+    """Inverso de columnas()/columnas_binarias(): DataFrame con índice de fechas, sin dicts por fila."""
+    import pandas as pd
+
+    if isinstance(payload["ts"], (bytes, bytearray)):
+        ts = np.frombuffer(payload["ts"], dtype="<i8")
+        datos = {col: np.frombuffer(payload[col], dtype=payload["dtype"]).astype(float)
+                 for col in COLUMNAS if col in payload}
+    else:
+        ts = np.asarray(payload["ts"], dtype="i8")
+        datos = {col: np.asarray(payload[col], dtype=float) for col in COLUMNAS if col in payload}
+    indice = pd.DatetimeIndex(pd.to_datetime(ts, unit="ms"), name=payload.get("indice"))
+    return pd.DataFrame(datos, index=indice)
+
+
+def serializar_datos(data, columnar=False, float32=False):
+    return columnas(data, float32) if columnar else registros(data)
+
+
+def tabla_arrow(data, float32=False):
+    import pyarrow as pa
+
+    tipo = pa.float32() if float32 else pa.float64()
+    campos = {"ts": pa.array(data.index.values.astype("datetime64[ms]"))}
+    for col in _columnas_presentes(data):
+        campos[col] = pa.array(_valores(data, col), type=tipo)
+    return pa.table(campos)
+
+
+def _arrow_ipc(data, float32, resto):
+    import pyarrow as pa
+    from fastapi.encoders import jsonable_encoder
+
+    # El resto de la respuesta (análisis, errores) viaja como JSON en los metadatos del esquema
+    tabla = tabla_arrow(data, float32)
+    tabla = tabla.replace_schema_metadata({
+        "respuesta": json.dumps(jsonable_encoder(resto), ensure_ascii=False),
+        "indice": data.index.name or "",
+    })
+    sink = pa.BufferOutputStream()
+    with pa.ipc.new_stream(sink, tabla.schema) as writer:
+        writer.write_table(tabla)
+    return sink.getvalue().to_pybytes()
+
+
+def leer_arrow(cuerpo):
+    """Decodifica una respuesta Arrow IPC: (resto de la respuesta, DataFrame OHLC)."""
+    import pyarrow as pa
+
+    tabla = pa.ipc.open_stream(cuerpo).read_all()
+    resto = json.loads(tabla.schema.metadata[b"respuesta"])
+    data = tabla.to_pandas().set_index("ts")
+    data.index.name = tabla.schema.metadata[b"indice"].decode() or None
+    return resto, data
+
+
+def _comprimir(cuerpo, accept_encoding):
+    aceptadas = {parte.split(";")[0].strip() for parte in (accept_encoding or "").lower().split(",")}
+    if len(cuerpo) < MIN_COMPRIMIR:
+        return cuerpo, None
+    if "br" in aceptadas:
+        try:
+            import brotli
+            return brotli.compress(cuerpo, quality=5), "br"
+        except ImportError:
+            pass
+    if "gzip" in aceptadas:
+        return gzip.compress(cuerpo, compresslevel=5), "gzip"
+    return cuerpo, None
+
+
+def respuesta_negociada(respuesta, accept="", accept_encoding="", columnar=False, float32=False):
+    """
+    Arma la respuesta de /analizar según Accept: Arrow IPC, msgpack o JSON
+    (registros o columnar). Los formatos binarios son siempre columnares.
+    El cuerpo se comprime con Brotli o gzip según Accept-Encoding.
+    """
+    # Import local: app.py usa este módulo para decodificar sin depender de FastAPI
+    from fastapi.encoders import jsonable_encoder
+    from fastapi.responses import Response
+
+    accept = (accept or "").lower()
+    data = respuesta.get("data")
+    resto = {k: v for k, v in respuesta.items() if k != "data"}
+
+    cuerpo = tipo = None
+    # msgpack y pyarrow son opcionales: sin ellos se responde JSON
+    try:
+        if data is not None and TIPO_ARROW in accept:
+            cuerpo, tipo = _arrow_ipc(data, float32, resto), TIPO_ARROW
+        elif any(t in accept for t in TIPOS_MSGPACK):
+            import msgpack
+
+            binario = {**resto, "data": columnas_binarias(data, float32)} if data is not None else resto
+            cuerpo = msgpack.packb(jsonable_encoder(binario, custom_encoder={bytes: lambda b: b}),
+                                   use_bin_type=True)
+            tipo = TIPOS_MSGPACK[0]
+    except ImportError:
+        pass
+    if cuerpo is None:
+        if data is not None:
+            resto["data"] = serializar_datos(data, columnar, float32)
+        cuerpo = json.dumps(jsonable_encoder(resto), ensure_ascii=False).encode("utf-8")
+        tipo = "application/json"
+
+    cuerpo, encoding = _comprimir(cuerpo, accept_encoding)
+    headers = {"Vary": "Accept, Accept-Encoding"}
+    if encoding:
+        headers["Content-Encoding"] = encoding
+    return Response(content=cuerpo, media_type=tipo, headers=headers)
@@ -0,0 +1,116 @@
+import io
+
+import numpy as np
+
+FONDO = '#1e2533'
+COLORES_NIVELES = ['#22d3ee', '#f87171', '#60a5fa']
+DPI_PNG = 110
+
+
+def _pyplot():
+    # matplotlib se carga al dibujar el primer PNG; la opción Vega-Lite no lo necesita
+    import matplotlib
+
+    matplotlib.use("Agg")
+    import matplotlib.pyplot as plt
+    return plt
+
+
+def grafico_ohlc(data, niveles=None, figsize=(8.5, 4), titulo=None):
+    """Velas OHLC reales del último análisis; niveles = {"Target": precio, ...} en líneas horizontales."""
+    fig, ax = _pyplot().subplots(figsize=figsize)
+    x = np.arange(len(data))
+    sube = (data["Close"] >= data["Open"]).to_numpy()
+    colores = np.where(sube, '#4ade80', '#f87171')
+    # Mecha high-low y cuerpo open-close, todo vectorizado (una llamada por capa)
+    ax.vlines(x, data["Low"], data["High"], color=colores, linewidth=0.8)
+    cuerpo = (data["Close"] - data["Open"]).abs().to_numpy()
+    ax.bar(x, np.maximum(cuerpo, 1e-9), bottom=np.minimum(data["Open"], data["Close"]),
+           color=colores, width=0.6)
+    for (nombre, precio), color in zip((niveles or {}).items(), COLORES_NIVELES):
+        ax.axhline(precio, color=color, linestyle='--', linewidth=1, label=f'{nombre}: ${precio:.2f}')
+    if niveles:
+        ax.legend(facecolor='#1e293b', edgecolor='white', labelcolor='white', fontsize=7)
+    if titulo:
+        ax.set_title(titulo, color='white')
+    ax.set_facecolor(FONDO)
+    fig.patch.set_facecolor(FONDO)
+    for lado in ['bottom', 'top', 'left', 'right']:
+        ax.spines[lado].set_color('#1e293b')
+    ax.tick_params(colors='#94a3b8', labelsize=7)
+    marcas = x[::max(1, len(x) // 4)]
+    ax.set_xticks(marcas, [data.index[i].strftime("%e %b %H:%M") for i in marcas])
+    return fig
+
+
+def grafico_proyeccion(last, target, stop):
+    # Stop/Last/Target normalizados en una escala 0-1 (visualización rápida)
+    last_y = 0.5    # Last siempre al 50%
+    target_y = 0.9  # Target siempre al 90% (arriba)
+    dist_target = target - last
+    dist_stop = last - stop
+
+    if dist_target == 0:
+        pos_stop = 0.1  # Si target == last, lo mandamos abajo
+    else:
+        # Stop relativo, cuanto más lejos esté del last, más abajo lo ubicamos
+        pos_stop = last_y - (dist_stop / dist_target) * (target_y - last_y)
+        # Limita a un rango lógico
+        pos_stop = max(0.1, min(pos_stop, 0.49))
+
+    y_vals = [pos_stop, last_y, target_y]
+    labels = [
+        f"Stop\n${stop:.2f}",
+        f"Last\n${last:.2f}",
+        f"Target\n${target:.2f}"
+    ]
+    colors = ['#f87171', '#60a5fa', '#22d3ee']
+
+    fig, ax = _pyplot().subplots(figsize=(4, 2))
+    for y, color, label in zip(y_vals, colors, labels):
+        ax.axhline(y, color=color, linewidth=1, linestyle='--')
+        ax.text(0.07, y, label, va='center', ha='left', fontsize=11, color=color, weight='bold')
+
+    ax.set_ylim(0, 1)
+    ax.set_yticks([])
+    ax.set_xticks([])
+    ax.set_facecolor(FONDO)
+    fig.patch.set_facecolor(FONDO)
+    for lado in ['top', 'right', 'bottom', 'left']:
+        ax.spines[lado].set_visible(False)
+    return fig
+
+
+def a_png(fig):
+    # Rasteriza una sola vez y libera la figura (pyplot las retiene si no se cierran)
+    buffer = io.BytesIO()
+    fig.savefig(buffer, format="png", dpi=DPI_PNG, facecolor=fig.get_facecolor(), bbox_inches="tight")
+    _pyplot().close(fig)
+    return buffer.getvalue()
+
+
+def spec_velas(niveles=None, titulo=None):
+    """
+    Especificación Vega-Lite de velas OHLC: el servidor manda las series crudas
+    y el navegador dibuja el gráfico (sin rasterizar nada en Python).
+    """
+    escala_x = {"field": "ts", "type": "temporal", "title": None}
+    escala_y = {"type": "quantitative", "scale": {"zero": False}, "title": None}
+    color = {"condition": {"test": "datum.Open <= datum.Close", "value": "#4ade80"}, "value": "#f87171"}
+    capas = [
+        {"mark": "rule", "encoding": {"x": escala_x, "y": {"field": "Low", **escala_y},
+                                      "y2": {"field": "High"}, "color": color}},
+        {"mark": "bar", "encoding": {"x": escala_x, "y": {"field": "Open", **escala_y},
+                                     "y2": {"field": "Close"}, "color": color}},
+    ]
+    for (nombre, precio), color_nivel in zip((niveles or {}).items(), COLORES_NIVELES):
+        capas.append({
+            "mark": {"type": "rule", "strokeDash": [4, 4], "color": color_nivel},
+            "encoding": {"y": {"datum": precio, "type": "quantitative"},
+                         "tooltip": {"value": f"{nombre}: ${precio:.2f}"}},
+        })
+    spec = {"layer": capas, "background": FONDO, "height": 320,
+            "config": {"axis": {"labelColor": "#94a3b8", "gridColor": "#334155"}, "view": {"stroke": None}}}
+    if titulo:
+        spec["title"] = {"text": titulo, "color": "white"}
+    return spec
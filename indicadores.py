@@ -0,0 +1,177 @@
+import math
+
+import numpy as np
+import pandas as pd
+
+# Cifras significativas para precios en el prompt (182.63, 65432, 0.45123)
+CIFRAS_PRECIO = 5
+# Regla de agrupación del período anterior para los pivots, según la temporalidad
+PERIODO_PIVOTS = {"15M": "D", "1H": "D", "1D": "M", "1W": "M", "1M": "Y"}
+SEGUNDOS_DIA = 86400
+
+
+def decimales_precio(referencia):
+    if not referencia or not math.isfinite(referencia):
+        return 2
+    magnitud = math.floor(math.log10(abs(referencia)))
+    return max(0, CIFRAS_PRECIO - 1 - magnitud)
+
+
+def ordenar_ascendente(data):
+    # Alpha Vantage llega de lo más reciente a lo más antiguo, CoinGecko al revés
+    data = data.sort_index()
+    precios = data[["Open", "High", "Low", "Close"]].astype(float)
+    return precios
+
+
+def ema(close, span):
+    return close.ewm(span=span, adjust=False).mean()
+
+
+def atr(high, low, close, periodo=14):
+    # True range vectorizado y media de Wilder (alpha = 1/periodo)
+    close_prev = np.roll(close, 1)
+    close_prev[0] = close[0]
+    rango = np.maximum(high - low, np.maximum(np.abs(high - close_prev), np.abs(low - close_prev)))
+    return pd.Series(rango).ewm(alpha=1 / periodo, adjust=False).mean().to_numpy()
+
+
+def regresion_lineal(close):
+    # Pendiente por vela y R² de una recta ajustada por mínimos cuadrados
+    n = len(close)
+    if n < 3:
+        return 0.0, 0.0
+    x = np.arange(n, dtype=float)
+    pendiente, intercepto = np.polyfit(x, close, 1)
+    ajuste = pendiente * x + intercepto
+    ss_res = np.sum((close - ajuste) ** 2)
+    ss_tot = np.sum((close - close.mean()) ** 2)
+    r2 = 1 - ss_res / ss_tot if ss_tot else 0.0
+    return float(pendiente), float(r2)
+
+
+def periodos_por_anio(indice):
+    if len(indice) < 2:
+        return 252
+    segundos = indice.to_series().diff().dt.total_seconds().median()
+    if (indice.dayofweek >= 5).any():
+        # Mercado 24/7 (cripto)
+        return 365.25 * SEGUNDOS_DIA / segundos
+    if segundos < SEGUNDOS_DIA:
+        return 252 * 6.5 * 3600 / segundos
+    if segundos < 5 * SEGUNDOS_DIA:
+        return 252
+    if segundos < 20 * SEGUNDOS_DIA:
+        return 52
+    return 12
+
+
+def volatilidad_realizada(close, anual):
+    if len(close) < 3:
+        return 0.0
+    retornos = np.diff(np.log(close))
+    return float(np.std(retornos, ddof=1) * np.sqrt(anual))
+
+
+def swings(high, low, ventana=2):
+    # Fractales: máximo (mínimo) estricto de una ventana centrada de 2*ventana+1 velas
+    largo = 2 * ventana + 1
+    maximos = high.rolling(largo, center=True).max()
+    minimos = low.rolling(largo, center=True).min()
+    return high[high == maximos], low[low == minimos]
+
+
+def pivots_clasicos(high, low, close):
+    # Mismas fórmulas que scanner.py
+    pp = (high + low + close) / 3
+    return {
+        "PP": pp,
+        "R1": 2 * pp - low,
+        "R2": pp + (high - low),
+        "S1": 2 * pp - high,
+        "S2": pp - (high - low),
+    }
+
+
+def pivots_periodo_anterior(precios, intervalo):
+    regla = PERIODO_PIVOTS.get(intervalo, "D")
+    grupos = precios.groupby(precios.index.to_period(regla))
+    periodos = grupos.agg({"High": "max", "Low": "min", "Close": "last"})
+    # Último período completo: el penúltimo si hay más de uno
+    fila = periodos.iloc[-2] if len(periodos) > 1 else periodos.iloc[-1]
+    return str(fila.name), pivots_clasicos(fila["High"], fila["Low"], fila["Close"])
+
+
+def calcular_indicadores(data, intervalo):
+    precios = ordenar_ascendente(data)
+    high = precios["High"].to_numpy()
+    low = precios["Low"].to_numpy()
+    close = precios["Close"].to_numpy()
+    ultimo = float(close[-1])
+
+    pendiente, r2 = regresion_lineal(close)
+    periodo_pivots, pivots = pivots_periodo_anterior(precios, intervalo)
+    swing_altos, swing_bajos = swings(precios["High"], precios["Low"])
+
+    return {
+        "velas": len(precios),
+        "ultima_fecha": precios.index[-1],
+        "ultimo": ultimo,
+        "ema20": float(ema(precios["Close"], 20).iloc[-1]),
+        "ema50": float(ema(precios["Close"], 50).iloc[-1]),
+        "atr14": float(atr(high, low, close)[-1]),
+        "pendiente": pendiente,
+        "r2": r2,
+        "volatilidad": volatilidad_realizada(close, periodos_por_anio(precios.index)),
+        "maximo": float(high.max()),
+        "minimo": float(low.min()),
+        "periodo_pivots": periodo_pivots,
+        "pivots": {nombre: float(valor) for nombre, valor in pivots.items()},
+        "swing_altos": [(f, float(v)) for f, v in swing_altos.tail(3).items()],
+        "swing_bajos": [(f, float(v)) for f, v in swing_bajos.tail(3).items()],
+    }
+
+
+def formatear_resumen(ind):
+    dec = decimales_precio(ind["ultimo"])
+
+    def p(valor):
+        return f"{valor:.{dec}f}"
+
+    def distancia(media):
+        return f"{(ind['ultimo'] / media - 1) * 100:+.1f}%"
+
+    def fecha(f):
+        return f.strftime("%Y-%m-%d %H:%M") if (f.hour or f.minute) else f.strftime("%Y-%m-%d")
+
+    rango = ind["maximo"] - ind["minimo"]
+    posicion = (ind["ultimo"] - ind["minimo"]) / rango * 100 if rango else 50
+    pivots = " ".join(f"{k} {p(v)}" for k, v in ind["pivots"].items())
+    altos = ", ".join(f"{p(v)} ({fecha(f)})" for f, v in ind["swing_altos"]) or "-"
+    bajos = ", ".join(f"{p(v)} ({fecha(f)})" for f, v in ind["swing_bajos"]) or "-"
+
+    return "\n".join([
+        f"Velas: {ind['velas']} (última {fecha(ind['ultima_fecha'])}), precio {p(ind['ultimo'])}",
+        f"Rango: {p(ind['minimo'])}-{p(ind['maximo'])} (posición {posicion:.0f}%)",
+        f"EMA20 {p(ind['ema20'])} (precio {distancia(ind['ema20'])}) | "
+        f"EMA50 {p(ind['ema50'])} (precio {distancia(ind['ema50'])})",
+        f"ATR14 {p(ind['atr14'])} ({ind['atr14'] / ind['ultimo'] * 100:.2f}%)",
+        f"Regresión: pendiente {ind['pendiente']:+.{dec}f}/vela "
+        f"({ind['pendiente'] / ind['ultimo'] * 100:+.3f}%/vela), R² {ind['r2']:.2f}",
+        f"Volatilidad realizada anualizada: {ind['volatilidad'] * 100:.1f}%",
+        f"Pivots clásicos (período {ind['periodo_pivots']}): {pivots}",
+        f"Swing highs: {altos}",
+        f"Swing lows: {bajos}",
+    ])
+
+
+def tabla_compacta(data, filas):
+    # Últimas `filas` velas con precios redondeados y volumen entero
+    precios = data.sort_index().tail(filas)
+    dec = decimales_precio(float(precios["Close"].iloc[-1]))
+    tabla = precios[["Open", "High", "Low", "Close"]].astype(float).round(dec)
+    volumen = pd.to_numeric(precios["Volume"], errors="coerce")
+    if volumen.notna().any():
+        tabla["Volume"] = volumen.round().astype("Int64")
+    formato_fecha = "%Y-%m-%d %H:%M" if (tabla.index.hour != 0).any() else "%Y-%m-%d"
+    return tabla.to_csv(index=True, date_format=formato_fecha, float_format=f"%.{dec}f")
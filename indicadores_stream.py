@@ -0,0 +1,182 @@
+import json
+import os
+import tempfile
+
+import pandas as pd
+
+# Periodos de descarga de yfinance y los días corridos que cubren como mínimo
+PERIODOS_YF = [("1d", 1), ("5d", 5), ("1mo", 30)]
+# Historia con la que arranca un símbolo nuevo (o uno cuyo hueco no cubre ningún periodo)
+PERIODO_SEMILLA = "5d"
+
+
+class EstadoEMA:
+    """
+    EMA incremental (misma fórmula que ewm(span, adjust=False)). Guarda el valor
+    previo a la vela en curso para poder corregirla si llega actualizada.
+    """
+
+    def __init__(self, span, valor=None, previo=None):
+        self.span = span
+        self.alpha = 2 / (span + 1)
+        self.valor = valor
+        self.previo = previo
+
+    def nueva_vela(self, precio):
+        self.previo = self.valor
+        self.actualizar_vela(precio)
+
+    def actualizar_vela(self, precio):
+        base = self.previo
+        self.valor = precio if base is None else base + self.alpha * (precio - base)
+
+
+class EstadoPivots:
+    """Máximo/mínimo/cierre del día en curso y pivots clásicos del último día completo."""
+
+    def __init__(self, dia=None, high=None, low=None, close=None, pivots=None):
+        self.dia = dia
+        self.high = high
+        self.low = low
+        self.close = close
+        self.pivots = pivots
+
+    def procesar(self, dia, high, low, close):
+        if self.dia is not None and dia != self.dia:
+            # Cambio de día: el día anterior quedó completo
+            pp = (self.high + self.low + self.close) / 3
+            self.pivots = {
+                "PP": pp,
+                "R1": 2 * pp - self.low,
+                "R2": pp + (self.high - self.low),
+                "S1": 2 * pp - self.high,
+                "S2": pp - (self.high - self.low),
+            }
+            self.high = self.low = None
+        if self.dia != dia:
+            self.dia = dia
+        self.high = high if self.high is None else max(self.high, high)
+        self.low = low if self.low is None else min(self.low, low)
+        self.close = close
+
+
+class EstadoSimbolo:
+    def __init__(self):
+        self.ema20 = EstadoEMA(20)
+        self.ema50 = EstadoEMA(50)
+        self.pivots = EstadoPivots()
+        self.ultimo_ts = None
+        self.precio = None
+
+    def procesar_vela(self, ts, high, low, close):
+        """Actualiza el estado en O(1). Velas viejas se ignoran y la vela en curso se corrige."""
+        ts = pd.Timestamp(ts)
+        if self.ultimo_ts is not None and ts < self.ultimo_ts:
+            return False
+        if self.ultimo_ts is not None and ts == self.ultimo_ts:
+            self.ema20.actualizar_vela(close)
+            self.ema50.actualizar_vela(close)
+        else:
+            self.ema20.nueva_vela(close)
+            self.ema50.nueva_vela(close)
+        # El máximo/mínimo del día solo crece, así que repetir la vela en curso es seguro
+        self.pivots.procesar(ts.date().isoformat(), high, low, close)
+        self.ultimo_ts = ts
+        self.precio = close
+        return True
+
+    def a_dict(self):
+        return {
+            "ultimo_ts": self.ultimo_ts.isoformat() if self.ultimo_ts is not None else None,
+            "precio": self.precio,
+            "ema20": [self.ema20.valor, self.ema20.previo],
+            "ema50": [self.ema50.valor, self.ema50.previo],
+            "pivots": vars(self.pivots),
+        }
+
+    @classmethod
+    def desde_dict(cls, datos):
+        estado = cls()
+        estado.ultimo_ts = pd.Timestamp(datos["ultimo_ts"]) if datos["ultimo_ts"] else None
+        estado.precio = datos["precio"]
+        estado.ema20 = EstadoEMA(20, *datos["ema20"])
+        estado.ema50 = EstadoEMA(50, *datos["ema50"])
+        estado.pivots = EstadoPivots(**datos["pivots"])
+        return estado
+
+
+class MotorIndicadores:
+    """Estados por símbolo, persistidos en un JSON entre ejecuciones del scanner."""
+
+    def __init__(self, ruta):
+        self.ruta = ruta
+        self.estados = {}
+        if os.path.exists(ruta):
+            with open(ruta, encoding="utf-8") as f:
+                self.estados = {s: EstadoSimbolo.desde_dict(d) for s, d in json.load(f).items()}
+
+    def periodo_pendiente(self, simbolo, ahora=None):
+        """
+        Periodo de yfinance que cubre desde la última vela guardada del símbolo
+        hasta hoy, o None si es nuevo o el hueco es más largo que cualquier periodo.
+        """
+        estado = self.estados.get(simbolo)
+        if estado is None or estado.ultimo_ts is None:
+            return None
+        ultimo = estado.ultimo_ts
+        ahora = pd.Timestamp.now(tz=ultimo.tz) if ahora is None else ahora
+        dias = (ahora.normalize() - ultimo.normalize()).days
+        for periodo, cubre in PERIODOS_YF:
+            if dias < cubre:
+                return periodo
+        return None
+
+    def planificar_descargas(self, simbolos):
+        """
+        Agrupa los símbolos por periodo a descargar: {periodo: [símbolos]}.
+        Los que no tienen un periodo que cubra su hueco pierden el estado y se
+        vuelven a sembrar con PERIODO_SEMILLA (saltear velas dejaría las EMAs mal).
+        """
+        grupos = {}
+        for simbolo in simbolos:
+            periodo = self.periodo_pendiente(simbolo)
+            if periodo is None:
+                self.estados.pop(simbolo, None)
+                periodo = PERIODO_SEMILLA
+            grupos.setdefault(periodo, []).append(simbolo)
+        return grupos
+
+    def procesar_panel(self, panel):
+        """
+        Alimenta las velas de un panel {"High"/"Low"/"Close": tiempo x ticker}.
+        Solo recorre las velas posteriores (o igual) a la última vista de cada símbolo.
+        """
+        procesadas = 0
+        for simbolo in panel["Close"].columns:
+            estado = self.estados.setdefault(simbolo, EstadoSimbolo())
+            close = panel["Close"][simbolo].dropna()
+            if estado.ultimo_ts is not None:
+                close = close[close.index >= estado.ultimo_ts]
+            high = panel["High"][simbolo].reindex(close.index)
+            low = panel["Low"][simbolo].reindex(close.index)
+            for ts, h, l, c in zip(close.index, high.to_numpy(), low.to_numpy(), close.to_numpy()):
+                procesadas += estado.procesar_vela(ts, float(h), float(l), float(c))
+        return procesadas
+
+    def tabla(self):
+        filas = {}
+        for simbolo, estado in self.estados.items():
+            fila = {"Precio": estado.precio, "EMA20": estado.ema20.valor, "EMA50": estado.ema50.valor}
+            fila.update(estado.pivots.pivots or {})
+            filas[simbolo] = fila
+        tabla = pd.DataFrame.from_dict(filas, orient="index").round(2)
+        tabla["Última vela"] = pd.Series({s: e.ultimo_ts for s, e in self.estados.items()})
+        return tabla
+
+    def guardar(self):
+        # Escritura atómica: un rerun interrumpido no deja el JSON a medias
+        directorio = os.path.dirname(os.path.abspath(self.ruta))
+        os.makedirs(directorio, exist_ok=True)
+        with tempfile.NamedTemporaryFile("w", dir=directorio, delete=False, encoding="utf-8") as f:
+            json.dump({s: e.a_dict() for s, e in self.estados.items()}, f)
+        os.replace(f.name, self.ruta)
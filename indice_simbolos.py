@@ -0,0 +1,257 @@
+import asyncio
+import bisect
+import gzip
+import json
+import logging
+import os
+import time
+
+import numpy as np
+
+from cache import ruta_datos
+from metricas import registrar
+from planificador import PRIORIDAD_FONDO
+
+RUTA_SNAPSHOT = ruta_datos("simbolos_cripto.json.gz")
+# La lista completa de CoinGecko cambia poco: un refresco diario alcanza
+REFRESCO = 24 * 3600
+# Páginas de 250 de /coins/markets para el ranking por market cap (las demás monedas quedan sin rank)
+PAGINAS_RANKING = 4
+SIN_RANK = 1_000_000
+LIMITE_BUSQUEDA = 10
+REINTENTO_ERROR = 600
+
+
+class IndiceSimbolos:
+    """
+    Índice local de las monedas de CoinGecko (símbolo, id, nombre, rank por
+    market cap) para autocompletar y resolver símbolos sin ir al proveedor.
+    Guarda los símbolos y los nombres en arrays ordenados: un prefijo se busca
+    con bisect y los candidatos se ordenan por rank con numpy. Se carga de un
+    snapshot en disco y se refresca en segundo plano con PRIORIDAD_FONDO.
+    """
+
+    def __init__(self, monedas=(), ruta=None, refresco=REFRESCO, paginas_ranking=PAGINAS_RANKING):
+        self.ruta = ruta
+        self.refresco = refresco
+        self.paginas_ranking = paginas_ranking
+        self.generado = 0.0
+        self.refrescos = 0
+        self.errores = 0
+        self._tarea = None
+        self._construir(list(monedas))
+
+    def _construir(self, monedas):
+        # monedas: [(simbolo, id, nombre, rank o None)]
+        simbolos = np.array([m[0].upper() for m in monedas], dtype=object)
+        ids = np.array([m[1] for m in monedas], dtype=object)
+        nombres = np.array([m[2] for m in monedas], dtype=object)
+        ranks = np.array([m[3] or SIN_RANK for m in monedas], dtype=np.int64)
+
+        # Claves en minúsculas ordenadas + posición de cada una en los arrays de monedas
+        orden_simbolo = sorted(range(len(monedas)), key=lambda i: (simbolos[i].lower(), ranks[i]))
+        orden_nombre = sorted(range(len(monedas)), key=lambda i: nombres[i].lower())
+        pos_simbolo = np.array(orden_simbolo, dtype=np.int64)
+        pos_nombre = np.array(orden_nombre, dtype=np.int64)
+        # Se reemplaza todo de una vez: las búsquedas en curso ven el índice viejo o el nuevo completos
+        self._datos = {
+            "simbolos": simbolos,
+            "ids": ids,
+            "nombres": nombres,
+            "ranks": ranks,
+            "claves_simbolo": [simbolos[i].lower() for i in orden_simbolo],
+            "pos_simbolo": pos_simbolo,
+            # Ranks en el mismo orden que las claves: el rango de un prefijo es un slice sin copias
+            "rank_simbolo": ranks[pos_simbolo],
+            "claves_nombre": [nombres[i].lower() for i in orden_nombre],
+            "pos_nombre": pos_nombre,
+            "rank_nombre": ranks[pos_nombre],
+            # Prefijos de 1-2 letras abarcan miles de monedas y son los más repetidos al tipear
+            "memo": {},
+        }
+
+    def __len__(self):
+        return len(self._datos["ids"])
+
+    @staticmethod
+    def _rango(claves, prefijo):
+        return bisect.bisect_left(claves, prefijo), bisect.bisect_left(claves, prefijo + "\uffff")
+
+    def id_para(self, simbolo):
+        """Id de CoinGecko del símbolo; si varias monedas lo comparten, la de mejor rank."""
+        datos = self._datos
+        clave = simbolo.lower()
+        i = bisect.bisect_left(datos["claves_simbolo"], clave)
+        if i < len(datos["claves_simbolo"]) and datos["claves_simbolo"][i] == clave:
+            # A igual símbolo, el orden es por rank
+            return datos["ids"][datos["pos_simbolo"][i]]
+        return None
+
+    @staticmethod
+    def _mejores(posiciones, ranks, lo, hi, limite):
+        # Los `limite` de mejor rank del rango: argpartition evita ordenar todo el rango
+        if hi - lo > limite:
+            indices = lo + np.argpartition(ranks[lo:hi], limite)[:limite]
+        else:
+            indices = np.arange(lo, hi)
+        return list(zip(ranks[indices].tolist(), posiciones[indices].tolist()))
+
+    def buscar(self, consulta, limite=LIMITE_BUSQUEDA):
+        datos = self._datos
+        prefijo = consulta.strip().lower()
+        memo = datos["memo"] if len(prefijo) <= 2 else None
+        if memo is not None and (prefijo, limite) in memo:
+            return memo[prefijo, limite]
+
+        lo_s, hi_s = self._rango(datos["claves_simbolo"], prefijo)
+        lo_n, hi_n = self._rango(datos["claves_nombre"], prefijo)
+        candidatos = (self._mejores(datos["pos_simbolo"], datos["rank_simbolo"], lo_s, hi_s, limite)
+                      + self._mejores(datos["pos_nombre"], datos["rank_nombre"], lo_n, hi_n, limite))
+        # El símbolo exacto va primero aunque tenga peor rank ("eth" -> Ethereum antes que "ethfi")
+        fin_exactos = bisect.bisect_right(datos["claves_simbolo"], prefijo, lo_s, hi_s) if prefijo else lo_s
+        exactos = datos["pos_simbolo"][lo_s:fin_exactos][:limite].tolist()
+        vistos = set(exactos)
+        elegidos = list(exactos)
+        for _, i in sorted(candidatos):
+            if len(elegidos) >= limite:
+                break
+            if i not in vistos:
+                vistos.add(i)
+                elegidos.append(i)
+
+        resultados = [
+            {
+                "ticker": f"{datos['simbolos'][i]}/USD",
+                "simbolo": datos["simbolos"][i],
+                "id": datos["ids"][i],
+                "nombre": datos["nombres"][i],
+                "rank": None if datos["ranks"][i] == SIN_RANK else int(datos["ranks"][i]),
+            }
+            for i in elegidos
+        ]
+        if memo is not None:
+            memo[prefijo, limite] = resultados
+        return resultados
+
+    def cargar_snapshot(self):
+        if not self.ruta or not os.path.exists(self.ruta):
+            return False
+        with gzip.open(self.ruta, "rt", encoding="utf-8") as f:
+            snapshot = json.load(f)
+        self._construir(list(zip(snapshot["simbolo"], snapshot["id"], snapshot["nombre"], snapshot["rank"])))
+        self.generado = snapshot["generado"]
+        return True
+
+    def guardar_snapshot(self, monedas, generado):
+        if not self.ruta:
+            return
+        # Columnar: cada campo una sola vez como lista (más chico que un objeto por moneda)
+        snapshot = {
+            "generado": generado,
+            "simbolo": [m[0] for m in monedas],
+            "id": [m[1] for m in monedas],
+            "nombre": [m[2] for m in monedas],
+            "rank": [m[3] for m in monedas],
+        }
+        os.makedirs(os.path.dirname(self.ruta) or ".", exist_ok=True)
+        temporal = self.ruta + ".tmp"
+        with gzip.open(temporal, "wt", encoding="utf-8") as f:
+            json.dump(snapshot, f, separators=(",", ":"), ensure_ascii=False)
+        os.replace(temporal, self.ruta)
+
+    async def _descargar(self, planificador):
+        import clientes
+        from datos_mercado import COINGECKO_URL, TIMEOUT_PROVEEDOR
+
+        client = clientes.obtener_cliente_http()
+
+        async def pedir(ruta, params):
+            if planificador is not None:
+                await planificador.turno("coingecko", PRIORIDAD_FONDO)
+            response = await client.get(f"{COINGECKO_URL}{ruta}", params=params, timeout=TIMEOUT_PROVEEDOR)
+            response.raise_for_status()
+            return response.json()
+
+        lista = await pedir("/coins/list", {})
+        ranks = {}
+        for pagina in range(1, self.paginas_ranking + 1):
+            mercado = await pedir("/coins/markets", {"vs_currency": "usd", "order": "market_cap_desc",
+                                                     "per_page": 250, "page": pagina})
+            ranks.update((m["id"], m.get("market_cap_rank")) for m in mercado)
+            if len(mercado) < 250:
+                break
+        return [(m["symbol"], m["id"], m["name"], ranks.get(m["id"])) for m in lista if m.get("symbol")]
+
+    async def refrescar(self, planificador=None):
+        monedas = await self._descargar(planificador)
+        generado = time.time()
+        # Ordenar y comprimir unas decenas de miles de monedas no debe frenar el event loop
+        await asyncio.to_thread(self._construir, monedas)
+        await asyncio.to_thread(self.guardar_snapshot, monedas, generado)
+        self.generado = generado
+        self.refrescos += 1
+
+    async def _bucle(self, planificador):
+        try:
+            await asyncio.to_thread(self.cargar_snapshot)
+        except (OSError, ValueError, KeyError) as e:
+            registrar("snapshot_simbolos_invalido", logging.WARNING, ruta=self.ruta, error=str(e))
+        if not self.refresco:
+            return
+        while True:
+            espera = self.generado + self.refresco - time.time()
+            if espera > 0:
+                await asyncio.sleep(espera)
+            try:
+                # Con varios workers otro puede haber refrescado el snapshot mientras tanto
+                if self.ruta and os.path.exists(self.ruta) and os.path.getmtime(self.ruta) > self.generado + 60:
+                    await asyncio.to_thread(self.cargar_snapshot)
+                    if self.generado + self.refresco > time.time():
+                        continue
+                await self.refrescar(planificador)
+            except Exception as e:
+                registrar("refresco_simbolos_fallido", logging.WARNING, error=str(e))
+                self.errores += 1
+                await asyncio.sleep(REINTENTO_ERROR)
+
+    def iniciar(self, planificador=None):
+        if self._tarea is None:
+            self._tarea = asyncio.create_task(self._bucle(planificador))
+
+    async def detener(self):
+        if self._tarea is not None:
+            self._tarea.cancel()
+            await asyncio.gather(self._tarea, return_exceptions=True)
+            self._tarea = None
+
+    def estadisticas(self):
+        return {
+            "monedas": len(self),
+            "generado": round(self.generado),
+            "refrescos": self.refrescos,
+            "errores": self.errores,
+        }
+
+
+_indice = None
+
+
+def obtener_indice():
+    global _indice
+    if _indice is None:
+        _indice = crear_indice_simbolos()
+    return _indice
+
+
+def crear_indice_simbolos():
+    # Hasta cargar el snapshot el índice tiene las monedas fijas de datos_mercado
+    from datos_mercado import COINGECKO_IDS
+
+    semilla = [(simbolo, id_, id_.title(), None) for simbolo, id_ in COINGECKO_IDS.items()]
+    # SIMBOLOS_RUTA vacío desactiva el snapshot; SIMBOLOS_REFRESCO=0 desactiva el refresco
+    return IndiceSimbolos(
+        semilla,
+        ruta=os.getenv("SIMBOLOS_RUTA", RUTA_SNAPSHOT) or None,
+        refresco=float(os.getenv("SIMBOLOS_REFRESCO", str(REFRESCO))),
+        paginas_ranking=int(os.getenv("SIMBOLOS_PAGINAS_RANKING", str(PAGINAS_RANKING))),
+    )
@@ -0,0 +1,194 @@
+import atexit
+import contextvars
+import json
+import logging
+import os
+import queue
+import random
+import sys
+import threading
+import time
+from contextlib import contextmanager
+from logging.handlers import QueueHandler, QueueListener
+
+# Límites (segundos) de los buckets de los histogramas: de un hit de caché a una llamada lenta al LLM
+BUCKETS = (0.001, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0)
+# Intervalos conocidos (MTF: análisis multi-temporalidad); cualquier otro valor se agrupa en "otro"
+# para no disparar la cardinalidad
+INTERVALOS = {"15M", "1H", "1D", "1W", "1M", "MTF"}
+# Fracción de eventos informativos que llegan al log (advertencias y errores siempre se registran)
+LOG_MUESTREO = float(os.getenv("LOG_MUESTREO", "0.1"))
+LOG_NIVEL = os.getenv("LOG_NIVEL", "INFO").upper()
+
+
+def _escapar(valor):
+    return str(valor).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+
+class Histograma:
+    """
+    Histograma acumulativo con etiquetas, exportado en el formato de texto de
+    Prometheus. Los valores son por worker: con varios workers de uvicorn cada
+    proceso expone los suyos.
+    """
+
+    def __init__(self, nombre, ayuda, etiquetas, buckets=BUCKETS):
+        self.nombre = nombre
+        self.ayuda = ayuda
+        self.etiquetas = etiquetas
+        self.buckets = buckets
+        self._series = {}
+        self._lock = threading.Lock()
+
+    def observar(self, valor, *etiquetas):
+        with self._lock:
+            serie = self._series.get(etiquetas)
+            if serie is None:
+                serie = self._series[etiquetas] = [[0] * len(self.buckets), 0.0, 0]
+            conteos = serie[0]
+            for i, limite in enumerate(self.buckets):
+                if valor <= limite:
+                    conteos[i] += 1
+                    break
+            serie[1] += valor
+            serie[2] += 1
+
+    def exposicion(self):
+        lineas = [f"# HELP {self.nombre} {self.ayuda}", f"# TYPE {self.nombre} histogram"]
+        with self._lock:
+            series = [(etiquetas, list(c), s, n) for etiquetas, (c, s, n) in sorted(self._series.items())]
+        for etiquetas, conteos, suma, total in series:
+            base = ",".join(f'{k}="{_escapar(v)}"' for k, v in zip(self.etiquetas, etiquetas))
+            acumulado = 0
+            for limite, conteo in zip(self.buckets, conteos):
+                acumulado += conteo
+                lineas.append(f'{self.nombre}_bucket{{{base},le="{limite}"}} {acumulado}')
+            lineas.append(f'{self.nombre}_bucket{{{base},le="+Inf"}} {total}')
+            lineas.append(f"{self.nombre}_sum{{{base}}} {suma:.6f}")
+            lineas.append(f"{self.nombre}_count{{{base}}} {total}")
+        return lineas
+
+
+ETAPAS = Histograma(
+    "aimm_etapa_segundos",
+    "Duración de cada etapa de un análisis (proveedor, normalizacion, remuestreo, prompt, llm, serializacion, cotizacion).",
+    ("etapa", "proveedor", "intervalo"),
+)
+PETICIONES = Histograma(
+    "aimm_peticion_segundos",
+    "Duración total de cada petición HTTP por ruta, método y código de estado.",
+    ("ruta", "metodo", "estado"),
+)
+
+# Tiempos por etapa de la petición en curso, para el header Server-Timing
+_tiempos_peticion = contextvars.ContextVar("tiempos_peticion", default=None)
+
+
+@contextmanager
+def etapa(nombre, proveedor, intervalo):
+    inicio = time.perf_counter()
+    try:
+        yield
+    finally:
+        duracion = time.perf_counter() - inicio
+        ETAPAS.observar(duracion, nombre, proveedor, intervalo if intervalo in INTERVALOS else "otro")
+        tiempos = _tiempos_peticion.get()
+        if tiempos is not None:
+            # En batch la misma etapa se repite por item: se acumula
+            tiempos[nombre] = tiempos.get(nombre, 0.0) + duracion
+
+
+def tiempos_actuales():
+    return dict(_tiempos_peticion.get() or {})
+
+
+def server_timing(tiempos, total=None):
+    partes = [f"{nombre};dur={segundos * 1000:.1f}" for nombre, segundos in tiempos.items()]
+    if total is not None:
+        partes.append(f"total;dur={total * 1000:.1f}")
+    return ", ".join(partes)
+
+
+def exposicion():
+    return "\n".join(ETAPAS.exposicion() + PETICIONES.exposicion()) + "\n"
+
+
+class MiddlewareTiempos:
+    """
+    Middleware ASGI: mide cada petición HTTP y agrega Server-Timing con las
+    etapas registradas hasta que se envían los headers. En las respuestas
+    streaming los headers salen antes que el análisis, así que solo llevan
+    las etapas previas (p. ej. el fetch de datos).
+    """
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            return await self.app(scope, receive, send)
+
+        tiempos = {}
+        token = _tiempos_peticion.set(tiempos)
+        inicio = time.perf_counter()
+        estado = 500
+
+        async def enviar(mensaje):
+            nonlocal estado
+            if mensaje["type"] == "http.response.start":
+                estado = mensaje["status"]
+                encabezado = server_timing(tiempos, time.perf_counter() - inicio).encode("latin-1")
+                mensaje = {**mensaje, "headers": [*mensaje.get("headers", []), (b"server-timing", encabezado)]}
+            await send(mensaje)
+
+        try:
+            await self.app(scope, receive, enviar)
+        finally:
+            _tiempos_peticion.reset(token)
+            # Ruta de la plantilla (/jobs/{id}) y no la URL concreta, para acotar las series
+            ruta = getattr(scope.get("route"), "path", None) or "sin_ruta"
+            PETICIONES.observar(time.perf_counter() - inicio, ruta, scope["method"], str(estado))
+
+
+class _FormatoJSON(logging.Formatter):
+    def format(self, record):
+        registro = {
+            "ts": round(record.created, 3),
+            "nivel": record.levelname.lower(),
+            "evento": record.getMessage(),
+            **getattr(record, "campos", {}),
+        }
+        return json.dumps(registro, ensure_ascii=False, default=str)
+
+
+class _HandlerCola(QueueHandler):
+    def prepare(self, record):
+        # El formateo (json.dumps) se hace en el hilo del listener, no en el event loop
+        return record
+
+
+_logger = None
+_listener = None
+
+
+def obtener_logger():
+    global _logger, _listener
+    if _logger is None:
+        cola = queue.SimpleQueue()
+        salida = logging.StreamHandler(sys.stderr)
+        salida.setFormatter(_FormatoJSON())
+        _listener = QueueListener(cola, salida)
+        _listener.start()
+        atexit.register(_listener.stop)
+        _logger = logging.getLogger("aimm")
+        _logger.setLevel(LOG_NIVEL)
+        _logger.propagate = False
+        _logger.addHandler(_HandlerCola(cola))
+    return _logger
+
+
+def registrar(evento, nivel=logging.INFO, **campos):
+    """Log estructurado (una línea JSON); los eventos informativos se muestrean según LOG_MUESTREO."""
+    if nivel < logging.WARNING and random.random() >= LOG_MUESTREO:
+        return
+    obtener_logger().log(nivel, evento, extra={"campos": campos})
@@ -0,0 +1,75 @@
+import asyncio
+import os
+
+from almacen_ohlc import SEGUNDOS_AV
+from datos_mercado import BARRAS_COINGECKO, DAYS_MAP, proveedor_para
+from metricas import etapa
+from planificador import PRIORIDAD_INTERACTIVA
+
+# Temporalidades del dashboard, de la más fina a la más gruesa
+TEMPORALIDADES = ["15M", "1H", "1D", "1W", "1M"]
+
+# Serie que se descarga para cada temporalidad: las más gruesas se arman localmente.
+# CoinGecko solo da velas de 30 min (days 1-2) o de 4 h (days 3-30): con eso salen
+# 15M/1H y 1D/1W/1M. En acciones, 15M cubre 1H y la diaria cubre semana y mes.
+BASES = {
+    "coingecko": {"15M": "15M", "1H": "15M", "1D": "1W", "1W": "1W", "1M": "1W"},
+    "alpha_vantage": {"15M": "15M", "1H": "15M", "1D": "1D", "1W": "1D", "1M": "1D"},
+}
+
+# Reglas de pandas; cada vela queda rotulada con su inicio (semana desde el lunes, mes desde el día 1)
+REGLAS = {"15M": "15min", "1H": "1h", "1D": "1D", "1W": "W-MON", "1M": "MS"}
+
+# Velas de la serie base que se leen del almacén: dan historia a las temporalidades agregadas
+VELAS_BASE = int(os.getenv("VELAS_BASE_MULTITEMPORAL", "3000"))
+
+
+def segundos_vela(proveedor, intervalo):
+    # Tamaño real de las velas que entrega el proveedor para el intervalo
+    if proveedor == "coingecko":
+        return BARRAS_COINGECKO[DAYS_MAP.get(intervalo, 1)]
+    return SEGUNDOS_AV[intervalo]
+
+
+def remuestrear(data, regla):
+    """Agrega velas OHLCV a una temporalidad mayor (first/max/min/last/sum por grupo, sin loops)."""
+    import pandas as pd
+
+    grupos = data.resample(regla, closed="left", label="left")
+    velas = grupos.agg({"Open": "first", "High": "max", "Low": "min", "Close": "last"})
+    # CoinGecko no trae volumen: un grupo sin datos queda NaN en lugar de 0
+    velas["Volume"] = pd.to_numeric(data["Volume"], errors="coerce").resample(
+        regla, closed="left", label="left").sum(min_count=1)
+    # Huecos (fines de semana, feriados, horas sin operación) no generan velas vacías
+    velas = velas.dropna(subset=["Close"])
+    velas.index.name = data.index.name
+    return velas
+
+
+def serie_temporalidad(data, proveedor, base, intervalo):
+    # Si la base ya es igual o más gruesa (15M de CoinGecko son velas de 30 min) se usa tal cual
+    if data.empty or SEGUNDOS_AV[intervalo] <= segundos_vela(proveedor, base):
+        return data
+    return remuestrear(data, REGLAS[intervalo])
+
+
+async def obtener_series(cache_mercado, client, ticker, intervalos, prioridad=PRIORIDAD_INTERACTIVA):
+    """
+    Series OHLC de varias temporalidades con un fetch por serie base (uno o dos
+    en total): {intervalo: DataFrame con las últimas `lookback` velas}.
+    """
+    proveedor = proveedor_para(ticker)
+    grupos = {}
+    for intervalo in intervalos:
+        grupos.setdefault(BASES[proveedor][intervalo], []).append(intervalo)
+
+    bases = await asyncio.gather(*[
+        cache_mercado.obtener(client, ticker, base, prioridad, velas=VELAS_BASE) for base in grupos
+    ])
+
+    series = {}
+    for (base, destinos), data in zip(grupos.items(), bases):
+        with etapa("remuestreo", proveedor, base):
+            for intervalo in destinos:
+                series[intervalo] = serie_temporalidad(data, proveedor, base, intervalo).tail(cache_mercado.lookback)
+    return {intervalo: series[intervalo] for intervalo in intervalos}
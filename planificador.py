@@ -0,0 +1,151 @@
+import asyncio
+import heapq
+import itertools
+import os
+import time
+
+PRIORIDAD_INTERACTIVA = 0
+PRIORIDAD_FONDO = 10
+
+
+class CuotaAgotada(Exception):
+    pass
+
+
+class TokenBucket:
+    def __init__(self, capacidad, periodo):
+        self.capacidad = capacidad
+        self.tasa = capacidad / periodo
+        self.tokens = float(capacidad)
+        self._ultimo = time.monotonic()
+
+    def _recargar(self):
+        ahora = time.monotonic()
+        self.tokens = min(self.capacidad, self.tokens + (ahora - self._ultimo) * self.tasa)
+        self._ultimo = ahora
+
+    def espera(self):
+        self._recargar()
+        if self.tokens >= 1:
+            return 0.0
+        return (1 - self.tokens) / self.tasa
+
+    def consumir(self):
+        self._recargar()
+        self.tokens -= 1
+
+
+class CuotaProveedor:
+    """
+    Cuota de un proveedor: buckets por minuto y por día más una cola con
+    prioridad. Un despachador entrega los turnos en orden de prioridad a
+    medida que hay tokens; quien no recibe turno en espera_max se rinde.
+    """
+
+    def __init__(self, nombre, por_minuto, por_dia):
+        self.nombre = nombre
+        self.buckets = [TokenBucket(por_minuto, 60), TokenBucket(por_dia, 86400)]
+        self._cola = []
+        self._secuencia = itertools.count()
+        self._despachador = None
+        self.concedidas = 0
+        self.rechazadas = 0
+
+    def espera(self):
+        return max(bucket.espera() for bucket in self.buckets)
+
+    def _consumir(self):
+        for bucket in self.buckets:
+            bucket.consumir()
+        self.concedidas += 1
+
+    async def adquirir(self, prioridad, espera_max):
+        if not self._cola and self.espera() == 0:
+            self._consumir()
+            return
+
+        # Si ni siquiera el bucket sirve a tiempo, no tiene sentido encolar
+        if self.espera() > espera_max:
+            self.rechazadas += 1
+            raise CuotaAgotada(f"Cuota de {self.nombre} agotada")
+
+        futuro = asyncio.get_running_loop().create_future()
+        heapq.heappush(self._cola, (prioridad, next(self._secuencia), futuro))
+        if self._despachador is None:
+            self._despachador = asyncio.create_task(self._despachar())
+
+        try:
+            await asyncio.wait_for(futuro, espera_max)
+        except asyncio.TimeoutError:
+            self.rechazadas += 1
+            raise CuotaAgotada(f"Sin turno de {self.nombre} en {espera_max}s") from None
+
+    async def _despachar(self):
+        while self._cola:
+            espera = self.espera()
+            if espera > 0:
+                await asyncio.sleep(espera)
+                continue
+            _, _, futuro = heapq.heappop(self._cola)
+            if futuro.done():
+                # Cancelado por timeout del que esperaba
+                continue
+            self._consumir()
+            futuro.set_result(None)
+        self._despachador = None
+
+    def estadisticas(self):
+        return {
+            "concedidas": self.concedidas,
+            "rechazadas": self.rechazadas,
+            "en_cola": sum(1 for _, _, futuro in self._cola if not futuro.done()),
+            "tokens_minuto": round(self.buckets[0].tokens, 2),
+            "tokens_dia": round(self.buckets[1].tokens, 2),
+        }
+
+
+class Planificador:
+    """Planificador central de llamadas a proveedores externos."""
+
+    def __init__(self, cuotas, espera_max=10.0):
+        self.cuotas = cuotas
+        self.espera_max = espera_max
+
+    async def turno(self, proveedor, prioridad=PRIORIDAD_INTERACTIVA, espera_max=None):
+        cuota = self.cuotas.get(proveedor)
+        if cuota is None:
+            return
+        await cuota.adquirir(prioridad, self.espera_max if espera_max is None else espera_max)
+
+    def estadisticas(self):
+        return {nombre: cuota.estadisticas() for nombre, cuota in self.cuotas.items()}
+
+
+def crear_planificador():
+    # Valores por defecto: plan gratuito de Alpha Vantage y plan demo de CoinGecko
+    return Planificador(
+        {
+            "alpha_vantage": CuotaProveedor(
+                "alpha_vantage",
+                int(os.getenv("ALPHA_VANTAGE_POR_MINUTO", "5")),
+                int(os.getenv("ALPHA_VANTAGE_POR_DIA", "25")),
+            ),
+            "coingecko": CuotaProveedor(
+                "coingecko",
+                int(os.getenv("COINGECKO_POR_MINUTO", "30")),
+                int(os.getenv("COINGECKO_POR_DIA", "10000")),
+            ),
+            # Fuentes de respaldo: Kraken admite ~1 petición/s pública; Yahoo no publica límites
+            "kraken": CuotaProveedor(
+                "kraken",
+                int(os.getenv("KRAKEN_POR_MINUTO", "40")),
+                int(os.getenv("KRAKEN_POR_DIA", "20000")),
+            ),
+            "yfinance": CuotaProveedor(
+                "yfinance",
+                int(os.getenv("YFINANCE_POR_MINUTO", "30")),
+                int(os.getenv("YFINANCE_POR_DIA", "2000")),
+            ),
+        },
+        espera_max=float(os.getenv("PLANIFICADOR_ESPERA_MAX", "10")),
+    )
@@ -0,0 +1,183 @@
+import asyncio
+import heapq
+import logging
+import os
+import time
+
+import clientes
+from almacen_ohlc import SEGUNDOS_AV
+from analysis import generar_prompt_y_analizar_async
+from cache_mercado import ttl_mercado
+from datos_mercado import proveedor_para
+from metricas import registrar
+from planificador import PRIORIDAD_FONDO, TokenBucket
+
+# Los mismos seis tickers que muestra el dashboard
+WATCHLIST = "AAPL,MSFT,TSLA,GOOGL,NVDA,AMZN"
+# Solo diario por defecto: 6 tickers en 1H son 144 llamadas/día y el plan gratuito de Alpha Vantage da 25
+INTERVALOS = "1D"
+# Segundos después del cierre de la vela antes de pedirla (el proveedor tarda en publicarla)
+MARGEN_BARRA = 20
+REINTENTO_ERROR = 300
+
+
+class PrecomputoWatchlist:
+    """
+    Refresca en segundo plano los análisis de una grilla watchlist x intervalo.
+    Cada combinación se reprograma para justo después del cierre de su próxima
+    vela. Los resultados quedan en la caché del LLM (clave por contenido), así
+    que un /analizar interactivo sobre los mismos datos responde sin esperar.
+    Las descargas van con PRIORIDAD_FONDO y solo pueden usar una fracción de
+    la cuota de cada proveedor; el resto queda para las peticiones interactivas.
+    """
+
+    def __init__(self, cache_mercado, planificador, watchlist, intervalos,
+                 concurrencia=2, fraccion_cuota=0.5, calentar=True, margen=MARGEN_BARRA,
+                 estructurado=True):
+        self.cache_mercado = cache_mercado
+        # Mismo modo que pide el dashboard; cada modo tiene su propia entrada en la caché
+        self.estructurado = estructurado
+        self.grilla = [(ticker, intervalo) for ticker in watchlist for intervalo in intervalos]
+        self.omitidos = []
+        self.concurrencia = asyncio.Semaphore(concurrencia)
+        self.calentar = calentar
+        self.margen = margen
+        # Bucket propio por proveedor con una fracción de cada límite de su cuota
+        self.cuotas_fondo = {}
+        for nombre, cuota in planificador.cuotas.items():
+            self.cuotas_fondo[nombre] = [
+                TokenBucket(max(1, bucket.capacidad * fraccion_cuota), bucket.capacidad / bucket.tasa)
+                for bucket in cuota.buckets
+            ]
+        self.grilla = self._ajustar_a_cuota(self.grilla)
+        self._tarea = None
+        self._en_curso = set()
+        self.refrescados = 0
+        self.errores = 0
+        self.pospuestos = 0
+        self.ultimo = {}
+
+    def _ajustar_a_cuota(self, grilla):
+        """
+        Deja solo las combinaciones cuyo refresco diario entra en la fracción de
+        cuota de fondo de su proveedor, en el orden de la watchlist. Las demás
+        se registran y no se programan: si no, agotarían la cuota en las
+        primeras horas y el precómputo quedaría parado el resto del día.
+        """
+        # Llamadas por día que admite cada proveedor (el bucket más restrictivo)
+        presupuesto = {nombre: min(bucket.tasa * 86400 for bucket in buckets)
+                       for nombre, buckets in self.cuotas_fondo.items()}
+        usadas = {}
+        ajustada = []
+        for ticker, intervalo in grilla:
+            proveedor = proveedor_para(ticker)
+            llamadas = max(1.0, 86400 / SEGUNDOS_AV.get(intervalo, 86400))
+            if usadas.get(proveedor, 0) + llamadas > presupuesto.get(proveedor, float("inf")):
+                self.omitidos.append(f"{ticker}|{intervalo}")
+                registrar("precomputo_omitido", logging.WARNING, ticker=ticker, intervalo=intervalo,
+                          proveedor=proveedor, llamadas_dia=llamadas, presupuesto_dia=presupuesto[proveedor])
+                continue
+            usadas[proveedor] = usadas.get(proveedor, 0) + llamadas
+            ajustada.append((ticker, intervalo))
+        return ajustada
+
+    def _proxima(self, ticker, intervalo):
+        ttl = ttl_mercado(proveedor_para(ticker), intervalo)
+        return time.time() + ttl + self.margen
+
+    def _espera_cuota(self, proveedor):
+        buckets = self.cuotas_fondo.get(proveedor, [])
+        return max((bucket.espera() for bucket in buckets), default=0.0)
+
+    async def _refrescar(self, ticker, intervalo):
+        async with self.concurrencia:
+            inicio = time.perf_counter()
+            try:
+                data = await self.cache_mercado.obtener(
+                    clientes.obtener_cliente_http(), ticker, intervalo, prioridad=PRIORIDAD_FONDO
+                )
+                await generar_prompt_y_analizar_async(ticker, intervalo, data, self.estructurado)
+            except Exception as e:
+                registrar("precomputo_fallido", logging.WARNING, ticker=ticker, intervalo=intervalo, error=str(e))
+                self.errores += 1
+                return False
+            self.refrescados += 1
+            self.ultimo[f"{ticker}|{intervalo}"] = round(time.perf_counter() - inicio, 2)
+            return True
+
+    async def _ejecutar(self, ticker, intervalo, agenda):
+        ok = await self._refrescar(ticker, intervalo)
+        proxima = self._proxima(ticker, intervalo) if ok else time.time() + REINTENTO_ERROR
+        heapq.heappush(agenda, (proxima, ticker, intervalo))
+
+    async def _bucle(self):
+        ahora = time.time()
+        agenda = [
+            (ahora if self.calentar else self._proxima(ticker, intervalo), ticker, intervalo)
+            for ticker, intervalo in self.grilla
+        ]
+        heapq.heapify(agenda)
+
+        while True:
+            if not agenda:
+                # Todo en curso: se vuelve a mirar cuando alguna tarea se reprograme
+                await asyncio.sleep(1)
+                continue
+            cuando, ticker, intervalo = agenda[0]
+            if cuando > time.time():
+                await asyncio.sleep(min(cuando - time.time(), 60))
+                continue
+
+            heapq.heappop(agenda)
+            proveedor = proveedor_para(ticker)
+            espera = self._espera_cuota(proveedor)
+            if espera > 0:
+                # Fracción de cuota de fondo agotada: se pospone sin tocar la cuota interactiva
+                self.pospuestos += 1
+                heapq.heappush(agenda, (time.time() + espera, ticker, intervalo))
+                continue
+            for bucket in self.cuotas_fondo.get(proveedor, []):
+                bucket.consumir()
+
+            tarea = asyncio.create_task(self._ejecutar(ticker, intervalo, agenda))
+            self._en_curso.add(tarea)
+            tarea.add_done_callback(self._en_curso.discard)
+
+    def iniciar(self):
+        if self.grilla and self._tarea is None:
+            self._tarea = asyncio.create_task(self._bucle())
+
+    async def detener(self):
+        tareas = [t for t in [self._tarea, *self._en_curso] if t is not None]
+        for tarea in tareas:
+            tarea.cancel()
+        await asyncio.gather(*tareas, return_exceptions=True)
+        self._tarea = None
+
+    def estadisticas(self):
+        return {
+            "grilla": len(self.grilla),
+            "omitidos_por_cuota": self.omitidos,
+            "en_curso": len(self._en_curso),
+            "refrescados": self.refrescados,
+            "errores": self.errores,
+            "pospuestos_por_cuota": self.pospuestos,
+            "segundos_ultimo_refresco": self.ultimo,
+        }
+
+
+def crear_precomputo(cache_mercado, planificador):
+    # WATCHLIST vacío desactiva el precómputo (p. ej. en todos los workers menos uno)
+    watchlist = [t.strip().upper() for t in os.getenv("WATCHLIST", WATCHLIST).split(",") if t.strip()]
+    intervalos = [i.strip().upper() for i in os.getenv("PRECOMPUTO_INTERVALOS", INTERVALOS).split(",") if i.strip()]
+    return PrecomputoWatchlist(
+        cache_mercado,
+        planificador,
+        watchlist,
+        intervalos,
+        concurrencia=int(os.getenv("PRECOMPUTO_CONCURRENCIA", "2")),
+        fraccion_cuota=float(os.getenv("PRECOMPUTO_CUOTA", "0.5")),
+        calentar=os.getenv("PRECOMPUTO_CALENTAR", "1") == "1",
+        margen=float(os.getenv("PRECOMPUTO_MARGEN", str(MARGEN_BARRA))),
+        estructurado=os.getenv("PRECOMPUTO_ESTRUCTURADO", "1") == "1",
+    )
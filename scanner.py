@@ -6,6 +6,78 @@ import pandas as pd
 tickers = ["AAPL", "MSFT", "TSLA", "GOOGL", "NVDA"]
 
 st.title("📈 Dashboard Financiero Simple")
+
+modo = st.radio("Modo", ["Un ticker", "Universo", "En vivo"], horizontal=True)
+
+if modo == "En vivo":
+    import time
+    from cache import ruta_datos
+    from indicadores_stream import MotorIndicadores
+    from scanner_universo import descargar_panel
+
+    st.subheader("Seguimiento en vivo (EMA y pivots incrementales)")
+    texto = st.text_area("Tickers a seguir", ", ".join(tickers))
+    simbolos = sorted({t.strip().upper() for t in texto.replace(",", " ").split() if t.strip()})
+    cadencia = st.number_input("Cada cuántos segundos actualizar", min_value=15, value=60, step=15)
+    activo = st.checkbox("Actualizar automáticamente", value=False)
+
+    # Solo este bloque se vuelve a ejecutar cada `cadencia` segundos, sin rerun de toda la página
+    @st.fragment(run_every=cadencia if activo else None)
+    def seguimiento():
+        # El estado se guarda en disco: cada actualización solo procesa las velas nuevas
+        motor = MotorIndicadores(ruta_datos("estado_indicadores.json"))
+        inicio = time.perf_counter()
+        # Cada símbolo baja desde su última vela guardada; los nuevos o con huecos largos, la historia
+        procesadas = 0
+        for periodo, grupo in motor.planificar_descargas(simbolos).items():
+            procesadas += motor.procesar_panel(descargar_panel(grupo, period=periodo, interval="60m"))
+        motor.guardar()
+
+        st.caption(f"{procesadas} velas procesadas en {time.perf_counter() - inicio:.2f}s")
+        st.dataframe(motor.tabla().loc[[s for s in simbolos if s in motor.estados]], use_container_width=True)
+
+    seguimiento()
+    st.stop()
+
+if modo == "Universo":
+    import time
+    from scanner_universo import descargar_panel, filtrar_y_rankear, indicadores_panel, universo_sp500
+
+    @st.cache_data(ttl=86400)
+    def cargar_sp500():
+        return universo_sp500()
+
+    @st.cache_data(ttl=600)
+    def escanear(universo):
+        return indicadores_panel(descargar_panel(list(universo)))
+
+    st.subheader("Escaneo de universo (EMAs y pivots vectorizados)")
+    fuente = st.radio("Universo", ["Lista propia", "S&P 500"], horizontal=True)
+    if fuente == "S&P 500":
+        try:
+            universo = cargar_sp500()
+        except ImportError:
+            st.error("Para descargar el S&P 500 instala lxml (pd.read_html).")
+            st.stop()
+    else:
+        texto = st.text_area("Tickers separados por coma o espacio", ", ".join(tickers))
+        universo = sorted({t.strip().upper() for t in texto.replace(",", " ").split() if t.strip()})
+
+    c1, c2, c3 = st.columns(3)
+    sobre_ema20 = c1.checkbox("Precio > EMA20", value=True)
+    sobre_ema50 = c2.checkbox("Precio > EMA50")
+    cerca_s1 = c3.number_input("Distancia máx. a S1 (%)", min_value=0.0, value=2.0, step=0.5)
+
+    inicio = time.perf_counter()
+    tabla = escanear(tuple(universo))
+    resultado = filtrar_y_rankear(
+        tabla, sobre_ema20=sobre_ema20, sobre_ema50=sobre_ema50,
+        cerca_s1_pct=cerca_s1 or None,
+    )
+    st.caption(f"{len(tabla)} símbolos escaneados en {time.perf_counter() - inicio:.1f}s · {len(resultado)} cumplen el filtro")
+    st.dataframe(resultado, use_container_width=True)
+    st.stop()
+
 st.subheader("Selecciona un ticker para ver sus datos:")
 
 # Dropdown
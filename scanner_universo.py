@@ -0,0 +1,97 @@
+import numpy as np
+import pandas as pd
+
+# yf.download acepta muchos símbolos por llamada; lotes grandes reducen el número de requests
+TAMANO_LOTE = 200
+CAMPOS = ["Open", "High", "Low", "Close"]
+URL_SP500 = "https://en.wikipedia.org/wiki/List_of_S%26P_500_companies"
+
+
+def universo_sp500():
+    # Requiere lxml para pd.read_html; Yahoo usa "-" en lugar de "." (BRK.B -> BRK-B)
+    tabla = pd.read_html(URL_SP500)[0]
+    return sorted(tabla["Symbol"].str.replace(".", "-", regex=False).unique())
+
+
+def descargar_panel(tickers, period="5d", interval="60m", lote=TAMANO_LOTE):
+    """
+    Descarga el universo en lotes multi-ticker y devuelve un panel por campo:
+    {"Close": DataFrame (tiempo x ticker), "High": ..., ...}.
+    """
+    import yfinance as yf
+
+    partes = {campo: [] for campo in CAMPOS}
+    for i in range(0, len(tickers), lote):
+        simbolos = list(tickers[i:i + lote])
+        df = yf.download(
+            simbolos, period=period, interval=interval,
+            group_by="column", threads=True, progress=False, auto_adjust=False,
+        )
+        if df.empty:
+            continue
+        for campo in CAMPOS:
+            bloque = df[campo]
+            if isinstance(bloque, pd.Series):
+                bloque = bloque.to_frame(simbolos[0])
+            partes[campo].append(bloque)
+
+    return {
+        campo: pd.concat(bloques, axis=1).sort_index() if bloques else pd.DataFrame()
+        for campo, bloques in partes.items()
+    }
+
+
+def indicadores_panel(panel):
+    """
+    EMA20/EMA50 y pivots clásicos del penúltimo día para todo el panel a la vez,
+    con las mismas fórmulas que el modo de un ticker de scanner.py.
+    """
+    close = panel["Close"].dropna(how="all")
+    high = panel["High"].reindex(close.index)
+    low = panel["Low"].reindex(close.index)
+
+    # ewm opera columna a columna sobre todo el panel sin bucles por símbolo
+    ema20 = close.ewm(span=20, adjust=False).mean().iloc[-1]
+    ema50 = close.ewm(span=50, adjust=False).mean().iloc[-1]
+    precio = close.ffill().iloc[-1]
+
+    dias = close.index.date
+    high_dia = high.groupby(dias).max()
+    low_dia = low.groupby(dias).min()
+    close_dia = close.groupby(dias).last()
+    if len(close_dia) < 2:
+        raise ValueError("Se necesitan al menos dos días de datos para los pivots")
+    h, l, c = high_dia.iloc[-2], low_dia.iloc[-2], close_dia.iloc[-2]
+
+    pp = (h + l + c) / 3
+    tabla = pd.DataFrame({
+        "Precio": precio,
+        "EMA20": ema20,
+        "EMA50": ema50,
+        "PP": pp,
+        "R1": 2 * pp - l,
+        "R2": pp + (h - l),
+        "S1": 2 * pp - h,
+        "S2": pp - (h - l),
+    })
+    tabla["vs_EMA20_%"] = (tabla["Precio"] / tabla["EMA20"] - 1) * 100
+    tabla["vs_S1_%"] = (tabla["Precio"] / tabla["S1"] - 1) * 100
+    tabla["vs_R1_%"] = (tabla["Precio"] / tabla["R1"] - 1) * 100
+    return tabla.replace([np.inf, -np.inf], np.nan).dropna(subset=["Precio", "PP"]).round(2)
+
+
+def filtrar_y_rankear(tabla, sobre_ema20=False, sobre_ema50=False, cerca_s1_pct=None,
+                      cerca_r1_pct=None, orden="vs_S1_%"):
+    mascara = pd.Series(True, index=tabla.index)
+    if sobre_ema20:
+        mascara &= tabla["Precio"] > tabla["EMA20"]
+    if sobre_ema50:
+        mascara &= tabla["Precio"] > tabla["EMA50"]
+    if cerca_s1_pct is not None:
+        mascara &= tabla["vs_S1_%"].abs() <= cerca_s1_pct
+    if cerca_r1_pct is not None:
+        mascara &= tabla["vs_R1_%"].abs() <= cerca_r1_pct
+
+    resultado = tabla[mascara]
+    # Ranking por cercanía al nivel elegido
+    return resultado.reindex(resultado[orden].abs().sort_values().index)
@@ -0,0 +1,67 @@
+from datetime import datetime, timedelta, timezone
+
+import numpy as np
+import pandas as pd
+
+from almacen_ohlc import AlmacenOHLC, parametros_delta
+
+# Miércoles 6/3/2024 15:00 UTC = 10:00 en Nueva York (todavía sin horario de verano)
+AHORA = datetime(2024, 3, 6, 15, 0, tzinfo=timezone.utc)
+NY = datetime(2024, 3, 6, 10, 0)
+
+
+def velas(inicio, n, precio=100.0, volumen=1.0):
+    indice = pd.date_range(inicio, periods=n, freq="D", name="date")
+    cierre = precio + np.arange(n, dtype=float)
+    return pd.DataFrame({"Open": cierre, "High": cierre + 1, "Low": cierre - 1, "Close": cierre,
+                         "Volume": volumen}, index=indice)
+
+
+def test_delta_alpha_vantage():
+    assert parametros_delta("alpha_vantage", "1D", None, AHORA) == {"outputsize": "full"}
+    assert parametros_delta("alpha_vantage", "1D", NY - timedelta(days=2), AHORA) == {"outputsize": "compact"}
+    # 200 días corridos son ~143 velas hábiles: más de las 100 de compact
+    assert parametros_delta("alpha_vantage", "1D", NY - timedelta(days=200), AHORA) == {"outputsize": "full"}
+    assert parametros_delta("alpha_vantage", "1W", NY - timedelta(days=2), AHORA) == {"outputsize": "full"}
+
+
+def test_delta_coingecko_respeta_la_granularidad():
+    utc = AHORA.replace(tzinfo=None)
+    assert parametros_delta("coingecko", "1D", None, AHORA) == {"days": 2}
+    assert parametros_delta("coingecko", "1D", utc - timedelta(hours=12), AHORA) == {"days": 1}
+    assert parametros_delta("coingecko", "1D", utc - timedelta(days=5), AHORA) == {"days": 2}
+    assert parametros_delta("coingecko", "1W", utc - timedelta(days=10), AHORA) == {"days": 14}
+
+
+def test_delta_kraken_y_yfinance():
+    assert parametros_delta("kraken", "1D", None, AHORA) == {}
+    assert parametros_delta("kraken", "1D", datetime(2024, 3, 6), AHORA) == {"since": 1709683200 - 1}
+    assert parametros_delta("yfinance", "1D", NY - timedelta(days=2), AHORA) == {"period": "5d"}
+    assert parametros_delta("yfinance", "1D", NY - timedelta(days=10), AHORA) == {"period": "1mo"}
+    assert parametros_delta("yfinance", "1D", NY - timedelta(days=200), AHORA) == {}
+
+
+def test_agregar_reemplaza_el_solapamiento(tmp_path):
+    almacen = AlmacenOHLC(str(tmp_path / "ohlc"))
+    assert almacen.ultimo_ts("alpha_vantage", "AAPL", "1D") is None
+    # El directorio recién se crea al guardar la primera vela
+    assert not (tmp_path / "ohlc").exists()
+
+    almacen.agregar("alpha_vantage", "AAPL", "1D", velas("2024-03-01", 3))
+    almacen.agregar("alpha_vantage", "AAPL", "1D", velas("2024-03-03", 2, precio=500.0))
+
+    data = almacen.leer("alpha_vantage", "AAPL", "1D")
+    assert list(data.index.strftime("%d")) == ["01", "02", "03", "04"]
+    assert list(data["Close"]) == [100.0, 101.0, 500.0, 501.0]
+    assert data.index.name == "date"
+    assert almacen.ultimo_ts("alpha_vantage", "AAPL", "1D") == pd.Timestamp("2024-03-04")
+    assert list(almacen.leer("alpha_vantage", "AAPL", "1D", velas=2)["Close"]) == [500.0, 501.0]
+
+
+def test_recorte_y_volumen_ausente(tmp_path):
+    almacen = AlmacenOHLC(str(tmp_path), max_velas=4)
+    # 7 velas superan 4 * 1.5: quedan las últimas 4
+    almacen.agregar("coingecko", "BTC", "1D", velas("2024-03-01", 7, volumen=np.nan))
+    data = almacen.leer("coingecko", "BTC", "1D")
+    assert list(data["Close"]) == [103.0, 104.0, 105.0, 106.0]
+    assert data["Volume"].isna().all() and data["Volume"].dtype == object
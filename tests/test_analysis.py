@@ -0,0 +1,68 @@
+import asyncio
+from types import SimpleNamespace
+
+import pytest
+
+import analysis
+from cache_llm import CacheLLM
+
+
+class ClienteFalso:
+    # Devuelve siempre la misma respuesta, como la API de OpenAI cuando corta en max_tokens
+    def __init__(self, contenido, finish_reason):
+        self.contenido, self.finish_reason, self.llamadas = contenido, finish_reason, 0
+        self.chat = SimpleNamespace(completions=SimpleNamespace(create=self.create))
+
+    async def create(self, stream=False, **_):
+        self.llamadas += 1
+        if not stream:
+            mensaje = SimpleNamespace(content=self.contenido, refusal=None)
+            return SimpleNamespace(choices=[SimpleNamespace(message=mensaje, finish_reason=self.finish_reason)])
+
+        async def fragmentos():
+            for i in range(0, len(self.contenido), 5):
+                fin = self.finish_reason if i + 5 >= len(self.contenido) else None
+                delta = SimpleNamespace(content=self.contenido[i:i + 5])
+                yield SimpleNamespace(choices=[SimpleNamespace(delta=delta, finish_reason=fin)])
+
+        return fragmentos()
+
+
+@pytest.fixture
+def cliente(monkeypatch):
+    def instalar(contenido, finish_reason):
+        falso = ClienteFalso(contenido, finish_reason)
+        monkeypatch.setattr(analysis, "obtener_cliente_openai", lambda: falso)
+        monkeypatch.setattr(analysis, "_cache_llm", CacheLLM())
+        return falso
+    return instalar
+
+
+def test_respuesta_truncada_da_error_claro_y_no_se_cachea(cliente):
+    falso = cliente('{"resumen_tecnico": "Tendencia alcis', "length")
+
+    async def prueba():
+        with pytest.raises(ValueError, match="max_tokens"):
+            await analysis.completar_async("k", "prompt", "AAPL", "1D", estructurado=True)
+        with pytest.raises(ValueError, match="max_tokens"):
+            async for _ in analysis.completar_stream("k", "prompt", "AAPL", "1D", estructurado=True):
+                pass
+        # Texto libre cortado: se devuelve lo que hay pero no queda en caché
+        assert await analysis.completar_async("t", "prompt", "AAPL", "1D") == falso.contenido
+        assert await analysis.completar_async("t", "prompt", "AAPL", "1D") == falso.contenido
+
+    asyncio.run(prueba())
+    assert falso.llamadas == 4
+
+
+def test_respuesta_completa_se_cachea(cliente):
+    falso = cliente('{"resumen_tecnico": "Tendencia alcista"}', "stop")
+
+    async def prueba():
+        partes = [t async for t in analysis.completar_stream("k", "prompt", "AAPL", "1D", estructurado=True)]
+        assert "".join(partes) == falso.contenido
+        assert await analysis.completar_async("k", "prompt", "AAPL", "1D", estructurado=True) == {
+            "resumen_tecnico": "Tendencia alcista"}
+
+    asyncio.run(prueba())
+    assert falso.llamadas == 1
@@ -0,0 +1,65 @@
+import numpy as np
+
+from backtest import evaluar
+
+# Velas de 1 minuto (ns); la conclusión se tomó al cierre de la vela 0 con precio 100
+TS = np.arange(10, dtype="i8") * 60_000_000_000
+
+
+def evaluar_una(altos, bajos, target, stop, horizonte=5, precio=100.0):
+    n = len(altos)
+    resultado, velas = evaluar(
+        TS[:n], np.array(altos, dtype=float), np.array(bajos, dtype=float),
+        np.array([TS[0]]), np.array([precio]), np.array([target], dtype=float), np.array([stop], dtype=float),
+        horizonte,
+    )
+    return resultado[0], velas[0]
+
+
+def test_target_antes_que_stop():
+    assert evaluar_una([100, 101, 111, 100], [100, 99, 100, 90], 110, 95) == ("target", 2)
+
+
+def test_stop_antes_que_target():
+    assert evaluar_una([100, 101, 111, 100], [100, 94, 100, 90], 110, 95) == ("stop", 1)
+
+
+def test_target_y_stop_en_la_misma_vela_cuenta_como_stop():
+    assert evaluar_una([100, 111, 100], [100, 94, 100], 110, 95) == ("stop", 1)
+
+
+def test_bajista():
+    # Target por debajo del precio: el target se toca con el mínimo y el stop con el máximo
+    assert evaluar_una([100, 101, 102], [100, 98, 89], 90, 105) == ("target", 2)
+    assert evaluar_una([100, 106, 100], [100, 89, 100], 90, 105) == ("stop", 1)
+
+
+def test_invalida():
+    resultado, velas = evaluar_una([100, 111], [100, 99], 110, 101)
+    assert resultado == "invalida" and np.isnan(velas)
+    # Bajista con el stop por debajo del precio
+    assert evaluar_una([100, 101], [100, 89], 90, 99)[0] == "invalida"
+    # Target igual al precio: no hay dirección
+    assert evaluar_una([100, 101], [100, 99], 100, 95)[0] == "invalida"
+
+
+def test_borde_del_horizonte():
+    # Exactamente `horizonte` velas posteriores sin tocar nada: vencido
+    resultado, velas = evaluar_una([100] * 6, [100] * 6, 110, 95, horizonte=5)
+    assert resultado == "vencido" and np.isnan(velas)
+    # Una vela menos: todavía puede resolverse
+    assert evaluar_una([100] * 5, [100] * 5, 110, 95, horizonte=5)[0] == "abierto"
+    # El target en la última vela del horizonte cuenta; en la siguiente ya no
+    assert evaluar_una([100] * 5 + [111], [100] * 6, 110, 95, horizonte=5) == ("target", 5)
+    assert evaluar_una([100] * 6 + [111], [100] * 7, 110, 95, horizonte=5)[0] == "vencido"
+
+
+def test_varias_conclusiones_a_la_vez():
+    altos = np.array([100, 101, 111, 100, 100, 100], dtype=float)
+    bajos = np.array([100, 99, 100, 94, 100, 100], dtype=float)
+    resultado, velas = evaluar(
+        TS[:6], altos, bajos, TS[[0, 2, 4]], np.array([100.0, 105.0, 100.0]),
+        np.array([110.0, 110.0, 110.0]), np.array([95.0, 95.0, 95.0]), horizonte=3,
+    )
+    assert list(resultado) == ["target", "stop", "abierto"]
+    assert list(velas[:2]) == [2.0, 1.0]
@@ -0,0 +1,76 @@
+import asyncio
+from datetime import datetime, timezone
+from types import SimpleNamespace
+
+import pandas as pd
+import pytest
+
+import cache_mercado
+from almacen_ohlc import AlmacenOHLC
+from cache_mercado import TTL_LARGO, TTL_MINIMO, CacheMercado, ttl_mercado
+
+
+def utc(*campos):
+    return datetime(*campos, tzinfo=timezone.utc)
+
+
+def test_ttl_alineado_a_la_vela():
+    assert ttl_mercado("alpha_vantage", "1H", utc(2024, 3, 6, 10, 20)) == 40 * 60
+    # CoinGecko 1D devuelve velas de 30 min
+    assert ttl_mercado("coingecko", "1D", utc(2024, 3, 6, 10, 20)) == 10 * 60
+    # A segundos de cerrar la vela se respeta el mínimo
+    assert ttl_mercado("alpha_vantage", "15M", utc(2024, 3, 6, 10, 14, 50)) == TTL_MINIMO
+    assert ttl_mercado("alpha_vantage", "1W", utc(2024, 3, 6, 10, 20)) == TTL_LARGO["1W"]
+
+
+def test_ttl_diario_hasta_el_proximo_cierre():
+    # Miércoles 10:00 en Nueva York: vale hasta las 16:15 del mismo día
+    assert ttl_mercado("alpha_vantage", "1D", utc(2024, 3, 6, 15, 0)) == 6.25 * 3600
+    # Viernes después del cierre: hasta el lunes 16:15 (ya en horario de verano, 20:15 UTC)
+    assert ttl_mercado("alpha_vantage", "1D", utc(2024, 3, 8, 22, 0)) == (2 * 24 + 22.25) * 3600
+
+
+@pytest.fixture
+def proveedor(monkeypatch):
+    # Una sola fuente falsa para cualquier acción; registra los parámetros de cada llamada
+    estado = SimpleNamespace(llamadas=[], falla=None)
+
+    async def obtener_de_fuente(client, fuente, ticker, intervalo, **params):
+        estado.llamadas.append(params)
+        if estado.falla is not None:
+            raise estado.falla
+        if params.get("outputsize") == "full":
+            raise ValueError("The outputsize=full parameter value is a premium feature for the "
+                             "TIME_SERIES_DAILY endpoint.")
+        indice = pd.date_range("2024-03-01", periods=3, freq="D", name="date")
+        return pd.DataFrame({col: [1.0, 2.0, 3.0] for col in ["Open", "High", "Low", "Close", "Volume"]},
+                            index=indice)
+
+    monkeypatch.setattr(cache_mercado, "fuentes_para", lambda ticker: ["alpha_vantage"])
+    monkeypatch.setattr(cache_mercado, "obtener_de_fuente", obtener_de_fuente)
+    return estado
+
+
+def test_full_premium_se_reintenta_en_compact(proveedor, tmp_path):
+    cache = CacheMercado(almacen_ohlc=AlmacenOHLC(str(tmp_path)))
+
+    async def prueba():
+        await cache.obtener(None, "AAPL", "1D")
+        await cache.obtener(None, "MSFT", "1D")
+
+    asyncio.run(prueba())
+    # AAPL descubre que full es premium; MSFT ya pide compact de entrada
+    assert proveedor.llamadas == [{"outputsize": "full"}, {"outputsize": "compact"}, {"outputsize": "compact"}]
+    assert cache.estadisticas()["sin_full"] == ["alpha_vantage"]
+
+
+def test_falla_del_proveedor_sirve_lo_vencido(proveedor):
+    cache = CacheMercado()
+    vencido = pd.DataFrame({"Close": [1.0]})
+    cache.cache.guardar(cache.clave("alpha_vantage", "AAPL", "1D"), vencido, -1)
+    proveedor.falla = RuntimeError("timeout")
+
+    assert asyncio.run(cache.obtener(None, "AAPL", "1D")) is vencido
+    assert cache.vencidos_servidos == 1
+    with pytest.raises(RuntimeError, match="timeout"):
+        asyncio.run(cache.obtener(None, "MSFT", "1D"))
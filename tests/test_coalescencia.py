@@ -0,0 +1,53 @@
+import asyncio
+
+import pytest
+
+from coalescencia import SingleFlight
+
+
+def test_llamadas_concurrentes_comparten_el_trabajo():
+    grupo = SingleFlight()
+    ejecuciones = []
+
+    async def trabajo(clave):
+        ejecuciones.append(clave)
+        await asyncio.sleep(0.02)
+        return f"resultado {clave}"
+
+    async def prueba():
+        resultados = await asyncio.gather(*(grupo.ejecutar(c, lambda c=c: trabajo(c)) for c in "aaab"))
+        assert resultados == ["resultado a"] * 3 + ["resultado b"]
+        assert grupo.estadisticas() == {"en_vuelo": 0, "ejecutadas": 2, "coalescidas": 2}
+        # Terminado el trabajo la clave se libera: la siguiente llamada vuelve a ejecutarlo
+        await grupo.ejecutar("a", lambda: trabajo("a"))
+
+    asyncio.run(prueba())
+    assert ejecuciones == ["a", "b", "a"]
+
+
+def test_error_compartido_y_cancelacion_de_un_cliente():
+    grupo = SingleFlight()
+
+    async def falla():
+        await asyncio.sleep(0.02)
+        raise RuntimeError("proveedor caído")
+
+    async def lento():
+        await asyncio.sleep(0.05)
+        return "ok"
+
+    async def prueba():
+        resultados = await asyncio.gather(grupo.ejecutar("x", falla), grupo.ejecutar("x", falla),
+                                          return_exceptions=True)
+        assert all(isinstance(r, RuntimeError) for r in resultados)
+
+        # Un cliente que se desconecta no cancela el trabajo de los demás
+        primero = asyncio.ensure_future(grupo.ejecutar("y", lento))
+        segundo = asyncio.ensure_future(grupo.ejecutar("y", lento))
+        await asyncio.sleep(0.01)
+        primero.cancel()
+        assert await segundo == "ok"
+        with pytest.raises(asyncio.CancelledError):
+            await primero
+
+    asyncio.run(prueba())
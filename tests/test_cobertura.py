@@ -0,0 +1,90 @@
+import asyncio
+
+import pandas as pd
+import pytest
+
+from cobertura import Cobertura
+
+DATOS = pd.DataFrame({"Close": [1.0, 2.0]})
+
+
+def proveedores(latencias, errores=(), canceladas=None):
+    # lanzar(fuente, es_cobertura) falso: cada fuente tarda lo indicado y falla si está en `errores`
+    async def lanzar(fuente, es_cobertura):
+        try:
+            await asyncio.sleep(latencias[fuente])
+        except asyncio.CancelledError:
+            if canceladas is not None:
+                canceladas.append(fuente)
+            raise
+        if fuente in errores:
+            raise RuntimeError(f"{fuente} caído")
+        return DATOS
+    return lanzar
+
+
+def test_umbral_es_el_p95_con_piso_tras_las_muestras_minimas():
+    cobertura = Cobertura(umbral_inicial=2.0, umbral_minimo=0.3)
+    for i in range(Cobertura.MUESTRAS_MINIMAS - 1):
+        cobertura._registrar("a", 0.5 + i * 0.01)
+    assert cobertura.umbral("a") == 2.0
+    cobertura._registrar("a", 0.69)
+    # 20 muestras de 0.50 a 0.69: el p95 es la posición int(0.95 * 19) = 18
+    assert cobertura.umbral("a") == pytest.approx(0.68)
+
+    for _ in range(Cobertura.MUESTRAS_MINIMAS):
+        cobertura._registrar("b", 0.01)
+    assert cobertura.umbral("b") == 0.3
+
+
+def test_cobertura_gana_la_rapida_y_cancela_la_lenta():
+    cobertura = Cobertura(umbral_inicial=0.05)
+    canceladas = []
+
+    async def prueba():
+        return await cobertura.primera_valida(["a", "b"], proveedores({"a": 1.0, "b": 0.01}, canceladas=canceladas))
+
+    assert asyncio.run(prueba()) is DATOS
+    assert canceladas == ["a"]
+    assert cobertura.coberturas == 1 and cobertura.ganadas == {"b": 1}
+
+
+def test_presupuesto_de_coberturas():
+    cobertura = Cobertura(umbral_inicial=0.02, fraccion_max=0.1)
+    lanzar = proveedores({"a": 0.1, "b": 0.001})
+
+    async def prueba():
+        for _ in range(5):
+            await cobertura.primera_valida(["a", "b"], lanzar)
+
+    asyncio.run(prueba())
+    # coberturas < 0.1 * peticiones + 1: solo las dos primeras peticiones pueden cubrir
+    assert cobertura.peticiones == 5 and cobertura.coberturas == 2
+    assert cobertura.ganadas == {"b": 2, "a": 3}
+
+
+def test_respaldo_secuencial_y_error_de_la_primera():
+    cobertura = Cobertura(umbral_inicial=0.05)
+
+    async def prueba():
+        data = await cobertura.primera_valida(["a", "b"], proveedores({"a": 0.01, "b": 0.01}, errores={"a"}),
+                                              cubrir=False)
+        assert data is DATOS and cobertura.respaldos == 1
+        # La cobertura "b" falla antes, pero se relanza el error de la fuente preferida
+        with pytest.raises(RuntimeError, match="a caído"):
+            await cobertura.primera_valida(["a", "b"], proveedores({"a": 0.1, "b": 0.01}, errores={"a", "b"}))
+
+    asyncio.run(prueba())
+
+
+def test_la_latencia_se_mide_desde_el_turno():
+    cobertura = Cobertura(umbral_inicial=5.0)
+
+    async def turno(fuente, es_cobertura):
+        await asyncio.sleep(0.1)
+
+    async def prueba():
+        await cobertura.primera_valida(["a"], proveedores({"a": 0.01}), turno=turno)
+
+    asyncio.run(prueba())
+    assert list(cobertura._latencias["a"])[0] < 0.05
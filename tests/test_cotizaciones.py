@@ -0,0 +1,68 @@
+import asyncio
+
+import httpx
+import pytest
+
+import aimarketmap_api
+import cotizaciones
+from cotizaciones import Cotizaciones
+
+
+@pytest.fixture
+def precios(monkeypatch):
+    # Proveedores batch falsos: precios[ticker] o error si hay una excepción en precios["falla"]
+    precios = {"BTC/USD": 65000.0, "AAPL": 182.5, "pedidos": []}
+
+    async def batch(client, tickers):
+        precios["pedidos"].append(list(tickers))
+        if "falla" in precios:
+            raise precios["falla"]
+        return {t: {"precio": precios[t], "cambio_pct": 1.0} for t in tickers if t in precios}
+
+    monkeypatch.setattr(cotizaciones, "cotizaciones_coingecko", batch)
+    monkeypatch.setitem(cotizaciones.FUENTES_ACCIONES, "yfinance", batch)
+    return precios
+
+
+def test_un_batch_por_proveedor_y_respaldo_con_lo_ultimo(precios):
+    snapshot = Cotizaciones(ttl=60)
+
+    async def prueba():
+        primera = await snapshot.obtener(None, ["BTC/USD", "AAPL", "XXXX"])
+        assert set(primera) == {"BTC/USD", "AAPL"}
+        assert sorted(precios["pedidos"]) == [["AAPL", "XXXX"], ["BTC/USD"]]
+        # Dentro del TTL no se vuelve a pedir, tampoco el símbolo desconocido
+        await snapshot.obtener(None, ["BTC/USD", "AAPL", "XXXX"])
+        assert snapshot.llamadas == 2
+
+        snapshot.cache.guardar("AAPL", primera["AAPL"], -1)
+        precios["falla"] = httpx.ConnectError("sin red")
+        assert (await snapshot.obtener(None, ["AAPL"]))["AAPL"]["precio"] == 182.5
+        assert snapshot.errores == 1
+
+    asyncio.run(prueba())
+
+
+def test_quotes_responde_304_si_nada_cambio(precios, monkeypatch):
+    monkeypatch.setattr(aimarketmap_api, "cotizaciones", Cotizaciones(ttl=-1))
+
+    async def prueba():
+        transporte = httpx.ASGITransport(app=aimarketmap_api.app)
+        async with httpx.AsyncClient(transport=transporte, base_url="http://api") as client:
+            respuesta = await client.get("/quotes", params={"symbols": "btc/usd, aapl,aapl,zzzz"})
+            assert respuesta.status_code == 200
+            assert respuesta.json()["faltantes"] == ["ZZZZ"]
+            etiqueta = respuesta.headers["etag"]
+
+            # TTL vencido: se refresca, pero el precio no cambió y el ETag tampoco
+            repetida = await client.get("/quotes", params={"symbols": "BTC/USD,AAPL,ZZZZ"},
+                                        headers={"If-None-Match": etiqueta})
+            assert repetida.status_code == 304 and repetida.content == b""
+
+            precios["AAPL"] = 183.0
+            cambiada = await client.get("/quotes", params={"symbols": "BTC/USD,AAPL,ZZZZ"},
+                                        headers={"If-None-Match": etiqueta})
+            assert cambiada.status_code == 200 and cambiada.headers["etag"] != etiqueta
+            assert cambiada.json()["cotizaciones"]["AAPL"]["precio"] == 183.0
+
+    asyncio.run(prueba())
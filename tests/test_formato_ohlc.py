@@ -0,0 +1,72 @@
+import json
+
+import numpy as np
+import pandas as pd
+import pytest
+
+from formato_ohlc import columnas, columnas_binarias, dataframe_desde_columnas, leer_arrow, respuesta_negociada
+
+
+@pytest.fixture
+def data():
+    indice = pd.date_range("2024-03-01 09:30", periods=4, freq="15min", name="date")
+    return pd.DataFrame({
+        "Open": [182.634521, 183.1, 182.9, 184.2],
+        "High": [183.5, 183.9, 183.4, 184.8],
+        "Low": [182.1, 182.7, 182.2, 183.6],
+        "Close": [183.0, 182.95, 184.1, 184.5],
+        "Volume": [1.2e6, 9.8e5, 1.1e6, 1.3e6],
+    }, index=indice)
+
+
+def iguales(leido, data):
+    # La resolución del índice (ms/us/ns) depende de la versión de pandas
+    pd.testing.assert_frame_equal(leido, data, check_freq=False, check_index_type=False)
+
+
+def test_columnar_json_ida_y_vuelta(data):
+    payload = json.loads(json.dumps(columnas(data)))
+    iguales(dataframe_desde_columnas(payload), data)
+
+    # float32: 7 cifras significativas
+    redondeado = dataframe_desde_columnas(columnas(data, float32=True))
+    assert redondeado["Open"].iloc[0] == 182.6345
+    np.testing.assert_allclose(redondeado.to_numpy(), data.to_numpy(), rtol=1e-6)
+
+
+def test_volumen_ausente_no_viaja(data):
+    data["Volume"] = None
+    payload = columnas(data)
+    assert "Volume" not in payload
+    assert list(dataframe_desde_columnas(payload).columns) == ["Open", "High", "Low", "Close"]
+
+
+def test_msgpack_ida_y_vuelta(data):
+    msgpack = pytest.importorskip("msgpack")
+    respuesta = respuesta_negociada({"ticker": "AAPL", "data": data}, accept="application/msgpack")
+    assert respuesta.media_type == "application/msgpack"
+
+    cuerpo = msgpack.unpackb(respuesta.body, raw=False)
+    assert cuerpo["ticker"] == "AAPL"
+    iguales(dataframe_desde_columnas(cuerpo["data"]), data)
+    assert len(columnas_binarias(data, float32=True)["Close"]) == 4 * 4
+
+
+def test_arrow_ida_y_vuelta(data):
+    pytest.importorskip("pyarrow")
+    respuesta = respuesta_negociada({"ticker": "AAPL", "analisis": "texto", "data": data},
+                                    accept="application/vnd.apache.arrow.stream")
+    resto, leido = leer_arrow(respuesta.body)
+    assert resto == {"ticker": "AAPL", "analisis": "texto"}
+    assert leido.index.name == "date"
+    np.testing.assert_array_equal(leido.to_numpy(), data.to_numpy())
+    np.testing.assert_array_equal(leido.index.values, data.index.values)
+
+
+def test_json_comprimido_solo_si_conviene(data):
+    chico = respuesta_negociada({"data": data}, accept_encoding="gzip")
+    assert "Content-Encoding" not in chico.headers
+
+    grande = pd.concat([data] * 50)
+    comprimido = respuesta_negociada({"data": grande}, accept_encoding="gzip")
+    assert comprimido.headers["Content-Encoding"] == "gzip"
@@ -0,0 +1,70 @@
+import numpy as np
+import pandas as pd
+import pytest
+
+from indicadores_stream import PERIODO_SEMILLA, MotorIndicadores
+from scanner_universo import indicadores_panel
+
+
+def panel_horario(dias=3, simbolos=("AAPL", "MSFT"), semilla=3):
+    # Velas de 60m de 9:30 a 15:30 durante `dias` días hábiles
+    rng = np.random.default_rng(semilla)
+    indice = pd.DatetimeIndex([ts for dia in pd.bdate_range("2024-03-04", periods=dias)
+                               for ts in pd.date_range(dia + pd.Timedelta("9h30min"), periods=7, freq="h")])
+    close = pd.DataFrame(100 * np.exp(np.cumsum(rng.normal(0, 0.01, (len(indice), len(simbolos))), axis=0)),
+                         index=indice, columns=list(simbolos))
+    return {"Close": close, "High": close * 1.004, "Low": close * 0.996}
+
+
+def tramo(panel, hasta):
+    return {campo: tabla.loc[:hasta] for campo, tabla in panel.items()}
+
+
+def test_streaming_equivale_al_calculo_batch(tmp_path):
+    panel = panel_horario()
+    ruta = str(tmp_path / "estado.json")
+    corte = panel["Close"].index[10]
+
+    # Primera pasada con la vela del corte todavía en curso (otro cierre y otro máximo)
+    parcial = tramo(panel, corte)
+    parcial = {campo: tabla.copy() for campo, tabla in parcial.items()}
+    parcial["Close"].iloc[-1] *= 0.98
+    parcial["High"].iloc[-1] = parcial["Close"].iloc[-1]
+    motor = MotorIndicadores(ruta)
+    assert motor.procesar_panel(parcial) == 2 * 11
+    motor.guardar()
+
+    # Segunda pasada desde disco: solo recorre desde la vela en curso, que se corrige
+    motor = MotorIndicadores(ruta)
+    assert motor.procesar_panel(panel) == 2 * (len(panel["Close"]) - 10)
+
+    batch = indicadores_panel(panel)
+    for simbolo in panel["Close"].columns:
+        estado = motor.estados[simbolo]
+        assert estado.ema20.valor == pytest.approx(batch.loc[simbolo, "EMA20"], abs=0.005)
+        assert estado.ema50.valor == pytest.approx(batch.loc[simbolo, "EMA50"], abs=0.005)
+        for nivel in ["PP", "R1", "R2", "S1", "S2"]:
+            assert estado.pivots.pivots[nivel] == pytest.approx(batch.loc[simbolo, nivel], abs=0.005)
+
+    # EMA sin redondeo contra ewm(adjust=False)
+    ema = panel["Close"].ewm(span=20, adjust=False).mean().iloc[-1]
+    assert motor.estados["AAPL"].ema20.valor == pytest.approx(ema["AAPL"], rel=1e-12)
+
+
+def test_planificar_descargas_por_hueco(tmp_path):
+    motor = MotorIndicadores(str(tmp_path / "estado.json"))
+    motor.procesar_panel(panel_horario(dias=1, simbolos=("AAPL", "MSFT", "KO")))
+    motor.estados["MSFT"].ultimo_ts = pd.Timestamp("2024-02-20 15:30")
+    motor.estados["KO"].ultimo_ts = pd.Timestamp("2023-12-01 15:30")
+
+    ahora = pd.Timestamp("2024-03-06 10:00")
+    assert motor.periodo_pendiente("AAPL", ahora) == "5d"
+    assert motor.periodo_pendiente("MSFT", ahora) == "1mo"
+    assert motor.periodo_pendiente("KO", ahora) is None
+    assert motor.periodo_pendiente("NVDA", ahora) is None
+    assert motor.periodo_pendiente("AAPL", pd.Timestamp("2024-03-04 16:00")) == "1d"
+
+    # Un hueco sin periodo que lo cubra descarta el estado y se vuelve a sembrar
+    grupos = motor.planificar_descargas(["KO", "NVDA"])
+    assert grupos == {PERIODO_SEMILLA: ["KO", "NVDA"]}
+    assert "KO" not in motor.estados
@@ -0,0 +1,45 @@
+from indice_simbolos import IndiceSimbolos
+
+MONEDAS = [
+    ("btc", "bitcoin", "Bitcoin", 1),
+    ("eth", "ethereum", "Ethereum", 2),
+    ("ethfi", "ether-fi", "ether.fi", 150),
+    ("eth", "ethereum-wormhole", "Ethereum (Wormhole)", None),
+    ("weth", "weth", "WETH", 20),
+    ("bch", "bitcoin-cash", "Bitcoin Cash", 15),
+]
+
+
+def ids(resultados):
+    return [r["id"] for r in resultados]
+
+
+def test_id_para_elige_el_mejor_rank():
+    indice = IndiceSimbolos(MONEDAS)
+    assert indice.id_para("ETH") == "ethereum"
+    assert indice.id_para("bch") == "bitcoin-cash"
+    assert indice.id_para("xyz") is None
+
+
+def test_prefijo_por_simbolo_y_nombre_ordenado_por_rank():
+    indice = IndiceSimbolos(MONEDAS)
+    # Los símbolos exactos van primero (por rank), luego el resto del prefijo
+    assert ids(indice.buscar("eth")) == ["ethereum", "ethereum-wormhole", "ether-fi"]
+    # "bitcoin" solo coincide por nombre
+    assert ids(indice.buscar("Bitcoin")) == ["bitcoin", "bitcoin-cash"]
+    assert ids(indice.buscar("b", limite=1)) == ["bitcoin"]
+
+    eth = indice.buscar("eth")[0]
+    assert eth == {"ticker": "ETH/USD", "simbolo": "ETH", "id": "ethereum", "nombre": "Ethereum", "rank": 2}
+    assert indice.buscar("eth")[1]["rank"] is None
+    assert indice.buscar("zzz") == []
+
+
+def test_snapshot_ida_y_vuelta(tmp_path):
+    ruta = str(tmp_path / "datos" / "simbolos.json.gz")
+    IndiceSimbolos(ruta=ruta).guardar_snapshot(MONEDAS, generado=1234.0)
+
+    indice = IndiceSimbolos(ruta=ruta)
+    assert len(indice) == 0 and indice.cargar_snapshot()
+    assert len(indice) == len(MONEDAS) and indice.generado == 1234.0
+    assert ids(indice.buscar("we")) == ["weth"]
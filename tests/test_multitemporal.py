@@ -0,0 +1,52 @@
+import numpy as np
+import pandas as pd
+
+from multitemporal import REGLAS, remuestrear, serie_temporalidad
+
+
+def velas(inicio, periodos, freq, volumen=1.0):
+    indice = pd.date_range(inicio, periods=periodos, freq=freq, name="date")
+    precios = np.arange(periodos, dtype=float)
+    return pd.DataFrame(
+        {"Open": precios, "High": precios + 0.5, "Low": precios - 0.5, "Close": precios + 0.25, "Volume": volumen},
+        index=indice,
+    )
+
+
+def test_hora_rotulada_con_su_inicio():
+    data = velas("2024-01-02 09:30", 8, "15min")
+    horas = remuestrear(data, REGLAS["1H"])
+    assert list(horas.index) == list(pd.to_datetime(["2024-01-02 09:00", "2024-01-02 10:00", "2024-01-02 11:00"]))
+    # 10:00 agrupa 10:00, 10:15, 10:30 y 10:45 (velas 2 a 5)
+    assert horas.loc["2024-01-02 10:00"].tolist() == [2.0, 5.5, 1.5, 5.25, 4.0]
+    assert horas.index.name == "date"
+
+
+def test_semana_desde_el_lunes_y_mes_desde_el_dia_1():
+    # Miércoles 3 de enero a martes 6 de febrero de 2024
+    data = velas("2024-01-03", 35, "D")
+    semanas = remuestrear(data, REGLAS["1W"])
+    assert semanas.index[0] == pd.Timestamp("2024-01-01")
+    assert (semanas.index.dayofweek == 0).all()
+    assert semanas.loc["2024-01-08", "Open"] == 5.0 and semanas.loc["2024-01-08", "Close"] == 11.25
+
+    meses = remuestrear(data, REGLAS["1M"])
+    assert list(meses.index) == list(pd.to_datetime(["2024-01-01", "2024-02-01"]))
+    assert meses["Volume"].tolist() == [29.0, 6.0]
+
+
+def test_huecos_sin_velas_vacias_y_volumen_ausente():
+    # Viernes y lunes: el fin de semana no genera velas diarias
+    data = pd.concat([velas("2024-01-05 09:00", 4, "1h"), velas("2024-01-08 09:00", 4, "1h")])
+    data["Volume"] = np.nan
+    dias = remuestrear(data, REGLAS["1D"])
+    assert list(dias.index) == list(pd.to_datetime(["2024-01-05", "2024-01-08"]))
+    # Sin volumen (CoinGecko) queda NaN, no 0
+    assert dias["Volume"].isna().all()
+
+
+def test_base_igual_o_mas_gruesa_no_se_remuestrea():
+    data = velas("2024-01-02", 10, "30min")
+    # 15M de CoinGecko ya son velas de 30 minutos
+    assert serie_temporalidad(data, "coingecko", "15M", "15M") is data
+    assert len(serie_temporalidad(data, "coingecko", "15M", "1H")) == 5
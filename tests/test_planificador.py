@@ -0,0 +1,40 @@
+import pytest
+
+import planificador
+from planificador import TokenBucket
+
+
+class Reloj:
+    def __init__(self):
+        self.ahora = 1000.0
+
+    def __call__(self):
+        return self.ahora
+
+
+@pytest.fixture
+def reloj(monkeypatch):
+    reloj = Reloj()
+    monkeypatch.setattr(planificador.time, "monotonic", reloj)
+    return reloj
+
+
+def test_consume_hasta_vaciarse_y_espera_la_recarga(reloj):
+    bucket = TokenBucket(5, 60)
+    for _ in range(5):
+        assert bucket.espera() == 0.0
+        bucket.consumir()
+    # Un token cada 12 s
+    assert bucket.espera() == pytest.approx(12.0)
+    reloj.ahora += 6
+    assert bucket.espera() == pytest.approx(6.0)
+    reloj.ahora += 6
+    assert bucket.espera() == 0.0
+
+
+def test_la_recarga_no_supera_la_capacidad(reloj):
+    bucket = TokenBucket(5, 60)
+    bucket.consumir()
+    reloj.ahora += 3600
+    bucket.espera()
+    assert bucket.tokens == 5
@@ -0,0 +1,52 @@
+import asyncio
+
+import pytest
+
+from trabajos import ColaLlena, ColaTrabajos
+
+
+def test_admision_rechaza_con_retry_after():
+    async def prueba():
+        cola = ColaTrabajos(workers=2, profundidad=2)
+
+        async def analisis():
+            return "ok"
+
+        ids = [cola.enviar(f"pedido{i}", analisis) for i in range(4)]
+        # Pedido idéntico en curso: comparte el trabajo y no ocupa lugar
+        assert cola.enviar("pedido0", analisis) == ids[0]
+        with pytest.raises(ColaLlena) as rechazo:
+            cola.enviar("pedido4", analisis)
+        # Duración media inicial 5 s x 2 en espera / 2 workers
+        assert rechazo.value.reintentar == 5
+        assert (cola.aceptados, cola.coalescidos, cola.rechazados) == (4, 1, 1)
+        assert cola.obtener(ids[3])["posicion"] == 4
+
+        # Con los workers andando la cola se vacía y vuelve a aceptar
+        cola.iniciar()
+        trabajo = await cola.esperar(ids[3], timeout=5)
+        assert trabajo["estado"] == "listo" and trabajo["resultado"] == "ok"
+        assert cola.enviar("pedido4", analisis)
+        await cola.detener()
+
+    asyncio.run(prueba())
+
+
+def test_trabajo_fallido_o_vencido():
+    async def prueba():
+        cola = ColaTrabajos(workers=1, profundidad=1, timeout_trabajo=0.05)
+
+        async def falla():
+            raise RuntimeError("sin datos")
+
+        async def lento():
+            await asyncio.sleep(1)
+
+        cola.iniciar()
+        fallido = await cola.esperar(cola.enviar("falla", falla), timeout=5)
+        vencido = await cola.esperar(cola.enviar("lento", lento), timeout=5)
+        await cola.detener()
+        assert (fallido["estado"], fallido["error"]) == ("error", "sin datos")
+        assert vencido["estado"] == "error" and "superó" in vencido["error"]
+
+    asyncio.run(prueba())
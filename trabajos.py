@@ -0,0 +1,186 @@
+import asyncio
+import itertools
+import logging
+import math
+import os
+import time
+import uuid
+
+from cache import AlmacenSQLite, CacheLRU
+from metricas import registrar
+
+TERMINADOS = ("listo", "error")
+# Cada cuánto se relee el almacén compartido cuando el trabajo corre en otro worker
+SONDEO_COMPARTIDO = 0.25
+
+
+class ColaLlena(Exception):
+    def __init__(self, mensaje, reintentar):
+        super().__init__(mensaje)
+        self.reintentar = reintentar
+
+
+class ColaTrabajos:
+    """
+    Análisis como trabajos en segundo plano: un pool fijo de workers toma los
+    pedidos de una cola acotada. Con la cola llena el pedido se rechaza al
+    instante (control de admisión) en lugar de dejar conexiones esperando
+    al LLM. Pedidos idénticos en curso comparten el mismo trabajo. El estado
+    y el resultado se consultan por id durante ttl_resultado segundos; con
+    ruta_disco se comparten entre workers de uvicorn.
+    """
+
+    def __init__(self, workers=4, profundidad=32, ttl_resultado=600, timeout_trabajo=120,
+                 ruta_disco=None, max_entradas=1024):
+        self.workers = workers
+        self.profundidad = profundidad
+        self.ttl_resultado = ttl_resultado
+        self.timeout_trabajo = timeout_trabajo
+        self.almacen = AlmacenSQLite(ruta_disco, max_entradas) if ruta_disco else None
+        self.terminados = CacheLRU(max_entradas=max_entradas)
+        self._cola = asyncio.Queue()
+        self._activos = {}
+        self._eventos = {}
+        self._por_clave = {}
+        self._secuencia = itertools.count(1)
+        self._tomados = 0
+        self._tareas = []
+        # Duración media de un trabajo (EWMA), para el Retry-After de los rechazos
+        self._duracion_media = 5.0
+        self.aceptados = 0
+        self.coalescidos = 0
+        self.rechazados = 0
+        self.completados = 0
+        self.fallidos = 0
+
+    def _guardar(self, trabajo):
+        if trabajo["estado"] in TERMINADOS:
+            self._activos.pop(trabajo["id"], None)
+            self.terminados.guardar(trabajo["id"], trabajo, self.ttl_resultado)
+        else:
+            self._activos[trabajo["id"]] = trabajo
+        if self.almacen is not None:
+            # Un trabajo en cola o en curso no vence antes de poder terminar
+            self.almacen.guardar(trabajo["id"], trabajo, time.time() + self.timeout_trabajo + self.ttl_resultado)
+
+    def obtener(self, id_trabajo):
+        trabajo = self._activos.get(id_trabajo) or self.terminados.obtener(id_trabajo)
+        if trabajo is None and self.almacen is not None:
+            en_disco = self.almacen.obtener(id_trabajo)
+            if en_disco is not None and en_disco[0] > time.time():
+                trabajo = en_disco[1]
+        if trabajo is None:
+            return None
+        publico = {k: v for k, v in trabajo.items() if k != "secuencia"}
+        if trabajo["estado"] == "en_cola" and id_trabajo in self._activos:
+            publico["posicion"] = trabajo["secuencia"] - self._tomados
+        return publico
+
+    def enviar(self, clave, fabrica):
+        """
+        Encola fabrica() (corrutina que devuelve el resultado) y devuelve el id
+        del trabajo. Lanza ColaLlena si no hay lugar.
+        """
+        id_trabajo = self._por_clave.get(clave)
+        if id_trabajo is not None:
+            self.coalescidos += 1
+            return id_trabajo
+
+        # Capacidad: un trabajo en curso por worker más `profundidad` esperando
+        if len(self._activos) >= self.workers + self.profundidad:
+            self.rechazados += 1
+            # Lo que tarda en liberarse un lugar si cada worker termina un trabajo medio
+            reintentar = max(1, math.ceil(self._duracion_media * self.profundidad / self.workers))
+            raise ColaLlena(f"Cola de análisis llena ({self.profundidad} en espera)", reintentar)
+
+        id_trabajo = uuid.uuid4().hex
+        self._cola.put_nowait((id_trabajo, clave, fabrica))
+        self.aceptados += 1
+        self._por_clave[clave] = id_trabajo
+        self._eventos[id_trabajo] = asyncio.Event()
+        self._guardar({"id": id_trabajo, "estado": "en_cola", "creado": time.time(),
+                       "secuencia": next(self._secuencia)})
+        return id_trabajo
+
+    async def esperar(self, id_trabajo, timeout):
+        """Long-poll: devuelve el trabajo cuando termina o al vencer timeout (lo que pase primero)."""
+        trabajo = self.obtener(id_trabajo)
+        if trabajo is None or trabajo["estado"] in TERMINADOS or timeout <= 0:
+            return trabajo
+
+        evento = self._eventos.get(id_trabajo)
+        if evento is not None:
+            try:
+                await asyncio.wait_for(evento.wait(), timeout)
+            except asyncio.TimeoutError:
+                pass
+            return self.obtener(id_trabajo)
+
+        # Trabajo de otro worker: solo se ve a través del almacén compartido
+        limite = time.monotonic() + timeout
+        while trabajo is not None and trabajo["estado"] not in TERMINADOS and time.monotonic() < limite:
+            await asyncio.sleep(min(SONDEO_COMPARTIDO, max(0.0, limite - time.monotonic())))
+            trabajo = self.obtener(id_trabajo)
+        return trabajo
+
+    async def _worker(self):
+        while True:
+            id_trabajo, clave, fabrica = await self._cola.get()
+            self._tomados += 1
+            trabajo = {**self._activos[id_trabajo], "estado": "procesando", "inicio": time.time()}
+            self._guardar(trabajo)
+            try:
+                resultado = await asyncio.wait_for(fabrica(), self.timeout_trabajo)
+                trabajo = {**trabajo, "estado": "listo", "resultado": resultado}
+                self.completados += 1
+            except asyncio.TimeoutError:
+                trabajo = {**trabajo, "estado": "error", "error": f"El análisis superó {self.timeout_trabajo:.0f}s"}
+                self.fallidos += 1
+            except Exception as e:
+                trabajo = {**trabajo, "estado": "error", "error": str(e)}
+                self.fallidos += 1
+            finally:
+                trabajo["fin"] = time.time()
+                self._duracion_media += 0.2 * (trabajo["fin"] - trabajo["inicio"] - self._duracion_media)
+                self._guardar(trabajo)
+                self._por_clave.pop(clave, None)
+                self._eventos.pop(id_trabajo).set()
+                self._cola.task_done()
+            if trabajo["estado"] == "error":
+                registrar("trabajo_fallido", logging.WARNING, id=id_trabajo, error=trabajo["error"])
+
+    def iniciar(self):
+        if not self._tareas:
+            self._tareas = [asyncio.create_task(self._worker()) for _ in range(self.workers)]
+
+    async def detener(self):
+        for tarea in self._tareas:
+            tarea.cancel()
+        await asyncio.gather(*self._tareas, return_exceptions=True)
+        self._tareas = []
+
+    def estadisticas(self):
+        return {
+            "workers": self.workers,
+            "profundidad": self.profundidad,
+            "en_cola": self._cola.qsize(),
+            "en_curso": len(self._activos) - self._cola.qsize(),
+            "aceptados": self.aceptados,
+            "coalescidos": self.coalescidos,
+            "rechazados": self.rechazados,
+            "completados": self.completados,
+            "fallidos": self.fallidos,
+            "duracion_media": round(self._duracion_media, 3),
+            "compartido": self.almacen is not None,
+        }
+
+
+def crear_cola_trabajos():
+    # TRABAJOS_RUTA (p. ej. datos/trabajos.sqlite) comparte los resultados entre workers de uvicorn
+    return ColaTrabajos(
+        workers=int(os.getenv("TRABAJOS_WORKERS", "4")),
+        profundidad=int(os.getenv("TRABAJOS_COLA", "32")),
+        ttl_resultado=float(os.getenv("TRABAJOS_TTL", "600")),
+        timeout_trabajo=float(os.getenv("TRABAJOS_TIMEOUT", "120")),
+        ruta_disco=os.getenv("TRABAJOS_RUTA") or None,
+    )